@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Capture benchmark - PNG screencap vs raw screencap vs H.264 screenrecord.
+
+Reports frames/sec and CPU seconds per frame (this process plus reaped adb
+children) for each capture path.
+
+    python -m benchmarks.bench_capture --frames 30
+    python -m benchmarks.bench_capture --modes h264 --h264-file recording.h264
+"""
+import argparse
+import resource
+import subprocess
+import time
+
+import cv2
+import numpy as np
+
+
+def _cpu_seconds():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    kids = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + kids.ru_utime + kids.ru_stime
+
+
+def bench_png(frames):
+    from utils import adb_helper
+    adb_helper.ensure_connection()
+    for _ in range(frames):
+        p = subprocess.run([adb_helper.ADB_PATH, "-s", adb_helper.ADB_DEVICE,
+                            "exec-out", "screencap", "-p"], capture_output=True, check=True)
+        cv2.imdecode(np.frombuffer(p.stdout, np.uint8), cv2.IMREAD_COLOR)
+    return frames
+
+
+def bench_raw(frames):
+    from utils import adb_helper
+    for _ in range(frames):
+        adb_helper.capture_frame()
+    return frames
+
+
+def bench_h264(frames, source=None, size=None):
+    from utils.frame_stream import ScreenrecordStream
+    if source:
+        stream = ScreenrecordStream(source=source)
+    else:
+        from utils import adb_helper
+        adb_helper.ensure_connection()
+        stream = ScreenrecordStream(adb_helper.ADB_DEVICE, size=size)
+    stream.start()
+    got = 0
+    while got < frames and stream.wait_for_new_frame(timeout=5) is not None:
+        got += 1
+    stream.stop()
+    return got
+
+
+def run(name, fn, *args):
+    t0, c0 = time.perf_counter(), _cpu_seconds()
+    n = fn(*args)
+    wall, cpu = time.perf_counter() - t0, _cpu_seconds() - c0
+    if not n:
+        print(f"{name:6s} | no frames")
+        return
+    print(f"{name:6s} | {n:5d} frames | {n / wall:7.1f} fps | {1000 * wall / n:8.1f} ms/frame"
+          f" | {1000 * cpu / n:7.1f} ms CPU/frame")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--frames", type=int, default=30)
+    ap.add_argument("--modes", default="png,raw,h264",
+                    help="comma separated subset of png,raw,h264")
+    ap.add_argument("--h264-file", default=None,
+                    help="decode this recorded H.264 file instead of a live screenrecord")
+    ap.add_argument("--size", default=None, help="screenrecord --size, e.g. 800x450")
+    args = ap.parse_args()
+
+    size = tuple(int(v) for v in args.size.split("x")) if args.size else None
+    modes = args.modes.split(",")
+    if "png" in modes:
+        run("png", bench_png, args.frames)
+    if "raw" in modes:
+        run("raw", bench_raw, args.frames)
+    if "h264" in modes:
+        run("h264", bench_h264, args.frames, args.h264_file, size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Input benchmark - `input tap` vs raw evdev injection.
+
+Sends the same number of taps through each backend of adb_helper.tap() and
+reports taps/sec. Pick a harmless screen position (default: an empty spot in
+the village view) before running against a real device.
+
+    python -m benchmarks.bench_input --taps 50 --x 1200 --y 900
+    python -m benchmarks.bench_input --fake   # in-process fake adb server
+"""
+import argparse
+import os
+import time
+
+
+def bench(backend, taps, x, y):
+    from utils import adb_helper
+    adb_helper.INPUT_BACKEND = backend
+    adb_helper.tap(x, y)  # warm-up: session spawn / touchscreen discovery
+    if backend == "evdev" and adb_helper.get_device().injector() is None:
+        print(f"{backend:6s} | unavailable on this device")
+        return
+    t0 = time.perf_counter()
+    for _ in range(taps):
+        adb_helper.tap(x, y)
+    wall = time.perf_counter() - t0
+    print(f"{backend:6s} | {taps:4d} taps | {taps / wall:7.1f} taps/s | {1000 * wall / taps:7.1f} ms/tap")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--taps", type=int, default=30)
+    ap.add_argument("--x", type=int, default=1200)
+    ap.add_argument("--y", type=int, default=900)
+    ap.add_argument("--fake", action="store_true", help="run against an in-process fake adb server")
+    args = ap.parse_args()
+
+    if args.fake:
+        from utils.fake_adb_server import FakeAdbServer, FakeDevice
+        server = FakeAdbServer([FakeDevice("fake-1")]).start()
+        os.environ["ANDROID_ADB_SERVER_PORT"] = str(server.port)
+        os.environ["ANDROID_SERIAL"] = "fake-1"
+    for backend in ("input", "evdev"):
+        bench(backend, args.taps, args.x, args.y)
+
+
+if __name__ == "__main__":
+    main()
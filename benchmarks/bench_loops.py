@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Loop benchmark - the main.py search loop or the donate.py watcher against fake devices.
+
+Starts an in-process fake adb server (utils/fake_adb_server.py) whose
+devices replay recorded screenshots or render synthetic game screens
+(utils/synthetic_screens.py), runs --instances copies of the unmodified
+script against it in subprocesses for --duration seconds and reports
+bases/minute (taps on Next), taps/sec and OCR results/sec from the fake
+devices. With --synthetic the screens' ground truth is compared with what
+the scripts read (loot values / Donate seen). No emulator needed, so it
+runs in CI; the adb latency histograms of each run are written to --metrics.
+
+    python -m benchmarks.bench_loops main --frames loot_dataset/emu-1 --duration 120
+    python -m benchmarks.bench_loops donate --frames donate_frames --latency screencap=0.25
+    python -m benchmarks.bench_loops main --synthetic --instances 10 --time-scale 0.1
+
+--time-scale multiplies every time.sleep() in the script (0 = no waits),
+so the figures show adb/OCR cost rather than the scripts' human delays.
+"""
+import argparse
+import os
+import re
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NEXT_BOX = (1420, 720, 1520, 800)  # around main.py's Next tap at (1470, 760)
+
+# Runs the script in the child, optionally with scaled sleeps; a third
+# argument names a function to call afterwards (the donate watcher)
+_BOOTSTRAP = """
+import runpy, sys, time
+scale, script = float(sys.argv[1]), sys.argv[2]
+if scale != 1.0:
+    _sleep = time.sleep
+    time.sleep = lambda s: _sleep(max(0.0, s * scale))
+entry = sys.argv[3] if len(sys.argv) > 3 else None
+try:
+    ns = runpy.run_path(script, run_name="bench" if entry else "__main__")
+    if entry:
+        ns[entry]()
+except KeyboardInterrupt:
+    pass
+"""
+
+# script, entry function, answers to its startup prompts
+SCRIPTS = {
+    "main": ("main.py", None, "4\n"),  # hero count
+    "donate": ("donate.py", "start_donation_watcher", ""),
+}
+
+# One line per OCR result in the scripts' output
+_LOOT_LINE = re.compile(r"\[OCR-[^\]]*\] Gold=(\d+|\?) Elixir=(\d+|\?) Dark=(\d+|\?)")
+_DONATE_LINE = re.compile(r"'Donate' (text detected|not found)")
+_PREFILTERED_LINE = "Skipping base without OCR"  # main.py with LOOT_PREFILTER=1
+# main.py leaves the current base after printing one of these
+_BASE_DONE_LINES = ("Tapping 'Next'", "Attacking base")
+
+
+def parse_result(target, line):
+    """OCR result printed on line: (gold, elixir, dark) (None for fields main.py
+    did not read) / True|False for Donate, "prefiltered" for a base rejected by
+    digit count, else None."""
+    if target == "main":
+        if _PREFILTERED_LINE in line:
+            return "prefiltered"
+        m = _LOOT_LINE.search(line)
+        return tuple(None if v == "?" else int(v) for v in m.groups()) if m else None
+    m = _DONATE_LINE.search(line)
+    return (m.group(1) == "text detected") if m else None
+
+
+class Instance:
+    """One script subprocess bound to one fake device."""
+
+    def __init__(self, target, device, port, time_scale, metrics, workdir, tag):
+        script, entry, answers = SCRIPTS[target]
+        self.target = target
+        self.device = device
+        self.results = []  # (time, parsed OCR result, bases the script had left before it)
+        self.bases_done = 0
+        env = dict(os.environ, PYTHONUNBUFFERED="1", ANDROID_ADB_SERVER_PORT=str(port),
+                   ANDROID_SERIAL=device.serial,
+                   RUN_TAG=tag, ADB_METRICS_JSONL=metrics, ADB_METRICS_INTERVAL="15",
+                   PYTHONPATH=os.pathsep.join(filter(None, (ROOT, os.getenv("PYTHONPATH")))))
+        argv = [sys.executable, "-c", _BOOTSTRAP, str(time_scale), os.path.join(ROOT, script)]
+        if entry:
+            argv.append(entry)
+        os.makedirs(workdir, exist_ok=True)
+        self.proc = subprocess.Popen(argv, cwd=workdir, env=env, stdin=subprocess.PIPE,
+                                     stdout=subprocess.PIPE, text=True)
+        self.proc.stdin.write(answers)
+        self.proc.stdin.close()
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def _read(self):
+        verbose = os.getenv("BENCH_VERBOSE")
+        for line in self.proc.stdout:
+            if verbose:
+                print(f"[{self.device.serial}] {line}", end="")
+            result = parse_result(self.target, line)
+            if result is not None:
+                self.results.append((time.time(), result, self.bases_done))
+            if any(marker in line for marker in _BASE_DONE_LINES):
+                self.bases_done += 1
+
+    def stop(self):
+        """KeyboardInterrupt the script (atexit writes its last metrics line)."""
+        if self.proc.poll() is None:
+            self.proc.send_signal(signal.SIGINT)
+
+    def wait(self):
+        try:
+            self.proc.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+        self._reader.join(timeout=5)
+
+
+def next_taps(device):
+    x1, y1, x2, y2 = NEXT_BOX
+    count = 0
+    for _, line in list(device.inputs):
+        parts = line.split()
+        if len(parts) == 3 and parts[0] == "tap" and x1 <= int(parts[1]) <= x2 and y1 <= int(parts[2]) <= y2:
+            count += 1
+    return count
+
+
+def accuracy(target, inst):
+    """(correct, checked) OCR results against the synthetic screens' ground truth.
+
+    Loot results are paired with bases: the script's output says when it
+    leaves a base (Next or attack), and the screen records every base in
+    order, so extra captures (the ROI geometry probe, FRAME_BUS running
+    ahead, retries) do not shift the pairing. Donate results are paired
+    with the n-th captured frame (one capture per scan).
+    """
+    correct = checked = 0
+    if target == "main":
+        bases = inst.device.screen.bases
+        for _, result, base in inst.results:
+            if result == "prefiltered" or base >= len(bases):
+                continue
+            truth = (bases[base]["gold"], bases[base]["elixir"], bases[base]["dark"])
+            result = tuple(t if r is None else r for r, t in zip(result, truth))  # unread fields
+            checked += 1
+            correct += result == truth
+        return correct, checked
+    for (_, result, _), shown in zip(inst.results, inst.device.screen.shown):
+        checked += 1
+        correct += result == shown["donate"]
+    return correct, checked
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("target", choices=sorted(SCRIPTS))
+    ap.add_argument("--frames", help="recorded screenshots to replay (default: a blank frame)")
+    ap.add_argument("--synthetic", action="store_true",
+                    help="render synthetic screens with known loot / Donate instead")
+    ap.add_argument("--instances", type=int, default=1, help="concurrent scripts, one fake device each")
+    ap.add_argument("--duration", type=float, default=60, help="seconds to run after the first capture")
+    ap.add_argument("--latency", default="", help="injected delay per command, e.g. screencap=0.25,input=0.03")
+    ap.add_argument("--time-scale", type=float, default=1.0, help="factor applied to the script's sleeps")
+    ap.add_argument("--tap-log", help="also append every tap/swipe with its timestamp here")
+    ap.add_argument("--metrics", default="bench_loops_metrics.jsonl", help="adb metrics JSONL of the run")
+    args = ap.parse_args()
+
+    from utils.fake_adb_server import FakeAdbServer, FakeDevice, load_frames, parse_latency
+    from utils.synthetic_screens import GameScreen
+    frames = load_frames(args.frames) if args.frames else None
+    # The search loop moves to the next base on Next; the watcher sees a new frame per capture
+    advance = NEXT_BOX if args.target == "main" else "capture"
+    devices = []
+    for i in range(args.instances):
+        screen = None
+        if args.synthetic:
+            screen = GameScreen("search" if args.target == "main" else "village", seed=i,
+                                battle_seconds=60 * args.time_scale,
+                                donate_interval=20 * args.time_scale)
+        devices.append(FakeDevice(f"fake-{i + 1}", frames=frames, advance_on=advance,
+                                  latency=parse_latency(args.latency), tap_log=args.tap_log,
+                                  screen=screen))
+    server = FakeAdbServer(devices).start()
+    metrics = os.path.abspath(args.metrics)
+    source = "synthetic screens" if args.synthetic else f"{len(frames or [None])} frame(s)"
+    print(f"[*] {args.target} x{args.instances}: {source}, latency={devices[0].latency or 'none'}, "
+          f"time scale {args.time_scale:g}, {args.duration:g}s")
+
+    with tempfile.TemporaryDirectory(prefix="bench_loops_") as workdir:
+        instances = [Instance(args.target, dev, server.port, args.time_scale, metrics,
+                              os.path.join(workdir, dev.serial), f"bench-{i + 1}")
+                     for i, dev in enumerate(devices)]
+        # Measure from the first capture of every instance so OCR model loading is not counted
+        deadline = time.time() + 600
+        while (any(d.captures == 0 for d in devices) and time.time() < deadline
+               and all(inst.proc.poll() is None for inst in instances)):
+            time.sleep(0.1)
+        if any(d.captures == 0 for d in devices):
+            for inst in instances:
+                inst.proc.kill()
+            raise SystemExit(f"[-] {SCRIPTS[args.target][0]} never captured a frame")
+        start = time.time()
+        before = [(d.stats(), next_taps(d)) for d in devices]
+        while time.time() - start < args.duration and any(i.proc.poll() is None for i in instances):
+            time.sleep(0.2)
+        wall = time.time() - start
+        after = [(d.stats(), next_taps(d)) for d in devices]
+        for inst in instances:
+            inst.stop()
+        for inst in instances:
+            inst.wait()
+    server.stop()
+
+    captures = sum(a["captures"] - b["captures"] for (a, _), (b, _) in zip(after, before))
+    taps = sum(a["taps"] + a["swipes"] - b["taps"] - b["swipes"] for (a, _), (b, _) in zip(after, before))
+    bases = sum(a - b for (_, a), (_, b) in zip(after, before))
+    timed_results = [r for inst in instances for t, r, _ in inst.results if start <= t <= start + wall]
+    prefiltered = timed_results.count("prefiltered")
+    ocr = len(timed_results) - prefiltered
+    print(f"{args.target:6s} | {wall:6.1f}s | {captures:5d} captures | {captures / wall:6.2f} captures/s | "
+          f"{taps:5d} taps | {taps / wall:6.2f} taps/s | {ocr / wall:6.2f} OCR results/s")
+    if args.target == "main":
+        print(f"{'':6s} | {bases:5d} bases | {bases / (wall / 60):6.1f} bases/min"
+              + (f" | {prefiltered} rejected by digit count" if prefiltered else ""))
+    if args.synthetic:
+        correct, checked = map(sum, zip(*(accuracy(args.target, inst) for inst in instances)))
+        if checked:
+            print(f"{'':6s} | OCR accuracy {correct}/{checked} = {100 * correct / checked:.1f}% "
+                  f"({'loot values' if args.target == 'main' else 'Donate seen'})")
+    for inst in instances:
+        if inst.proc.returncode not in (0, -signal.SIGINT, -signal.SIGKILL):
+            print(f"[-] {inst.device.serial}: {SCRIPTS[args.target][0]} exited with status {inst.proc.returncode}")
+    if os.path.exists(metrics):
+        print(f"[+] adb/OCR latency histograms: {metrics}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+OCR benchmark - loot panel readers on recorded or synthetic screenshots.
+
+Runs each engine over the same frames and reports ms per base (all three
+loot fields). Frames come from --frames (e.g. loot_dataset/<RUN_TAG>) or
+are rendered by utils/synthetic_screens.py. With known values (synthetic
+frames, or a --labels CSV of file,gold,elixir,dark) it reports exact-panel
+and per-field accuracy, otherwise agreement with the first engine.
+
+    python -m benchmarks.bench_ocr --frames loot_dataset/emu-1
+    python -m benchmarks.bench_ocr --synthetic 50 --engines readtext,batched
+    python -m benchmarks.bench_ocr --frames loot_dataset/emu-1 --labels labels.csv \
+        --engines template,cascade,batched --templates digit_templates.npz
+"""
+import argparse
+import time
+
+import cv2
+
+
+def readtext_per_field(reader):
+    """The original extract_loot_values(): one full readtext() per field."""
+    from utils.loot_ocr import FIELDS, crop_fields, parse_digits
+
+    def read(image):
+        crops = crop_fields(image)
+        return tuple(parse_digits("".join(reader.readtext(crops[f], detail=0))) for f in FIELDS)
+    return read
+
+
+def load_engines(names, gpu, templates):
+    engines = {}
+    if "template" in names:
+        from utils.digit_ocr import TemplateReader
+        engines["template"] = TemplateReader(templates).read
+    if {"readtext", "batched", "cascade"} & set(names):
+        import easyocr
+        from utils.loot_ocr import CascadeReader, LootReader
+        reader = easyocr.Reader(["en"], gpu=gpu)
+        engines["readtext"] = readtext_per_field(reader)
+        engines["batched"] = LootReader(reader).read
+        if "cascade" in names:
+            from utils.digit_ocr import TemplateReader
+            engines["cascade"] = CascadeReader(TemplateReader(templates), LootReader(reader)).read
+    return {name: engines[name] for name in names}
+
+
+def load_frames(args):
+    """[(BGR frame, (gold, elixir, dark) or None)]"""
+    from utils import digit_ocr
+    if args.frames and args.labels:
+        return list(digit_ocr.labelled_frames(args.frames, labels=digit_ocr.read_labels(args.labels)))
+    if args.frames:
+        from utils.fake_adb_server import load_frames as frame_paths
+        return [(cv2.imread(p), None) for p in frame_paths(args.frames)]
+    return list(digit_ocr.synthetic_frames(args.synthetic, seed=args.seed))
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--frames", help="directory of recorded screenshots")
+    ap.add_argument("--synthetic", type=int, default=30, help="synthetic frames when --frames is not given")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--labels", help="CSV of file,gold,elixir,dark for the --frames screenshots")
+    ap.add_argument("--engines", default="readtext,batched", help="readtext, batched, template, cascade")
+    ap.add_argument("--templates", default="digit_templates.npz", help="bank for the template engine")
+    ap.add_argument("--gpu", action="store_true")
+    args = ap.parse_args()
+
+    frames = load_frames(args)
+    if not frames:
+        raise SystemExit("[-] No frames to read")
+    engines = load_engines(args.engines.split(","), args.gpu, args.templates)
+    print(f"[*] {len(frames)} frame(s), engines: {', '.join(engines)}")
+    reference = None
+    for name, read in engines.items():
+        read(frames[0][0])  # warm-up
+        t0 = time.perf_counter()
+        values = [read(img) for img, _ in frames]
+        ms = 1000 * (time.perf_counter() - t0) / len(frames)
+        line = f"{name:10s} | {ms:8.2f} ms/base"
+        truth = [t for _, t in frames]
+        if truth[0] is not None:
+            correct = sum(v == t for v, t in zip(values, truth))
+            line += f" | exact {correct}/{len(frames)} ({100 * correct / len(frames):.1f}%)"
+            for i, field in enumerate(("gold", "elixir", "dark")):
+                ok = sum(v[i] == t[i] for v, t in zip(values, truth))
+                line += f" | {field} {100 * ok / len(frames):.1f}%"
+        elif reference is not None:
+            same = sum(v == r for v, r in zip(values, reference))
+            line += f" | agrees with {next(iter(engines))} on {same}/{len(frames)}"
+        reference = reference or values
+        print(line)
+        if name == "cascade":
+            stats = read.__self__.stats()
+            counts, latency = stats["counters"], stats["latency"]
+            print(f"{'':10s} | fast path decided {counts.get('fast_panels', 0)}/{counts['panels']} bases | "
+                  f"fields fast {counts.get('fast_fields', 0)} slow {counts.get('slow_fields', 0)} | "
+                  + " ".join(f"{op} p50 {h['p50_ms']} ms" for op, h in latency.items()))
+
+
+if __name__ == "__main__":
+    main()
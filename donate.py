@@ -1,7 +1,11 @@
 import os
 import argparse
 import sys
-from utils.adb_helper import take_screenshot, tap, tap_and_hold, ensure_connection, get_selected_device
+from utils.adb_helper import (
+    take_screenshot, tap, tap_and_hold, ensure_connection, start_frame_stream,
+    warm_up, start_dispatcher, idle_tap
+)
+from utils import coords
 import easyocr
 import cv2
 import random
@@ -171,6 +175,12 @@ DEBUG_OUTPUT = "donation_debug.png"
 DONATE_OCR_BOX = (374, 817, 511, 865)
 DONATE_BOX_CENTER = ((374 + 511) // 2, (817 + 865) // 2)
 
+# Opt-in: the watcher scans frames captured at this scale (0.5 = a quarter of the
+# pixels); boxes and points below stay in 1600x900 screen coordinates (utils/coords.py).
+# Decimation can alias the small "Donate" text, so check detection on your screens
+# (benchmarks/bench_loops.py donate) before lowering it
+DETECT_SCALE = float(os.getenv("DONATE_DETECT_SCALE", "1.0"))
+
 # Standby (keep-awake) tap rectangle (x1, y1, x2, y2) - shrunk by 10% total
 STANDBY_RECT = (734, 322, 1366, 728)
 
@@ -189,7 +199,15 @@ IDLE_TAP_MAX = 180  # seconds
 TIMEOUT_DURATION = 360 * 60  # 90 minutes
 START_TIME = time.time()
 
-reader = easyocr.Reader(['en'], gpu=True)
+reader = None  # easyocr.Reader, loaded by get_reader() when the watcher starts
+
+def get_reader():
+    # Select the device while the OCR model loads; only the paths that OCR need either,
+    # so the tap debugger and the menus start without a device
+    global reader
+    if reader is None:
+        reader = warm_up(lambda: easyocr.Reader(['en'], gpu=True))
+    return reader
 
 # Timer for idle screen taps
 next_idle_tap_time = time.time() + random.randint(IDLE_TAP_MIN, IDLE_TAP_MAX)
@@ -214,25 +232,27 @@ def draw_donate_debug_overlay(image_path=SCREEN_PATH, output_path=DEBUG_OUTPUT):
     if img is None:
         print("[-] Could not load screenshot for overlay.")
         return
+    scale = coords.frame_scale(img)  # screenshot may be a reduced-scale capture
 
     # Donate OCR box
-    x1, y1, x2, y2 = DONATE_OCR_BOX
+    x1, y1, x2, y2 = coords.box_to_frame(DONATE_OCR_BOX, scale)
     cv2.rectangle(img, (x1, y1), (x2, y2), (0, 0, 255), 2)
     cv2.putText(img, "Donate Scan", (x1, y1 - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 1)
 
     # Standby (keep-awake) rectangle - make it more visible
-    sx1, sy1, sx2, sy2 = STANDBY_RECT
+    sx1, sy1, sx2, sy2 = coords.box_to_frame(STANDBY_RECT, scale)
     cv2.rectangle(img, (sx1, sy1), (sx2, sy2), (255, 0, 0), 3)
     # Add a semi-transparent overlay
     overlay = img.copy()
     cv2.rectangle(overlay, (sx1, sy1), (sx2, sy2), (255, 0, 0), -1)
     img = cv2.addWeighted(img, 0.9, overlay, 0.1, 0)
     cv2.putText(img, "IDLE TAP AREA", (sx1 + 10, sy1 + 30), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2)
-    cv2.putText(img, f"({sx1},{sy1}) to ({sx2},{sy2})", (sx1 + 10, sy1 + 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+    cv2.putText(img, "({},{}) to ({},{})".format(*STANDBY_RECT), (sx1 + 10, sy1 + 60), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
 
     # Troop centers
-    for i, (x, y) in enumerate(TROOP_DONATE_CENTERS):
-        cv2.circle(img, (x, y), TAP_RADIUS, (0, 255, 0), 2)
+    for i, center in enumerate(TROOP_DONATE_CENTERS):
+        x, y = coords.to_frame(center, scale)
+        cv2.circle(img, (x, y), max(1, int(TAP_RADIUS * scale)), (0, 255, 0), 2)
         cv2.putText(img, f"Troop{i+1}", (x - 30, y - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
 
     cv2.imwrite(output_path, img)
@@ -244,9 +264,9 @@ def scan_for_donate():
         print("[-] Could not load screenshot for OCR.")
         return False
 
-    x1, y1, x2, y2 = DONATE_OCR_BOX
-    crop = img[y1:y2, x1:x2]
-    result = reader.readtext(crop, detail=0)
+    # Upscaled back to screen size so OCR sees the glyph size it is tuned for
+    crop = coords.crop(img, DONATE_OCR_BOX, upscale=True)
+    result = get_reader().readtext(crop, detail=0)
 
     print(f"[OCR] Detected texts: {result}")
     for text in result:
@@ -282,7 +302,7 @@ def tap_standby_area():
     # New: used for periodic keep-awake taps (random point within STANDBY_RECT)
     x, y = random_point_in_rect(STANDBY_RECT)
     print(f"[*] Standby tap at random point within {STANDBY_RECT}: ({x}, {y})")
-    tap(x, y)
+    idle_tap(x, y)  # lowest priority; dropped if it can't run soon
 
 # ========== TAP DEBUG MENU ==========
 def tap_debug_menu():
@@ -290,7 +310,7 @@ def tap_debug_menu():
         print("\n" + "=" * 50)
         print("TAP DEBUGGER - CoC Bot Tap Locations")
         print("=" * 50)
-        print(f"Device: {get_selected_device()}")
+        print(f"Device: {ADB_SERIAL}")
         print(f"Total tap locations: {len(TAP_LOCATIONS)}")
         print()
         print("1. List all tap locations")
@@ -412,6 +432,11 @@ def test_donation_taps_menu():
 def start_donation_watcher():
     global next_idle_tap_time
     print("[*] Starting donate watcher...")
+    get_reader()
+    frame_stream = os.getenv("ADB_FRAME_STREAM", "0")
+    if frame_stream != "0":
+        start_frame_stream(backend="screenrecord" if frame_stream == "screenrecord" else "screencap")
+    start_dispatcher()  # donate taps > screenshots > standby taps
     print("Press Ctrl+C to return to main menu")
     
     try:
@@ -422,7 +447,7 @@ def start_donation_watcher():
                 break
 
             ensure_connection()  # adb_helper should respect ANDROID_SERIAL env
-            take_screenshot(SCREEN_PATH)
+            take_screenshot(SCREEN_PATH, scale=DETECT_SCALE)
             draw_donate_debug_overlay()
 
             current_time = time.time()
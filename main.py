@@ -1,25 +1,67 @@
 # main.py
 from utils.adb_helper import (
-    take_screenshot, tap, tap_and_hold, ensure_connection, get_selected_device
+    capture_frame, tap, ensure_connection, get_selected_device,
+    start_frame_stream, run_macro, warm_up, capture_roi, start_dispatcher, timed, METRICS_SOURCES
 )
+from utils.macro import Macro
+from utils.loot_ocr import make_loot_reader, read_loot, loot_sufficient, show_loot, zero_loot
+from utils.digit_ocr import digit_counts
+from utils.metrics import Counters
+from utils.frame_bus import start_capture_process, stop_capture_process
 from time import sleep
 from pathlib import Path
 from datetime import datetime
 import cv2
 import easyocr
-import re
 import random
 import math
 import time
 import os
+import atexit
+
+# Select the device while the OCR model loads
+reader = warm_up(lambda: easyocr.Reader(['en'], gpu=False))
+loot_reader = make_loot_reader(reader)  # LOOT_OCR_ENGINE=cascade|template|easyocr
 
 # ========= PER-INSTANCE NAMESPACING (CRITICAL) =========
 RUN_TAG = os.getenv("RUN_TAG") or get_selected_device().replace(":", "_")
-SCREEN_PATH        = f"screen_{RUN_TAG}.png"
 DATASET_DIR        = f"loot_dataset/{RUN_TAG}"
 DEBUG_OVERLAY_PATH = f"debug_full_overlay_{RUN_TAG}.png"
 
-print(f"[BOOT] RUN_TAG={RUN_TAG} | SCREEN_PATH={SCREEN_PATH} | DATASET_DIR={DATASET_DIR}")
+print(f"[BOOT] RUN_TAG={RUN_TAG} | DATASET_DIR={DATASET_DIR}")
+
+# Opt-in: keep a background capture pipe running so screenshots come from a ring buffer
+# (ADB_FRAME_STREAM=1 loops raw screencap, ADB_FRAME_STREAM=screenrecord decodes H.264)
+FRAME_STREAM = os.getenv("ADB_FRAME_STREAM", "0")
+if FRAME_STREAM != "0":
+    start_frame_stream(backend="screenrecord" if FRAME_STREAM == "screenrecord" else "screencap")
+
+# Opt-in: route all device I/O through a priority queue (deploy taps > captures >
+# keep-alive taps) instead of calling adb from the loop thread (ADB_DISPATCHER=1)
+if os.getenv("ADB_DISPATCHER", "0") != "0":
+    start_dispatcher()
+
+# Opt-in: the search loop reads only the loot panel rows from the device instead of
+# a full screenshot (no debug overlay / loot_dataset save in this mode)
+LOOT_ROI_CAPTURE = os.getenv("LOOT_ROI_CAPTURE", "0") != "0"
+LOOT_BOX = (65, 113, 205, 228)  # x1, y1, x2, y2 around the gold/elixir/dark numbers
+
+# Opt-in: a separate capture process keeps the newest frame in shared memory; the
+# overlay, dataset save and OCR read it in place instead of a capture of their own
+# (one capture every FRAME_BUS_INTERVAL seconds, none while paused for a battle)
+FRAME_BUS = None
+if os.getenv("FRAME_BUS", "0") != "0":
+    FRAME_BUS, _capture_proc = start_capture_process(get_selected_device())
+    atexit.register(stop_capture_process, FRAME_BUS, _capture_proc)
+
+# Opt-in: count the gold/elixir digits before OCR and skip bases that cannot meet the
+# attack rule without reading them (LOOT_PREFILTER=1); LOOT_PREFILTER=check still runs
+# OCR on every base and logs whether it agrees with the digit count
+LOOT_PREFILTER = os.getenv("LOOT_PREFILTER", "0")
+PREFILTERED = "prefiltered"  # extract_loot_values() result for a base rejected by digit count
+CAPTURE_FAILED = "capture_failed"  # scan result when no screenshot came back
+PREFILTER_COUNTS = Counters()
+METRICS_SOURCES["loot_prefilter"] = PREFILTER_COUNTS.snapshot
 
 # ========= HELPERS =========
 def random_point(center, radius):
@@ -39,8 +81,7 @@ POST_ATTACK_TAPS = [(800, 850), (97, 900), (250, 700), (1363, 821)]
 GOLD_THRESHOLD = 800000
 ELIXIR_THRESHOLD = 800000
 DARK_THRESHOLD = 0
-
-reader = easyocr.Reader(['en'], gpu=False)
+LOOT_MINIMUMS = (GOLD_THRESHOLD, ELIXIR_THRESHOLD, DARK_THRESHOLD)
 
 # Prompt hero count once at the start
 try:
@@ -51,11 +92,8 @@ except ValueError:
     HERO_COUNT = 0
 
 # ========= DEBUG OVERLAY =========
-def draw_full_debug_overlay(image_path=SCREEN_PATH, output_path=DEBUG_OVERLAY_PATH):
-    img = cv2.imread(image_path)
-    if img is None:
-        print("[-] Failed to load screenshot for overlay.")
-        return
+def draw_full_debug_overlay(frame, output_path=DEBUG_OVERLAY_PATH):
+    img = frame.copy()  # the frame itself still goes to OCR
     
     boxes = {
         "Gold":   (65, 113, 205, 142),
@@ -97,9 +135,8 @@ def draw_full_debug_overlay(image_path=SCREEN_PATH, output_path=DEBUG_OVERLAY_PA
     print(f"[+] Debug overlay saved: {output_path}")
 
 # ========= LOOT IMAGE SAVE =========
-def save_loot_crop():
+def save_loot_crop(img):
     Path(DATASET_DIR).mkdir(parents=True, exist_ok=True)
-    img = cv2.imread(SCREEN_PATH)
     if img is None or img.shape[0] == 0:
         print("[-] Screenshot invalid.")
         return
@@ -109,24 +146,86 @@ def save_loot_crop():
     print(f"[+] Saved loot panel to: {out_path}")
 
 # ========= OCR LOOT =========
-def extract_loot_values(image_path):
-    image = cv2.imread(image_path)
+def prefilter_rejects(image, origin=(0, 0)):
+    # n digits means at most 10**n - 1; True if even that cannot meet the attack rule.
+    # None when a field shows no digits (not a search screen): OCR and the zero-loot
+    # retries deal with that
+    with timed("prefilter"):
+        counts = digit_counts(image, origin, ("gold", "elixir"))
+    if not all(counts.values()):
+        return None
+    reject = loot_sufficient(10 ** counts["gold"] - 1, 10 ** counts["elixir"] - 1, None, LOOT_MINIMUMS) is False
+    print(f"[PREFILTER-{RUN_TAG}] Digits Gold={counts['gold']} Elixir={counts['elixir']} -> "
+          f"{'reject' if reject else 'read'}")
+    PREFILTER_COUNTS.add("rejected" if reject else "passed")
+    return reject
+
+def extract_loot_values(image, origin=(0, 0)):
+    # image's top-left sits at `origin` on screen
     if image is None:
         print("[-] Could not load screenshot.")
         return None
-    crops = {
-        "gold": image[113:142, 65:205],
-        "elixir": image[158:185, 65:205],
-        "dark": image[198:228, 65:180],
-    }
-    loot = {}
-    for key, crop in crops.items():
-        result = reader.readtext(crop, detail=0)
-        text = ''.join(result)
-        digits = re.sub(r'[^\d]', '', text)
-        loot[key] = int(digits) if digits.isdigit() else 0
-    print(f"[OCR-{RUN_TAG}] Gold={loot['gold']} Elixir={loot['elixir']} Dark={loot['dark']}")
-    return loot['gold'], loot['elixir'], loot['dark']
+    rejected = prefilter_rejects(image, origin) if LOOT_PREFILTER != "0" else None
+    if rejected and LOOT_PREFILTER != "check":
+        return PREFILTERED
+    with timed("ocr"):  # kept next to the adb timings in get_metrics()
+        # Only the fields the attack rule needs (LOOT_LAZY=0 reads all three)
+        gold, elixir, dark = read_loot(loot_reader, image, LOOT_MINIMUMS, origin)
+    print(f"[OCR-{RUN_TAG}] Gold={show_loot(gold)} Elixir={show_loot(elixir)} Dark={show_loot(dark)}")
+    if rejected is not None:
+        # Only a reject of a base OCR would attack costs anything; a "read" OCR then skips just wastes OCR
+        attack = loot_sufficient(gold, elixir, dark, LOOT_MINIMUMS)
+        if rejected and attack:
+            outcome = "false_reject"
+        elif rejected or attack:
+            outcome = "agree"
+        else:
+            outcome = "missed_reject"
+        PREFILTER_COUNTS.add(outcome)
+        print(f"[PREFILTER-{RUN_TAG}] OCR says {'attack' if attack else 'skip'}: {outcome}")
+    return gold, elixir, dark
+
+def scan_screenshot():
+    # Overlay, dataset save and OCR all use the captured frame; nothing goes through disk
+    img = capture_frame()
+    if img is None:
+        print(f"[-{RUN_TAG}] No screenshot; not reading loot from an old one.")
+        return CAPTURE_FAILED
+    draw_full_debug_overlay(img)
+    sleep(1.5)
+    save_loot_crop(img)
+    return extract_loot_values(img)
+
+def scan_bus_frame():
+    # Overlay, dataset save and OCR all read the same shared-memory frame
+    global FRAME_BUS
+    if _capture_proc.poll() is not None:
+        print(f"[-{RUN_TAG}] Capture process exited ({_capture_proc.returncode}); "
+              f"taking screenshots directly from now on.")
+        FRAME_BUS = None  # the atexit hook still frees the shared memory
+        return scan_screenshot()
+    FRAME_BUS.resume()  # paused during battles
+    with FRAME_BUS.frame(newer_than=time.time(), timeout=15) as (seq, img):
+        if img is None:
+            print("[-] No frame from the capture process.")
+            return CAPTURE_FAILED
+        draw_full_debug_overlay(img)
+        sleep(1.5)
+        save_loot_crop(img)
+        return extract_loot_values(img)
+
+def scan_loot():
+    # One look at the loot panel: just its rows (LOOT_ROI_CAPTURE), the shared-memory
+    # frame (FRAME_BUS) or a full screenshot
+    if LOOT_ROI_CAPTURE:
+        panel = capture_roi(LOOT_BOX)
+        if panel is None:
+            print(f"[-{RUN_TAG}] No loot panel capture; not reading loot from an old one.")
+            return CAPTURE_FAILED
+        return extract_loot_values(panel, origin=LOOT_BOX[:2])
+    if FRAME_BUS is not None:
+        return scan_bus_frame()
+    return scan_screenshot()
 
 # ========= TROOP DEPLOYMENT =========
 def deploy_troops():
@@ -152,76 +251,60 @@ def deploy_troops():
     print(f"[DEBUG-{RUN_TAG}] Deploy point 1 (dragon): {deploy_1}")
     print(f"[DEBUG-{RUN_TAG}] Deploy point 2 (secondary): {deploy_2}")
     print(f"[DEBUG-{RUN_TAG}] ===========================")
+
+    # The whole sequence is built as one macro and run on the device in a
+    # single round trip, so the sleeps below happen device-side.
+    m = Macro("deploy_troops")
     
     # STEP 1: Deploy Troop 1 - Balloon (1 time at dragon location)
-    print(f"[*-{RUN_TAG}] Step 1: Deploying Troop 1 (Balloon) once...")
-    tap(*troop_icons[0]); human_delay()  # Select Troop 1 (index 0)
-    tap(*random_point(deploy_1, 5)); human_delay(0.3, 0.6)
+    m.tap(*troop_icons[0]).human_delay()  # Select Troop 1 (index 0)
+    m.tap(*random_point(deploy_1, 5)).human_delay(0.3, 0.6)
     
     # STEP 2: Deploy Troop 2 - Dragons (with hold at dragon location)
-    print(f"[*-{RUN_TAG}] Step 2: Deploying Troop 2 (Dragons with hold)...")
-    tap(*troop_icons[1]); human_delay()  # Select Troop 2 (index 1)
-    tap_and_hold(*random_point(deploy_1, 5), duration_ms=2500); human_delay(0.5, 1)
+    m.tap(*troop_icons[1]).human_delay()  # Select Troop 2 (index 1)
+    m.hold(*random_point(deploy_1, 5), duration_ms=2500).human_delay(0.5, 1)
     
     # STEP 3: Deploy Siege Machine (Troop 3) - ONCE at dragon location (NOT a hero)
-    print(f"[*-{RUN_TAG}] Step 3: Deploying Siege Machine (Troop 3) once...")
     siege_coords = troop_icons[2]
-    print(f"[DEBUG-{RUN_TAG}] Tapping Siege Machine icon at {siege_coords}")
-    tap(*siege_coords); human_delay()  # Select Troop 3 - Siege Machine (index 2)
+    m.tap(*siege_coords).human_delay()  # Select Troop 3 - Siege Machine (index 2)
     deploy_point = random_point(deploy_1, 5)
-    print(f"[DEBUG-{RUN_TAG}] Deploying Siege Machine at {deploy_point}")
-    tap(*deploy_point)  # Deploy once
-    print(f"[DEBUG-{RUN_TAG}] Siege Machine deployed. Waiting brief delay...")
-    human_delay(0.5, 0.8)  # Brief delay after siege
-    print(f"[DEBUG-{RUN_TAG}] Siege Machine step complete. Moving to heroes...")
+    print(f"[DEBUG-{RUN_TAG}] Siege Machine {siege_coords} -> {deploy_point}")
+    m.tap(*deploy_point)  # Deploy once
+    m.human_delay(0.5, 0.8)  # Brief delay after siege
     
     # STEP 4: Deploy ALL 4 HEROES (Troops 4-7, indices 3-6)
     # Hero 1 (index 3): Deploy at dragon location (deploy_1), wait 4s, activate ability
-    print(f"[*-{RUN_TAG}] Step 4: Deploying Hero 1 (Troop 4 at index 3) at dragon location...")
     hero1_coords = troop_icons[3]
-    print(f"[DEBUG-{RUN_TAG}] Hero 1 icon position: {hero1_coords}")
-    tap(*hero1_coords); human_delay()  # Select Hero 1 (index 3)
+    m.tap(*hero1_coords).human_delay()  # Select Hero 1 (index 3)
     deploy_point = random_point(deploy_1, 5)
-    print(f"[DEBUG-{RUN_TAG}] Deploying Hero 1 at {deploy_point}")
-    tap(*deploy_point)  # Deploy at dragon location
-    print(f"[*-{RUN_TAG}] Waiting 4s before activating Hero 1 ability...")
-    sleep(4)  # Wait 4 seconds
-    print(f"[DEBUG-{RUN_TAG}] Tapping Hero 1 icon again at {hero1_coords} to activate ability...")
-    tap(*hero1_coords); human_delay(0.9, 1.4)  # Activate ability
-    print(f"[*-{RUN_TAG}] Hero 1 deployed and ability activated!")
+    print(f"[DEBUG-{RUN_TAG}] Hero 1 {hero1_coords} -> {deploy_point}, ability after 4s")
+    m.tap(*deploy_point)  # Deploy at dragon location
+    m.sleep(4)  # Wait 4 seconds
+    m.tap(*hero1_coords).human_delay(0.9, 1.4)  # Activate ability
     
     # STEP 5: Deploy Heroes 2-4 (Troops 5-7, indices 4-6) at secondary location
-    # Each hero: deploy at deploy_2, wait 1s, activate ability
-    print(f"[*-{RUN_TAG}] Step 5: Deploying Heroes 2-4 at secondary location...")
-    for hero_offset in range(3):  # Loop 3 times for Heroes 2, 3, 4
-        hero_index = 4 + hero_offset  # indices: 4, 5, 6
-        hero_num = hero_offset + 2  # Hero numbers: 2, 3, 4
-        hero_coords = troop_icons[hero_index]
-        expected_x = 220 + hero_index * 118
-        print(f"[*-{RUN_TAG}] Deploying Hero {hero_num} (Troop {hero_index + 1} at index {hero_index})...")
-        print(f"[DEBUG-{RUN_TAG}] Hero {hero_num} icon at {hero_coords} (expected x={expected_x})")
-        
-        tap(*hero_coords); human_delay()  # Select hero
+    # Deploy all three back to back, wait 1s, then activate the three
+    # abilities with one multi-finger tap on their icons
+    hero_icons = troop_icons[4:7]  # indices: 4, 5, 6
+    for hero_num, hero_coords in enumerate(hero_icons, 2):  # Heroes 2, 3, 4
+        m.tap(*hero_coords).human_delay()  # Select hero
         deploy_point = random_point(deploy_2, 5)
-        print(f"[DEBUG-{RUN_TAG}] Deploying Hero {hero_num} at {deploy_point}")
-        tap(*deploy_point)  # Deploy at secondary location
-        print(f"[*-{RUN_TAG}] Waiting 1s before activating Hero {hero_num} ability...")
-        sleep(1)  # Wait 1 second
-        print(f"[DEBUG-{RUN_TAG}] Tapping Hero {hero_num} icon at {hero_coords} to activate ability...")
-        tap(*hero_coords); human_delay(0.3, 0.5)  # Activate ability
-        print(f"[*-{RUN_TAG}] Hero {hero_num} deployed and ability activated!")
+        print(f"[DEBUG-{RUN_TAG}] Hero {hero_num} {hero_coords} -> {deploy_point}")
+        m.tap(*deploy_point).human_delay(0.15, 0.25)  # Deploy at secondary location
+    m.sleep(1)  # Wait 1 second
+    m.multi_tap(hero_icons).human_delay(0.3, 0.5)  # Activate all three abilities
     
-    # STEP 6: Deploy Spells (Troop 8)
-    print(f"[*-{RUN_TAG}] Step 6: Deploying Spells (Troop 8)...")
-    tap(*troop_icons[7]); human_delay()  # Select Troop 8 (index 7)
+    # STEP 6: Deploy Spells (Troop 8) - all five targets in one multi-finger gesture
+    m.tap(*troop_icons[7]).human_delay()  # Select Troop 8 (index 7)
     spell_locations = [(900, 350), (700, 480), (900, 600), (830, 480), (900, 480)]
-    for i, loc in enumerate(spell_locations, 1):
-        print(f"[*-{RUN_TAG}] Deploying spell {i}/5 at {loc}...")
-        tap(*random_point(loc, 15))
-        human_delay(0.2, 0.4)
-    print(f"[*-{RUN_TAG}] All spells deployed!")
+    m.multi_tap([random_point(loc, 15) for loc in spell_locations])
+    m.human_delay(0.2, 0.4)
 
-    print(f"[+{RUN_TAG}] All troops deployed successfully!")
+    print(f"[*-{RUN_TAG}] Running {m} (balloon, dragons, siege, 4 heroes, 5 spells)...")
+    if run_macro(m):
+        print(f"[+{RUN_TAG}] All troops deployed successfully!")
+    else:
+        print(f"[-{RUN_TAG}] Deploy macro did not finish.")
 
 # ========= MAIN LOOP =========
 start_time = time.time()
@@ -237,27 +320,21 @@ while True:
 
     print(f"[*{RUN_TAG}] =========================================================")
     print(f"[*{RUN_TAG}] Taking screenshot...")
-    take_screenshot(SCREEN_PATH)
-    draw_full_debug_overlay()  # uses per-instance default path
+    loot = scan_loot()
 
-    sleep(1.5)
-    save_loot_crop()
-
-    loot = extract_loot_values(SCREEN_PATH)
-
-    if loot == (0, 0, 0):
+    if zero_loot(loot):
         for attempt in range(2):
             print(f"[!{RUN_TAG}] Loot 0,0,0 detected. Retrying OCR attempt {attempt+1}...")
             sleep(2)
-            take_screenshot(SCREEN_PATH)
-            draw_full_debug_overlay()
-            sleep(1.5)
-            save_loot_crop()
-            loot = extract_loot_values(SCREEN_PATH)
-            if loot != (0, 0, 0):
+            loot = scan_loot()
+            if not zero_loot(loot):
                 break
 
-    if loot == (0, 0, 0):
+    if loot is CAPTURE_FAILED:
+        sleep(2)
+        continue  # scan again rather than act on a base nobody looked at
+
+    if zero_loot(loot):
         zero_loot_count += 1
         print(f"[!{RUN_TAG}] Consecutive zero loot count: {zero_loot_count}")
     else:
@@ -269,12 +346,16 @@ while True:
             tap(*coords); sleep(2)
         continue
 
-    if loot:
+    if loot is PREFILTERED:
+        print(f"[-{RUN_TAG}] Too few loot digits. Skipping base without OCR.")
+    elif loot:
         gold, elixir, dark = loot
-        print(f"[+{RUN_TAG}] Loot parsed: Gold={gold}, Elixir={elixir}, Dark={dark}")
-        if ((gold >= GOLD_THRESHOLD and elixir >= ELIXIR_THRESHOLD and dark >= DARK_THRESHOLD)
-            or gold >= 1_200_000 or elixir >= 1_200_000):
+        print(f"[+{RUN_TAG}] Loot parsed: Gold={show_loot(gold)}, Elixir={show_loot(elixir)}, "
+              f"Dark={show_loot(dark)}")
+        if loot_sufficient(gold, elixir, dark, LOOT_MINIMUMS):
             print(f"[+{RUN_TAG}] Loot is sufficient. Attacking base...")
+            if FRAME_BUS is not None:
+                FRAME_BUS.pause()  # no captures during the battle; the next scan resumes
             deploy_troops()
 
             print(f"[*{RUN_TAG}] Waiting {POST_ATTACK_WAIT} seconds...")
@@ -1,10 +1,10 @@
-from utils.adb_helper import take_screenshot, tap, tap_and_hold, ensure_connection
+from utils.adb_helper import capture_frame, tap, tap_and_hold, ensure_connection, warm_up
+from utils.loot_ocr import make_loot_reader, read_loot, loot_sufficient, show_loot, zero_loot
 from time import sleep
 from pathlib import Path
 from datetime import datetime
 import cv2
 import easyocr
-import re
 import random
 import math
 import time
@@ -21,7 +21,6 @@ def human_delay(min_s=0.15, max_s=0.4):
     sleep(random.uniform(min_s, max_s))
 
 # ========== CONFIG ==========
-SCREEN_PATH = "screen.png"
 DATASET_DIR = "loot_dataset"
 POST_ATTACK_WAIT = 60
 # Updated return-to-base tap sequence
@@ -37,8 +36,11 @@ POST_ATTACK_TAPS = [
 GOLD_THRESHOLD = 800000
 ELIXIR_THRESHOLD = 800000
 DARK_THRESHOLD = 0
+LOOT_MINIMUMS = (GOLD_THRESHOLD, ELIXIR_THRESHOLD, DARK_THRESHOLD)
 
-reader = easyocr.Reader(['en'], gpu=False)
+# Select the device while the OCR model loads
+reader = warm_up(lambda: easyocr.Reader(['en'], gpu=False))
+loot_reader = make_loot_reader(reader)  # LOOT_OCR_ENGINE=cascade|template|easyocr
 
 # Prompt hero count once at the start
 try:
@@ -49,11 +51,8 @@ except ValueError:
     HERO_COUNT = 0
 
 # ========== DEBUG OVERLAY ==========
-def draw_full_debug_overlay(image_path="screen.png", output_path="debug_full_overlay.png"):
-    img = cv2.imread(image_path)
-    if img is None:
-        print("[-] Failed to load screenshot for overlay.")
-        return
+def draw_full_debug_overlay(frame, output_path="debug_full_overlay.png"):
+    img = frame.copy()  # the frame itself still goes to OCR
 
     boxes = {
         "Gold":   (65, 113, 205, 142),
@@ -103,9 +102,8 @@ def draw_full_debug_overlay(image_path="screen.png", output_path="debug_full_ove
     print(f"[+] Debug overlay saved: {output_path}")
 
 # ========== LOOT IMAGE SAVE ==========
-def save_loot_crop():
+def save_loot_crop(img):
     Path(DATASET_DIR).mkdir(parents=True, exist_ok=True)
-    img = cv2.imread(SCREEN_PATH)
     if img is None or img.shape[0] == 0:
         print("[-] Screenshot invalid.")
         return
@@ -115,24 +113,26 @@ def save_loot_crop():
     print(f"[+] Saved loot panel to: {out_path}")
 
 # ========== OCR LOOT ==========
-def extract_loot_values(image_path):
-    image = cv2.imread(image_path)
+def extract_loot_values(image):
     if image is None:
         print("[-] Could not load screenshot.")
         return None
-    crops = {
-        "gold": image[113:142, 65:205],
-        "elixir": image[158:185, 65:205],
-        "dark": image[198:228, 65:180],
-    }
-    loot = {}
-    for key, crop in crops.items():
-        result = reader.readtext(crop, detail=0)
-        text = ''.join(result)
-        digits = re.sub(r'[^\d]', '', text)
-        loot[key] = int(digits) if digits.isdigit() else 0
-    print(f"[OCR] Parsed Loot: Gold={loot['gold']}, Elixir={loot['elixir']}, Dark={loot['dark']}")
-    return loot['gold'], loot['elixir'], loot['dark']
+    # Only the fields the attack rule needs (LOOT_LAZY=0 reads all three)
+    gold, elixir, dark = read_loot(loot_reader, image, LOOT_MINIMUMS)
+    print(f"[OCR] Parsed Loot: Gold={show_loot(gold)}, Elixir={show_loot(elixir)}, "
+          f"Dark={show_loot(dark)}")
+    return gold, elixir, dark
+
+def scan_screenshot():
+    # Overlay, dataset save and OCR all use the captured frame; None if there is none
+    img = capture_frame()
+    if img is None:
+        print("[-] No screenshot; not reading loot from an old one.")
+        return None
+    draw_full_debug_overlay(img)
+    sleep(1.5)
+    save_loot_crop(img)
+    return extract_loot_values(img)
 
 # ========== TROOP DEPLOYMENT ==========
 def deploy_troops():
@@ -217,27 +217,21 @@ while True:
 
     print("[*] =========================================================")
     print("[*] Taking screenshot...")
-    take_screenshot(SCREEN_PATH)
-    draw_full_debug_overlay(SCREEN_PATH)
-
-    sleep(1.5)
-    save_loot_crop()
+    loot = scan_screenshot()
 
-    loot = extract_loot_values(SCREEN_PATH)
-
-    if loot == (0, 0, 0):
+    if zero_loot(loot):
         for attempt in range(2):
             print(f"[!] Loot 0,0,0 detected. Retrying OCR attempt {attempt+1}...")
             sleep(2)
-            take_screenshot(SCREEN_PATH)
-            draw_full_debug_overlay(SCREEN_PATH)
-            sleep(1.5)
-            save_loot_crop()
-            loot = extract_loot_values(SCREEN_PATH)
-            if loot != (0, 0, 0):
+            loot = scan_screenshot()
+            if not zero_loot(loot):
                 break
 
-    if loot == (0, 0, 0):
+    if loot is None:
+        sleep(2)
+        continue  # scan again rather than act on a base nobody looked at
+
+    if zero_loot(loot):
         zero_loot_count += 1
         print(f"[!] Consecutive zero loot count: {zero_loot_count}")
     else:
@@ -252,12 +246,9 @@ while True:
 
     if loot:
         gold, elixir, dark = loot
-        print(f"[+] Loot parsed: Gold={gold}, Elixir={elixir}, Dark={dark}")
-        if (
-            (gold >= GOLD_THRESHOLD and elixir >= ELIXIR_THRESHOLD and dark >= DARK_THRESHOLD)
-            or gold >= 1_200_000
-            or elixir >= 1_200_000
-        ):
+        print(f"[+] Loot parsed: Gold={show_loot(gold)}, Elixir={show_loot(elixir)}, "
+              f"Dark={show_loot(dark)}")
+        if loot_sufficient(gold, elixir, dark, LOOT_MINIMUMS):
             print("[+] Loot is sufficient. Attacking base...")
             deploy_troops()
 
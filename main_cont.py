@@ -1,17 +1,21 @@
 # main.py
 from utils.adb_helper import (
-    take_screenshot, tap, tap_and_hold, ensure_connection, get_selected_device
+    capture_frame, tap, ensure_connection, get_selected_device,
+    start_frame_stream, run_macro, warm_up, capture_roi, start_dispatcher, idle_tap, timed
 )
+from utils.macro import Macro
+from utils.loot_ocr import make_loot_reader, read_loot, loot_sufficient, show_loot, zero_loot
+from utils.frame_bus import start_capture_process, stop_capture_process
 from time import sleep
 from pathlib import Path
 from datetime import datetime
 import cv2
 import easyocr
-import re
 import random
 import math
 import time
 import os
+import atexit
 import threading
 import signal
 
@@ -75,13 +79,41 @@ class ClickWatcher:
 watcher = ClickWatcher()
 watcher.start()
 
+# Select the device while the OCR model loads
+reader = warm_up(lambda: easyocr.Reader(['en'], gpu=False))
+loot_reader = make_loot_reader(reader)  # LOOT_OCR_ENGINE=cascade|template|easyocr
+
 # ========= PER-INSTANCE NAMESPACING (CRITICAL) =========
 RUN_TAG = os.getenv("RUN_TAG") or get_selected_device().replace(":", "_")
-SCREEN_PATH        = f"screen_{RUN_TAG}.png"
 DATASET_DIR        = f"loot_dataset/{RUN_TAG}"
 DEBUG_OVERLAY_PATH = f"debug_full_overlay_{RUN_TAG}.png"
 
-print(f"[BOOT] RUN_TAG={RUN_TAG} | SCREEN_PATH={SCREEN_PATH} | DATASET_DIR={DATASET_DIR}")
+print(f"[BOOT] RUN_TAG={RUN_TAG} | DATASET_DIR={DATASET_DIR}")
+
+# Opt-in: keep a background capture pipe running so screenshots come from a ring buffer
+# (ADB_FRAME_STREAM=1 loops raw screencap, ADB_FRAME_STREAM=screenrecord decodes H.264)
+FRAME_STREAM = os.getenv("ADB_FRAME_STREAM", "0")
+if FRAME_STREAM != "0":
+    start_frame_stream(backend="screenrecord" if FRAME_STREAM == "screenrecord" else "screencap")
+
+# Opt-in: route all device I/O through a priority queue (deploy taps > captures >
+# keep-alive taps) instead of calling adb from the loop thread (ADB_DISPATCHER=1)
+if os.getenv("ADB_DISPATCHER", "0") != "0":
+    start_dispatcher()
+
+# Opt-in: the search loop reads only the loot panel rows from the device instead of
+# a full screenshot (no debug overlay / loot_dataset save in this mode)
+LOOT_ROI_CAPTURE = os.getenv("LOOT_ROI_CAPTURE", "0") != "0"
+LOOT_BOX = (65, 113, 205, 228)  # x1, y1, x2, y2 around the gold/elixir/dark numbers
+CAPTURE_FAILED = "capture_failed"  # scan result when no screenshot came back
+
+# Opt-in: a separate capture process keeps the newest frame in shared memory; the
+# overlay, dataset save and OCR read it in place instead of a capture of their own
+# (one capture every FRAME_BUS_INTERVAL seconds, none while paused for a battle)
+FRAME_BUS = None
+if os.getenv("FRAME_BUS", "0") != "0":
+    FRAME_BUS, _capture_proc = start_capture_process(get_selected_device())
+    atexit.register(stop_capture_process, FRAME_BUS, _capture_proc)
 
 # ========= HELPERS =========
 def random_point(center, radius):
@@ -148,7 +180,7 @@ def keepalive_until_user_click():
         px = jitter(1200, spread=8)
         py = jitter(900, spread=8)
         print(f"[keepalive-{RUN_TAG}] Anti-sleep tap at ({px},{py})")
-        tap(px, py)
+        idle_tap(px, py)
 
 # ========= CONFIG =========
 POST_ATTACK_WAIT = 60
@@ -157,8 +189,7 @@ POST_ATTACK_TAPS = [(800, 850), (97, 900), (250, 700)]
 GOLD_THRESHOLD = 800000
 ELIXIR_THRESHOLD = 800000
 DARK_THRESHOLD = 0
-
-reader = easyocr.Reader(['en'], gpu=False)
+LOOT_MINIMUMS = (GOLD_THRESHOLD, ELIXIR_THRESHOLD, DARK_THRESHOLD)
 
 # Prompt hero count once at the start
 try:
@@ -169,11 +200,8 @@ except ValueError:
     HERO_COUNT = 0
 
 # ========= DEBUG OVERLAY =========
-def draw_full_debug_overlay(image_path=SCREEN_PATH, output_path=DEBUG_OVERLAY_PATH):
-    img = cv2.imread(image_path)
-    if img is None:
-        print("[-] Failed to load screenshot for overlay.")
-        return
+def draw_full_debug_overlay(frame, output_path=DEBUG_OVERLAY_PATH):
+    img = frame.copy()  # the frame itself still goes to OCR
 
     boxes = {
         "Gold":   (65, 113, 205, 142),
@@ -215,9 +243,8 @@ def draw_full_debug_overlay(image_path=SCREEN_PATH, output_path=DEBUG_OVERLAY_PA
     print(f"[+] Debug overlay saved: {output_path}")
 
 # ========= LOOT IMAGE SAVE =========
-def save_loot_crop():
+def save_loot_crop(img):
     Path(DATASET_DIR).mkdir(parents=True, exist_ok=True)
-    img = cv2.imread(SCREEN_PATH)
     if img is None or img.shape[0] == 0:
         print("[-] Screenshot invalid.")
         return
@@ -227,24 +254,16 @@ def save_loot_crop():
     print(f"[+] Saved loot panel to: {out_path}")
 
 # ========= OCR LOOT =========
-def extract_loot_values(image_path):
-    image = cv2.imread(image_path)
+def extract_loot_values(image, origin=(0, 0)):
+    # image's top-left sits at `origin` on screen
     if image is None:
         print("[-] Could not load screenshot.")
         return None
-    crops = {
-        "gold": image[113:142, 65:205],
-        "elixir": image[158:185, 65:205],
-        "dark": image[198:228, 65:180],
-    }
-    loot = {}
-    for key, crop in crops.items():
-        result = reader.readtext(crop, detail=0)
-        text = ''.join(result)
-        digits = re.sub(r'[^\d]', '', text)
-        loot[key] = int(digits) if digits.isdigit() else 0
-    print(f"[OCR-{RUN_TAG}] Gold={loot['gold']} Elixir={loot['elixir']} Dark={loot['dark']}")
-    return loot['gold'], loot['elixir'], loot['dark']
+    with timed("ocr"):  # kept next to the adb timings in get_metrics()
+        # Only the fields the attack rule needs (LOOT_LAZY=0 reads all three)
+        gold, elixir, dark = read_loot(loot_reader, image, LOOT_MINIMUMS, origin)
+    print(f"[OCR-{RUN_TAG}] Gold={show_loot(gold)} Elixir={show_loot(elixir)} Dark={show_loot(dark)}")
+    return gold, elixir, dark
 
 # ========= TROOP DEPLOYMENT =========
 def deploy_troops():
@@ -255,65 +274,98 @@ def deploy_troops():
     troop_icons = [(220 + i * 118, 910) for i in range(8)]
     deploy_1 = (1526, 450)  # Dragon/primary deployment location
     deploy_2 = (180, 480)   # Secondary deployment location
+
+    # The whole sequence runs on the device as one macro; a user click
+    # (watcher.event) cancels it mid-way.
+    m = Macro("deploy_troops")
     
     # STEP 1: Deploy Troop 1 - Balloon (1 time at dragon location)
-    print(f"[*-{RUN_TAG}] Step 1: Deploying Troop 1 (Balloon) once...")
-    tap(*troop_icons[0]); human_delay()  # Select Troop 1 (index 0)
-    tap(*random_point(deploy_1, 5)); human_delay(0.3, 0.6)
-    if maybe_handle_user_input(): raise RestartLoop
+    m.tap(*troop_icons[0]).human_delay()  # Select Troop 1 (index 0)
+    m.tap(*random_point(deploy_1, 5)).human_delay(0.3, 0.6)
     
     # STEP 2: Deploy Troop 2 - Dragons (with hold at dragon location)
-    print(f"[*-{RUN_TAG}] Step 2: Deploying Troop 2 (Dragons with hold)...")
-    tap(*troop_icons[1]); human_delay()  # Select Troop 2 (index 1)
-    tap_and_hold(*random_point(deploy_1, 5), duration_ms=2500); human_delay(0.5, 1)
-    if maybe_handle_user_input(): raise RestartLoop
+    m.tap(*troop_icons[1]).human_delay()  # Select Troop 2 (index 1)
+    m.hold(*random_point(deploy_1, 5), duration_ms=2500).human_delay(0.5, 1)
     
     # STEP 3: Deploy Siege Machine (Troop 3) - ONCE at dragon location (NOT a hero)
-    print(f"[*-{RUN_TAG}] Step 3: Deploying Siege Machine (Troop 3) once...")
-    tap(*troop_icons[2]); human_delay()  # Select Troop 3 - Siege Machine (index 2)
-    tap(*random_point(deploy_1, 5))  # Deploy once
-    human_delay(0.5, 0.8)  # Brief delay after siege
-    if maybe_handle_user_input(): raise RestartLoop
+    m.tap(*troop_icons[2]).human_delay()  # Select Troop 3 - Siege Machine (index 2)
+    m.tap(*random_point(deploy_1, 5))  # Deploy once
+    m.human_delay(0.5, 0.8)  # Brief delay after siege
     
     # STEP 4: Deploy ALL 4 HEROES (Troops 4-7, indices 3-6)
     # Hero 1 (index 3): Deploy at dragon location (deploy_1), wait 4s, activate ability
-    print(f"[*-{RUN_TAG}] Step 4: Deploying Hero 1 (Troop 4 at index 3) at dragon location...")
-    tap(*troop_icons[3]); human_delay()  # Select Hero 1 (index 3)
-    tap(*random_point(deploy_1, 5))  # Deploy at dragon location
-    print(f"[*-{RUN_TAG}] Waiting 4s before activating Hero 1 ability...")
-    if sleep_interruptible(4): raise RestartLoop  # Wait 4 seconds
-    tap(*troop_icons[3]); human_delay(0.9, 1.4)  # Activate ability
-    print(f"[*-{RUN_TAG}] Hero 1 deployed and ability activated!")
-    if maybe_handle_user_input(): raise RestartLoop
+    m.tap(*troop_icons[3]).human_delay()  # Select Hero 1 (index 3)
+    m.tap(*random_point(deploy_1, 5))  # Deploy at dragon location
+    m.sleep(4)  # Wait 4 seconds
+    m.tap(*troop_icons[3]).human_delay(0.9, 1.4)  # Activate ability
     
     # STEP 5: Deploy Heroes 2-4 (Troops 5-7, indices 4-6) at secondary location
-    # Each hero: deploy at deploy_2, wait 1s, activate ability
-    print(f"[*-{RUN_TAG}] Step 5: Deploying Heroes 2-4 at secondary location...")
-    for hero_offset in range(3):  # Loop 3 times for Heroes 2, 3, 4
-        hero_index = 4 + hero_offset  # indices: 4, 5, 6
-        hero_num = hero_offset + 2  # Hero numbers: 2, 3, 4
-        print(f"[*-{RUN_TAG}] Deploying Hero {hero_num} (Troop {hero_index + 1} at index {hero_index})...")
-        
-        tap(*troop_icons[hero_index]); human_delay()  # Select hero
-        tap(*random_point(deploy_2, 5))  # Deploy at secondary location
-        print(f"[*-{RUN_TAG}] Waiting 1s before activating Hero {hero_num} ability...")
-        if sleep_interruptible(1): raise RestartLoop  # Wait 1 second
-        tap(*troop_icons[hero_index]); human_delay(0.3, 0.5)  # Activate ability
-        print(f"[*-{RUN_TAG}] Hero {hero_num} deployed and ability activated!")
-        if maybe_handle_user_input(): raise RestartLoop
-      # STEP 6: Deploy Spells (Troop 8)
-    print(f"[*-{RUN_TAG}] Step 6: Deploying Spells (Troop 8)...")
-    tap(*troop_icons[7]); human_delay()  # Select Troop 8 (index 7)
+    # Deploy all three back to back, wait 1s, then activate the three
+    # abilities with one multi-finger tap on their icons
+    hero_icons = troop_icons[4:7]  # indices: 4, 5, 6
+    for hero_coords in hero_icons:
+        m.tap(*hero_coords).human_delay()  # Select hero
+        m.tap(*random_point(deploy_2, 5)).human_delay(0.15, 0.25)  # Deploy at secondary location
+    m.sleep(1)  # Wait 1 second
+    m.multi_tap(hero_icons).human_delay(0.3, 0.5)  # Activate all three abilities
+
+    # STEP 6: Deploy Spells (Troop 8) - all five targets in one multi-finger gesture
+    m.tap(*troop_icons[7]).human_delay()  # Select Troop 8 (index 7)
     spell_locations = [(900, 350), (700, 480), (900, 600), (830, 480), (900, 480)]
-    for i, loc in enumerate(spell_locations, 1):
-        print(f"[*-{RUN_TAG}] Deploying spell {i}/5 at {loc}...")
-        tap(*random_point(loc, 15))
-        human_delay(0.2, 0.4)
-        if maybe_handle_user_input(): raise RestartLoop
-    print(f"[*-{RUN_TAG}] All spells deployed!")
+    m.multi_tap([random_point(loc, 15) for loc in spell_locations])
+    m.human_delay(0.2, 0.4)
+
+    print(f"[*-{RUN_TAG}] Running {m} (balloon, dragons, siege, 4 heroes, 5 spells)...")
+    if not run_macro(m, cancel=watcher.event):
+        maybe_handle_user_input()
+        raise RestartLoop
     
     print(f"[+{RUN_TAG}] All troops deployed.")
 
+def scan_screenshot():
+    # Overlay, dataset save and OCR all use the captured frame; nothing goes through disk
+    img = capture_frame()
+    if img is None:
+        print(f"[-{RUN_TAG}] No screenshot; not reading loot from an old one.")
+        return CAPTURE_FAILED
+    draw_full_debug_overlay(img)
+    if sleep_interruptible(1.5):
+        raise RestartLoop  # next loop will process the user click
+    save_loot_crop(img)
+    return extract_loot_values(img)
+
+def scan_bus_frame():
+    # Overlay, dataset save and OCR all read the same shared-memory frame
+    global FRAME_BUS
+    if _capture_proc.poll() is not None:
+        print(f"[-{RUN_TAG}] Capture process exited ({_capture_proc.returncode}); "
+              f"taking screenshots directly from now on.")
+        FRAME_BUS = None  # the atexit hook still frees the shared memory
+        return scan_screenshot()
+    FRAME_BUS.resume()  # paused during battles
+    with FRAME_BUS.frame(newer_than=time.time(), timeout=15) as (seq, img):
+        if img is None:
+            print("[-] No frame from the capture process.")
+            return CAPTURE_FAILED
+        draw_full_debug_overlay(img)
+        if sleep_interruptible(1.5):
+            raise RestartLoop  # next loop will process the user click
+        save_loot_crop(img)
+        return extract_loot_values(img)
+
+def scan_loot():
+    # One look at the loot panel: just its rows (LOOT_ROI_CAPTURE), the shared-memory
+    # frame (FRAME_BUS) or a full screenshot
+    if LOOT_ROI_CAPTURE:
+        panel = capture_roi(LOOT_BOX)
+        if panel is None:
+            print(f"[-{RUN_TAG}] No loot panel capture; not reading loot from an old one.")
+            return CAPTURE_FAILED
+        return extract_loot_values(panel, origin=LOOT_BOX[:2])
+    if FRAME_BUS is not None:
+        return scan_bus_frame()
+    return scan_screenshot()
+
 # ========= CONTROL FLOW EXCEPTION =========
 class RestartLoop(Exception):
     """Signal to restart the main loop immediately."""
@@ -345,33 +397,25 @@ while True:
 
         print(f"[*{RUN_TAG}] =========================================================")
         print(f"[*{RUN_TAG}] Taking screenshot...")
-        take_screenshot(SCREEN_PATH)
-        draw_full_debug_overlay()  # uses per-instance default path
-
-        if sleep_interruptible(1.5):  # instead of sleep(1.5)
-            continue  # next loop will process the user click
-
-        save_loot_crop()
+        loot = scan_loot()
         if maybe_handle_user_input():
             start_time = time.time()
             zero_loot_count = 0
             continue
 
-        loot = extract_loot_values(SCREEN_PATH)
-
-        if loot == (0, 0, 0):
+        if zero_loot(loot):
             for attempt in range(2):
                 print(f"[!{RUN_TAG}] Loot 0,0,0 detected. Retrying OCR attempt {attempt+1}...")
                 if sleep_interruptible(2): raise RestartLoop
-                take_screenshot(SCREEN_PATH)
-                draw_full_debug_overlay()
-                if sleep_interruptible(1.5): raise RestartLoop
-                save_loot_crop()
-                loot = extract_loot_values(SCREEN_PATH)
-                if loot != (0, 0, 0):
+                loot = scan_loot()
+                if not zero_loot(loot):
                     break
 
-        if loot == (0, 0, 0):
+        if loot is CAPTURE_FAILED:
+            if sleep_interruptible(2): raise RestartLoop
+            continue  # scan again rather than act on a base nobody looked at
+
+        if zero_loot(loot):
             zero_loot_count += 1
             print(f"[!{RUN_TAG}] Consecutive zero loot count: {zero_loot_count}")
         else:
@@ -386,10 +430,12 @@ while True:
 
         if loot:
             gold, elixir, dark = loot
-            print(f"[+{RUN_TAG}] Loot parsed: Gold={gold}, Elixir={elixir}, Dark={dark}")
-            if ((gold >= GOLD_THRESHOLD and elixir >= ELIXIR_THRESHOLD and dark >= DARK_THRESHOLD)
-                or gold >= 1_200_000 or elixir >= 1_200_000):
+            print(f"[+{RUN_TAG}] Loot parsed: Gold={show_loot(gold)}, Elixir={show_loot(elixir)}, "
+                  f"Dark={show_loot(dark)}")
+            if loot_sufficient(gold, elixir, dark, LOOT_MINIMUMS):
                 print(f"[+{RUN_TAG}] Loot is sufficient. Attacking base...")
+                if FRAME_BUS is not None:
+                    FRAME_BUS.pause()  # no captures during the battle; the next scan resumes
                 deploy_troops()
 
                 print(f"[*{RUN_TAG}] Waiting {POST_ATTACK_WAIT} seconds...")
@@ -0,0 +1,38 @@
+import pytest
+
+from utils import adb_helper
+from utils.adb_client import AdbClient
+from utils.fake_adb_server import FakeAdbServer, FakeDevice
+
+
+@pytest.fixture
+def fake_device():
+    return FakeDevice("emu-1", width=160, height=90)
+
+
+@pytest.fixture
+def fake_server(fake_device):
+    srv = FakeAdbServer([fake_device]).start()
+    yield srv
+    srv.stop()
+
+
+@pytest.fixture
+def client(fake_server):
+    return AdbClient(fake_server.host, fake_server.port, timeout=5)
+
+
+@pytest.fixture
+def device(client, monkeypatch):
+    """adb_helper.Device for the fake device, talking to the fake server."""
+    monkeypatch.setattr(adb_helper, "_client", lambda: client)
+    monkeypatch.setattr(adb_helper, "TRACK_DEVICES", False)
+    monkeypatch.setattr(adb_helper, "TRACKER", adb_helper.DeviceTracker())
+    dev = adb_helper.Device("emu-1")
+    # module-level helpers (get_device(), tap(), ...) resolve to it as well
+    pool = adb_helper.DevicePool()
+    pool._devices["emu-1"] = dev
+    monkeypatch.setattr(adb_helper, "POOL", pool)
+    monkeypatch.setattr(adb_helper, "ADB_DEVICE", "emu-1")
+    yield dev
+    dev.close()
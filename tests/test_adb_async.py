@@ -0,0 +1,49 @@
+import asyncio
+import subprocess
+
+import numpy as np
+import pytest
+
+from utils import adb_async
+from utils.adb_helper import ShellSession
+
+
+def test_split_marker():
+    assert ShellSession.split_marker("output\n") is None
+    assert ShellSession.split_marker(f"tail{ShellSession.MARKER}3\n") == ("tail", 3)
+    assert ShellSession.split_marker(f"{ShellSession.MARKER}\n") == ("", 0)
+    assert ShellSession.marked("true").startswith("true; echo ")
+
+
+def _run(device, coro_fn):
+    async def main():
+        adev = adb_async.AsyncDevice(device)
+        try:
+            return await coro_fn(adev)
+        finally:
+            await adev.close()
+    return asyncio.run(main())
+
+
+def test_async_shell_output_and_status(device, fake_device):
+    async def go(adev):
+        assert await adev.shell("echo hi") == "hi\n"
+        with pytest.raises(subprocess.CalledProcessError) as err:
+            await adev.shell("false")
+        assert err.value.returncode == 1
+        await adev.tap(3, 4)
+    _run(device, go)
+    assert [line for _, line in fake_device.inputs] == ["tap 3 4"]
+
+
+def test_async_capture_matches_sync(device):
+    img = _run(device, lambda adev: adev.capture_frame())
+    assert np.array_equal(img, device.capture_frame())
+    assert device.counters.snapshot()["captures"] == 2
+
+
+def test_async_capture_failure_is_accounted_like_sync(device, fake_server):
+    fake_server.set_state("emu-1", "offline")
+    assert _run(device, lambda adev: adev.capture_frame(retries=2, delay=0)) is None
+    assert device.capture_frame(retries=2, delay=0) is None
+    assert device.counters.snapshot()["capture_failures"] == 4
@@ -0,0 +1,48 @@
+import socket
+
+import pytest
+
+from utils.adb_client import AdbError, _send_request, parse_device_list
+
+
+def test_host_requests(client, fake_server):
+    assert client.version() == 0x29
+    assert client.devices() == {"emu-1": "device"}
+    fake_server.set_state("emu-1", "offline")
+    assert client.devices() == {"emu-1": "offline"}
+
+
+def test_parse_device_list_skips_headers_and_blanks():
+    text = "emu-1\tdevice\n\nemu-2\toffline \nList of devices attached\n"
+    assert parse_device_list(text) == {"emu-1": "device", "emu-2": "offline"}
+
+
+def test_request_framing(fake_server):
+    # 4 hex digits of length, then the request; OKAY/FAIL + length-prefixed reply
+    with socket.create_connection((fake_server.host, fake_server.port)) as sock:
+        sock.sendall(b"000chost:version")
+        assert sock.recv(12) == b"OKAY00040029"
+    with socket.create_connection((fake_server.host, fake_server.port)) as sock:
+        with pytest.raises(AdbError, match="unknown request"):
+            _send_request(sock, "host:bogus")
+
+
+def test_transport_then_shell_and_exec(client, fake_device):
+    assert client.shell("emu-1", "echo hello") == "hello\n"
+    raw = client.exec_out("emu-1", "screencap")
+    assert len(raw) == 16 + 160 * 90 * 4
+    assert client.exec_out("emu-1", "screencap", limit=16)[:8] == b"\xa0\0\0\0Z\0\0\0"
+    assert fake_device.commands == ["echo hello", "screencap", "screencap"]
+
+
+def test_transport_to_missing_device_fails(client, fake_server):
+    with pytest.raises(AdbError, match="device not found"):
+        client.shell("emu-9", "true")
+    fake_server.set_state("emu-1", "offline")
+    with pytest.raises(AdbError, match="device not found"):
+        client.exec_out("emu-1", "true")
+
+
+def test_unknown_device_service_fails(client):
+    with pytest.raises(AdbError, match="unknown service"):
+        client.open_service("emu-1", "sync:")
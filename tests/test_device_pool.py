@@ -0,0 +1,47 @@
+import asyncio
+
+import pytest
+
+from utils import adb_async, adb_helper
+from utils.adb_helper import DeviceNotFound
+from utils.fake_adb_server import FakeDevice
+
+
+def test_module_helpers_take_a_device(device, fake_device):
+    adb_helper.ensure_connection(device=device)
+    adb_helper.tap(5, 6, device=device)
+    assert adb_helper.capture_frame(device=device).shape == (90, 160, 3)
+    assert [line for _, line in fake_device.inputs] == ["tap 5 6"]
+
+
+def test_dropped_device_raises_instead_of_tapping(device, fake_server, fake_device):
+    fake_server.remove_device("emu-1")
+    with pytest.raises(DeviceNotFound):
+        device.tap(1, 2)
+    with pytest.raises(DeviceNotFound):
+        adb_helper.ensure_connection(device=device)
+    with pytest.raises(DeviceNotFound):  # nothing left to reselect
+        adb_helper.ensure_connection()
+    with pytest.raises(DeviceNotFound):
+        asyncio.run(adb_async.ensure_connection(device))
+    assert fake_device.inputs == []
+    assert device.reconnects == 4
+
+
+def test_dropped_device_capture_skips_screencap(device, fake_server, monkeypatch):
+    fake_server.remove_device("emu-1")
+    screencaps = []
+    monkeypatch.setattr(device, "exec_out", lambda *a, **kw: screencaps.append(a))
+    assert device.capture_frame(retries=2, delay=0) is None
+    assert device.capture_roi((0, 0, 4, 4)) is None
+    assert screencaps == []
+    assert device.counters.snapshot()["capture_failures"] == 2
+
+
+def test_dropped_selected_device_is_replaced(device, fake_server, fake_device, monkeypatch):
+    fake_server.add_device(FakeDevice("emu-2", width=160, height=90))
+    fake_server.remove_device("emu-1")
+    monkeypatch.setattr(adb_helper, "ENV_SERIAL", None)
+    adb_helper.ensure_connection()
+    assert adb_helper.ADB_DEVICE == "emu-2"
+    adb_helper.POOL.get("emu-2").close()
@@ -0,0 +1,86 @@
+import numpy as np
+import pytest
+
+from utils.digit_ocr import (TemplateReader, binarize, digit_counts, harvest, segment,
+                             synthetic_frames)
+from utils.loot_ocr import FIELDS, LOOT_BOXES
+
+
+def _mask(*runs, height=10):
+    """Field mask with one filled block per (x, width, top, bottom) run."""
+    mask = np.zeros((height, 60), bool)
+    for x, w, top, bottom in runs:
+        mask[top:bottom, x:x + w] = True
+    return mask
+
+
+def test_segment_separate_glyphs():
+    glyphs = segment(_mask((2, 5, 1, 9), (10, 5, 1, 9), (20, 4, 2, 9)))
+    assert [g.shape for g in glyphs] == [(8, 5), (8, 5), (7, 4)]
+
+
+def test_segment_drops_commas_and_specks():
+    glyphs = segment(_mask((2, 5, 1, 9), (9, 1, 7, 9), (12, 5, 1, 9)))
+    assert len(glyphs) == 2
+
+
+def test_segment_splits_touching_glyphs():
+    # a single glyph sets the width; the 17-wide run is three digits joined
+    # by one-pixel bridges, and the cuts land on the bridges
+    mask = _mask((2, 5, 1, 9), (10, 17, 1, 9))
+    mask[:, [15, 21]] = False
+    mask[5, [15, 21]] = True
+    glyphs = segment(mask)
+    assert [g.shape[1] for g in glyphs] == [5, 5, 6, 6]
+    assert all(g[:, -5:].all() for g in glyphs)
+
+
+def test_segment_empty_field():
+    assert segment(np.zeros((10, 60), bool)) == []
+
+
+def test_binarize_keeps_bright_digits():
+    crop = np.full((10, 20, 3), 40, np.uint8)
+    crop[2:8, 5:9] = 240
+    mask = binarize(crop)
+    assert mask.sum() == 24 and mask[2:8, 5:9].all()
+    # a dim panel has no digits even though Otsu would split it
+    assert not binarize(np.tile(np.uint8([[30], [90]]), (5, 20))).any()
+
+
+@pytest.fixture(scope="module")
+def template_reader():
+    return TemplateReader(harvest(synthetic_frames(60, seed=1)))
+
+
+def test_template_reader_reads_synthetic_panels(template_reader):
+    for image, values in synthetic_frames(20, seed=2):
+        read = template_reader.read_fields(image)
+        assert tuple(read[f][0] for f in FIELDS) == values
+        assert min(conf for _, conf in read.values()) > 0.8
+
+
+def test_template_reader_empty_field(template_reader):
+    image, _ = next(synthetic_frames(1, seed=3))
+    image[:] = 0
+    assert template_reader.read_fields(image) == {f: (0, 0.0) for f in FIELDS}
+
+
+def test_digit_counts_match_values():
+    for image, values in synthetic_frames(20, seed=4):
+        counts = digit_counts(image, fields=("gold", "elixir"))
+        assert counts == {"gold": len(str(values[0])), "elixir": len(str(values[1]))}
+
+
+def test_digit_counts_on_a_crop_with_origin():
+    image, values = next(synthetic_frames(1, seed=5))
+    x1, y1 = min(b[0] for b in LOOT_BOXES.values()), min(b[1] for b in LOOT_BOXES.values())
+    x2, y2 = max(b[2] for b in LOOT_BOXES.values()), max(b[3] for b in LOOT_BOXES.values())
+    counts = digit_counts(image[y1:y2, x1:x2], origin=(x1, y1))
+    assert counts == {f: len(str(v)) for f, v in zip(FIELDS, values)}
+
+
+def test_digit_counts_no_panel():
+    image, _ = next(synthetic_frames(1, seed=6))
+    image[:] = 0
+    assert digit_counts(image) == {f: 0 for f in FIELDS}
@@ -0,0 +1,108 @@
+import threading
+import time
+
+import pytest
+
+from utils import adb_helper
+from utils.dispatcher import CAPTURE, DEPLOY, IDLE, Dispatcher
+
+
+@pytest.fixture
+def dispatcher():
+    d = Dispatcher("test").start()
+    yield d
+    d.stop()
+
+
+def _block(dispatcher):
+    """Occupy the worker until the returned event is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(5)
+    dispatcher.submit(DEPLOY, hold)
+    assert started.wait(5)
+    return release
+
+
+def test_priority_order(dispatcher):
+    release = _block(dispatcher)
+    order = []
+    futures = [dispatcher.submit(p, order.append, name)
+               for p, name in [(IDLE, "idle"), (CAPTURE, "capture1"),
+                               (DEPLOY, "deploy"), (CAPTURE, "capture2")]]
+    assert dispatcher.queued() == {"idle": 1, "capture": 2, "deploy": 1}
+    release.set()
+    for f in futures:
+        f.result(5)
+    assert order == ["deploy", "capture1", "capture2", "idle"]
+
+
+def test_same_key_coalesces(dispatcher):
+    release = _block(dispatcher)
+    calls = []
+    first = dispatcher.submit(CAPTURE, lambda: calls.append(1) or "frame", key="cap")
+    second = dispatcher.submit(CAPTURE, lambda: calls.append(2) or "other", key="cap")
+    assert second is first
+    release.set()
+    assert first.result(5) == "frame"
+    assert calls == [1]
+    assert dispatcher.counters["coalesced"] == 1
+
+
+def test_replace_drops_queued_job(dispatcher):
+    release = _block(dispatcher)
+    calls = []
+    old = dispatcher.submit(IDLE, calls.append, "old", key="keepalive")
+    new = dispatcher.submit(IDLE, calls.append, "new", key="keepalive", replace=True)
+    assert old.result(1) is None  # resolved straight away
+    release.set()
+    new.result(5)
+    assert calls == ["new"]
+    assert dispatcher.counters["replaced"] == 1
+
+
+def test_max_age_drops_stale_jobs(dispatcher):
+    release = _block(dispatcher)
+    calls = []
+    stale = dispatcher.submit(IDLE, calls.append, "stale", max_age=0.05)
+    fresh = dispatcher.submit(IDLE, calls.append, "fresh", max_age=5)
+    time.sleep(0.1)
+    release.set()
+    assert stale.result(5) is None
+    fresh.result(5)
+    assert calls == ["fresh"]
+    assert dispatcher.counters["dropped"] == 1
+
+
+def test_call_reraises_and_runs_inline_on_worker(dispatcher):
+    with pytest.raises(ZeroDivisionError):
+        dispatcher.call(DEPLOY, lambda: 1 / 0)
+    assert dispatcher.call(DEPLOY, lambda: dispatcher.call(IDLE, lambda: "inline")) == "inline"
+
+
+def test_stop_resolves_queued_jobs():
+    d = Dispatcher("test").start()
+    release = _block(d)
+    queued = d.submit(IDLE, lambda: "never")
+    threading.Timer(0.1, release.set).start()
+    d.stop()
+    assert queued.result(1) is None
+    assert not d.running()
+
+
+def test_idle_tap_without_and_with_dispatcher(device, fake_device):
+    adb_helper.idle_tap(5, 6, device=device)  # no dispatcher: an ordinary tap
+    assert [line for _, line in fake_device.inputs] == ["tap 5 6"]
+    device.start_dispatcher()
+    try:
+        release = _block(device.dispatcher)
+        adb_helper.idle_tap(7, 8, device=device)
+        adb_helper.idle_tap(9, 10, device=device)  # replaces the one still queued
+        release.set()
+        assert device.dispatcher.call(DEPLOY, lambda: "flushed") == "flushed"
+        device.dispatcher.call(IDLE, lambda: None)
+    finally:
+        device.stop_dispatcher()
+    assert [line for _, line in fake_device.inputs] == ["tap 5 6", "tap 9 10"]
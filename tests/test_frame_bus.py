@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from utils.frame_bus import FrameBus, capture_loop, frame_shape
+
+
+@pytest.fixture
+def make_bus():
+    buses = []
+
+    def make(max_shape):
+        buses.append(FrameBus(f"test_bus_{os.getpid()}_{len(buses)}", max_shape, create=True))
+        return buses[-1]
+    yield make
+    for b in buses:
+        b.close()
+
+
+@pytest.fixture
+def bus(make_bus):
+    return make_bus((4, 6, 3))
+
+
+def _img(value, shape=(4, 6, 3)):
+    return np.full(shape, value, np.uint8)
+
+
+def test_publish_and_read(bus):
+    assert bus.publish(_img(1)) == 1
+    assert bus.publish(_img(2, (2, 3, 3))) == 2
+    with bus.frame(timeout=0) as (seq, img):
+        assert seq == 2 and img.shape == (2, 3, 3) and (img == 2).all()
+
+
+def test_reader_attaches_by_name(bus):
+    reader = FrameBus(bus.name)
+    try:
+        bus.publish(_img(7))
+        with reader.frame(timeout=0) as (seq, img):
+            assert seq == 1 and (img == 7).all()
+    finally:
+        reader.close()
+
+
+def test_pinned_slot_is_never_written(bus):
+    bus.publish(_img(1))
+    with bus.frame(timeout=0) as (seq, img):
+        assert bus.publish(_img(2)) == 2  # fills the other slot and flips
+        assert bus.publish(_img(3)) is None  # only the pinned slot is free
+        assert bus.dropped() == 1
+        assert seq == 1 and (img == 1).all()
+    assert bus.publish(_img(4)) == 3  # released: the old slot is reused
+    with bus.frame(timeout=0) as (seq, img):
+        assert seq == 3 and (img == 4).all()
+
+
+def test_wait_for_newer_frame(bus):
+    bus.publish(_img(1), ts=100.0)
+    with bus.frame(newer_than=200.0, timeout=0.05) as (seq, img):
+        assert (seq, img) == (None, None)
+    with bus.frame(after_seq=1, timeout=0.05) as (seq, img):
+        assert (seq, img) == (None, None)
+    threading.Timer(0.05, bus.publish, (_img(5),)).start()
+    with bus.frame(after_seq=1, timeout=2) as (seq, img):
+        assert seq == 2 and (img == 5).all()
+
+
+def test_oversized_frame(bus):
+    with pytest.raises(ValueError, match="does not fit"):
+        bus.publish(_img(0, (5, 6, 3)))
+
+
+def test_pause_resume(bus):
+    assert not bus.paused()
+    bus.pause()
+    assert bus.paused()
+    bus.resume()
+    assert not bus.paused()
+
+
+def test_frame_shape_from_device(device):
+    assert frame_shape("emu-1") == (90, 160, 3)
+    assert frame_shape("emu-1", scale=1 / 3) == (30, 54, 3)
+
+
+def _run_capture_loop(bus, seconds):
+    t = threading.Thread(target=capture_loop, args=(bus.name, "emu-1", 0.01))
+    t.start()
+    time.sleep(seconds)
+    assert t.is_alive()
+    bus.request_stop()
+    t.join(5)
+    assert not t.is_alive()
+
+
+def test_capture_loop_publishes(device, make_bus):
+    bus = make_bus((90, 160, 3))
+    _run_capture_loop(bus, 0.3)
+    with bus.frame(timeout=0) as (seq, img):
+        assert seq >= 1 and img.shape == (90, 160, 3) and (img == 90).all()
+
+
+def test_capture_loop_survives_errors(device, make_bus, capsys):
+    # 160x90 frames do not fit: each publish fails, the loop logs and keeps going
+    bus = make_bus((10, 10, 3))
+    _run_capture_loop(bus, 0.3)
+    assert bus.latest_seq() == 0
+    assert "Frame bus capture from emu-1 failed: ValueError" in capsys.readouterr().out
@@ -0,0 +1,49 @@
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from utils import adb_helper
+from utils.frame_stream import ScreenrecordStream
+
+
+@pytest.fixture
+def idle_stream():
+    """A screenrecord stream whose pipe is a live process that sends nothing."""
+    stream = ScreenrecordStream("emu-1")
+    stream._running.set()
+    stream._proc = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    yield stream
+    stream._running.clear()
+    stream._kill()
+
+
+def _frame(value):
+    return np.full((4, 6, 3), value, np.uint8)
+
+
+def test_idle_stream_reuses_old_frame_while_pipe_is_alive(idle_stream, monkeypatch):
+    idle_stream._publish(_frame(7))
+    with idle_stream._cond:  # the screen has been static for a while
+        seq, _, frame = idle_stream._frames[-1]
+        idle_stream._frames[-1] = (seq, 0.0, frame)
+    assert idle_stream.latest_frame(max_age_ms=adb_helper.STREAM_MAX_AGE_MS) is None
+    assert idle_stream.current_frame()[0, 0, 0] == 7
+
+    dev = adb_helper.Device("emu-1")
+    dev.stream = idle_stream
+    assert dev._stream_frame("bgr")[0, 0, 0] == 7
+    assert dev._stream_frame("raw").shape == (4, 6, 4)
+
+    idle_stream._kill()  # pipe died: the old frame may no longer be on screen
+    assert idle_stream.current_frame() is None
+    assert dev._stream_frame("bgr") is None
+
+
+def test_frames_from_a_previous_pipe_are_not_current(idle_stream):
+    idle_stream._publish(_frame(1))
+    idle_stream._pipe_seq = idle_stream._seq  # respawned, nothing decoded yet
+    assert idle_stream.current_frame() is None
+    idle_stream._publish(_frame(2))
+    assert idle_stream.current_frame()[0, 0, 0] == 2
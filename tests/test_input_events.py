@@ -0,0 +1,79 @@
+import struct
+
+import pytest
+
+from utils import adb_helper
+from utils.input_events import (ABS_MT_POSITION_X, ABS_MT_POSITION_Y, ABS_MT_SLOT,
+                                ABS_MT_TRACKING_ID, EV_ABS, EV_KEY, EV_SYN, BTN_TOUCH,
+                                EventInjector, TouchDevice)
+
+AXES = {"ABS_MT_SLOT": (0, 9), "ABS_MT_POSITION_X": (0, 32767),
+        "ABS_MT_POSITION_Y": (0, 32767), "ABS_MT_TRACKING_ID": (0, 65535)}
+
+
+def _injector(rotation=0, event_size=24, size=(1600, 900)):
+    touch = TouchDevice("/dev/input/event1", "touch", AXES, {"BTN_TOUCH"}, size,
+                        rotation=rotation, event_size=event_size)
+    return EventInjector(touch)
+
+
+@pytest.mark.parametrize("rotation, point, raw", [
+    (0, (0, 0), (0, 0)),
+    (0, (1599, 899), (32767, 32767)),
+    (0, (800, 450), (16394, 16402)),
+    (1, (0, 0), (32767, 0)),
+    (2, (0, 0), (32767, 32767)),
+    (2, (1600, 900), (0, 0)),
+    (3, (0, 0), (0, 32767)),
+])
+def test_to_raw_rotation(rotation, point, raw):
+    assert _injector(rotation).to_raw(*point) == raw
+
+
+def test_to_raw_clamps():
+    inj = _injector()
+    assert inj.to_raw(-50, 5000) == (0, 32767)
+
+
+@pytest.mark.parametrize("event_size, fmt", [(24, "<qqHHi"), (16, "<iiHHi")])
+def test_encode_record_layout(event_size, fmt):
+    inj = _injector(event_size=event_size)
+    events = [(EV_ABS, ABS_MT_TRACKING_ID, -1), (EV_SYN, 0, 0)]
+    blob = inj.encode(events)
+    assert len(blob) == 2 * event_size
+    assert [r[2:] for r in struct.iter_unpack(fmt, blob)] == events
+
+
+def test_tap_events():
+    inj = _injector()
+    down = inj.report(inj.down_events(0, 1599, 0), True)
+    assert down == [(EV_ABS, ABS_MT_SLOT, 0), (EV_ABS, ABS_MT_TRACKING_ID, 1),
+                    (EV_ABS, ABS_MT_SLOT, 0), (EV_ABS, ABS_MT_POSITION_X, 32767),
+                    (EV_ABS, ABS_MT_POSITION_Y, 0), (EV_KEY, BTN_TOUCH, 1), (EV_SYN, 0, 0)]
+    assert inj.report(inj.up_events(0), False)[-3:] == [
+        (EV_ABS, ABS_MT_TRACKING_ID, -1), (EV_KEY, BTN_TOUCH, 0), (EV_SYN, 0, 0)]
+
+
+def test_write_cmd_splits_on_record_boundaries():
+    inj = _injector()
+    cmd = inj.write_cmd([(EV_SYN, 0, 0)] * 400)
+    parts = cmd.split("; ")
+    assert len(parts) == 3
+    assert all(part.endswith("> /dev/input/event1") for part in parts)
+    assert all(part.count("\\") % 24 == 0 for part in parts)
+
+
+def test_too_many_pointers():
+    with pytest.raises(ValueError, match="pointers"):
+        _injector().gesture_cmd([[(i, i)] for i in range(11)])
+
+
+def test_device_taps_through_evdev(device, fake_device, monkeypatch):
+    monkeypatch.setattr(adb_helper, "INPUT_BACKEND", "evdev")
+    touch = device.injector().touch
+    assert touch.display_size == (160, 90) and touch.event_size == 24
+    device.tap(100, 50)
+    device.gesture([[(10, 10), (150, 80)], [(40, 40)]], duration_ms=32)
+    assert not any(cmd.startswith("input") for cmd in fake_device.commands)
+    assert [line for _, line in fake_device.inputs] == [
+        "tap 100 50", "swipe 10 10 150 80 0", "tap 40 40"]
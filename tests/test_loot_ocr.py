@@ -0,0 +1,130 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from utils import loot_ocr
+from utils.loot_ocr import (FIELDS, CascadeReader, all_of, any_of, at_least, loot_sufficient,
+                            read_lazily, read_loot, show_loot, zero_loot)
+
+
+class FixedReader:
+    """read_fields() answers from a {field: (value, confidence)} table and logs its calls."""
+
+    def __init__(self, answers):
+        self.answers = answers
+        self.calls = []
+
+    def read_fields(self, image, origin=(0, 0), fields=FIELDS):
+        self.calls.append(tuple(fields))
+        return {f: self.answers[f] for f in fields}
+
+
+SLOW = {"gold": (111, 0.9), "elixir": (222, 0.9), "dark": (333, 0.9)}
+
+
+@pytest.mark.parametrize("dark, escalated", [
+    ((0, 0.95), False),  # a confidently read empty dark field is decided
+    ((0, 0.0), True),  # no glyphs at all
+    ((4500, 0.5), True),  # unsure digits
+])
+def test_cascade_escalates_only_unsure_fields(dark, escalated):
+    fast = FixedReader({"gold": (900_000, 0.95), "elixir": (850_000, 0.9), "dark": dark})
+    slow = FixedReader(SLOW)
+    cascade = CascadeReader(fast, slow, min_confidence=0.8)
+    out = cascade.read_fields(np.zeros(1))
+    assert out["gold"] == (900_000, 0.95) and out["elixir"] == (850_000, 0.9)
+    assert out["dark"] == (SLOW["dark"] if escalated else dark)
+    assert slow.calls == ([("dark",)] if escalated else [])
+
+
+def test_cascade_counts_panels_not_calls():
+    fast = FixedReader({"gold": (900_000, 0.95), "elixir": (10, 0.2), "dark": (0, 0.0)})
+    cascade = CascadeReader(fast, FixedReader(SLOW), min_confidence=0.8)
+    first, second = np.zeros(1), np.zeros(1)
+    cascade.read_fields(first, fields=("gold", "elixir"))
+    cascade.read_fields(first, fields=("dark",))  # a second lazy round on the same panel
+    cascade.read_fields(second, fields=("gold",))
+    counters = cascade.stats()["counters"]
+    assert counters["panels"] == 2
+    assert counters["escalated_panels"] == 1 and counters["fast_panels"] == 1
+    assert counters["fast_fields"] == 2 and counters["slow_fields"] == 2
+    assert counters["fast_panel_rate"] == 0.5
+
+
+def test_three_valued_helpers():
+    assert at_least(None, 0) is True  # a zero minimum needs no reading
+    assert at_least(None, 5) is None
+    assert at_least(4, 5) is False and at_least(5, 5) is True
+    assert all_of(True, None) is None and all_of(False, None) is False
+    assert all_of(True, True) is True
+    assert any_of(False, None) is None and any_of(True, None) is True
+    assert any_of(False, False) is False
+
+
+MINIMUMS = (800_000, 800_000, 0)
+
+
+@pytest.mark.parametrize("gold, elixir, dark, minimums, expected", [
+    (900_000, 900_000, None, MINIMUMS, True),  # dark minimum 0: dark never matters
+    (900_000, 700_000, None, MINIMUMS, False),
+    (1_300_000, None, None, MINIMUMS, True),  # gold alone is enough
+    (None, 1_300_000, None, MINIMUMS, True),
+    (900_000, None, None, MINIMUMS, None),
+    (None, None, None, MINIMUMS, None),
+    (900_000, 900_000, None, (800_000, 800_000, 5000), None),
+    (900_000, 900_000, 4000, (800_000, 800_000, 5000), False),
+    (1_250_000, 10, 0, (800_000, 800_000, 5000), True),
+])
+def test_loot_sufficient(gold, elixir, dark, minimums, expected):
+    assert loot_sufficient(gold, elixir, dark, minimums) is expected
+
+
+def _rule(minimums):
+    return lambda v: loot_sufficient(**v, minimums=minimums)
+
+
+@pytest.mark.parametrize("minimums", [MINIMUMS, (800_000, 800_000, 5000)])
+def test_read_lazily_matches_the_full_rule(minimums):
+    amounts = [0, 500_000, 900_000, 1_300_000]
+    for gold, elixir, dark in itertools.product(amounts, amounts, [0, 4000, 6000]):
+        truth = {"gold": (gold, 0.9), "elixir": (elixir, 0.9), "dark": (dark, 0.9)}
+        reader = FixedReader(truth)
+        values, decision = read_lazily(reader, None, _rule(minimums))
+        assert decision is loot_sufficient(gold, elixir, dark, minimums)
+        assert reader.calls[0] == ("gold", "elixir")  # one batched round first
+        assert reader.calls[1:] in ([], [("dark",)])
+        if minimums[2] == 0:
+            assert values["dark"] is None
+
+
+def test_read_lazily_reads_dark_only_when_needed():
+    truth = {"gold": (900_000, 0.9), "elixir": (900_000, 0.9), "dark": (6000, 0.9)}
+    reader = FixedReader(truth)
+    values, decision = read_lazily(reader, None, _rule((800_000, 800_000, 5000)))
+    assert decision is True and reader.calls == [("gold", "elixir"), ("dark",)]
+    reader = FixedReader(dict(truth, gold=(1_300_000, 0.9)))
+    values, decision = read_lazily(reader, None, _rule((800_000, 800_000, 5000)))
+    assert decision is True and values["dark"] is None
+
+
+def test_read_loot_lazy_and_eager(monkeypatch):
+    truth = {"gold": (900_000, 0.9), "elixir": (900_000, 0.9), "dark": (6000, 0.9)}
+
+    class Reader(FixedReader):
+        def read(self, image, origin=(0, 0)):
+            return tuple(v for v, _ in self.read_fields(image, origin).values())
+
+    before = loot_ocr.FIELD_COUNTS.snapshot()
+    assert read_loot(Reader(truth), None, MINIMUMS) == (900_000, 900_000, None)
+    monkeypatch.setattr(loot_ocr, "LOOT_LAZY", False)
+    assert read_loot(Reader(truth), None, MINIMUMS) == (900_000, 900_000, 6000)
+    after = loot_ocr.FIELD_COUNTS.snapshot()
+    assert after["read"] - before.get("read", 0) == 5
+    assert after["skipped"] - before.get("skipped", 0) == 1
+
+
+def test_zero_loot_and_show_loot():
+    assert zero_loot((0, 0, 0)) and zero_loot((0, 0, None))
+    assert not zero_loot((0, 5, None)) and not zero_loot(None) and not zero_loot("prefiltered")
+    assert show_loot(None) == "?" and show_loot(0) == 0
@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from utils import adb_helper
+
+from utils.input_events import EventInjector, TouchDevice
+from utils.macro import Macro
+
+AXES = {"ABS_MT_SLOT": (0, 1), "ABS_MT_POSITION_X": (0, 1599),
+        "ABS_MT_POSITION_Y": (0, 899), "ABS_MT_TRACKING_ID": (0, 65535)}
+
+
+def _deploy():
+    return (Macro("deploy").sleep(0.5)
+            .tap(10, 20).sleep(0.25)
+            .hold(30, 40, duration_ms=1500, delay=0.1)
+            .gesture([[(0, 0), (100, 100)]], duration_ms=200)
+            .multi_tap([(1, 1), (2, 2)], hold_ms=60))
+
+
+def test_compile_with_input():
+    assert _deploy().compile().splitlines() == [
+        "sleep 0.500",
+        "input tap 10 20",
+        "sleep 0.250",
+        "input swipe 30 40 30 40 1500",
+        "sleep 0.100",
+        "input swipe 0 0 100 100 200",
+        "input tap 1 1; input tap 2 2",
+    ]
+
+
+def test_compile_with_injector():
+    inj = EventInjector(TouchDevice("/dev/input/event1", "touch", AXES, set(), (1600, 900)))
+    lines = Macro().tap(5, 5, delay=1).multi_tap([(1, 1), (2, 2), (3, 3)]).compile(inj).splitlines()
+    assert lines[0].startswith("printf ") and lines[1] == "sleep 1.000"
+    # three fingers on a two-slot panel fall back to `input`
+    assert lines[2] == "input tap 1 1; input tap 2 2; input tap 3 3"
+
+
+def test_duration_and_len():
+    m = _deploy()
+    assert len(m) == 4
+    assert m.duration() == pytest.approx(0.5 + 0.25 + 1.5 + 0.1 + 0.2 + 0.06)
+
+
+def test_unknown_action():
+    m = Macro()
+    m.steps.append(("wave", (0, 0), 0.0))
+    with pytest.raises(ValueError, match="wave"):
+        m.compile()
+
+
+def test_run_macro_on_device(device, fake_device):
+    assert device.run_macro(_deploy())
+    assert [line for _, line in fake_device.inputs] == [
+        "tap 10 20", "swipe 30 40 30 40 1500", "swipe 0 0 100 100 200", "tap 1 1", "tap 2 2"]
+
+
+def test_run_macro_timeout_kills_script(device, fake_device):
+    fake_device.latency["input"] = 2.0
+    t0 = time.time()
+    assert not device.run_macro(Macro("slow").tap(1, 1), timeout=0.3)
+    assert time.time() - t0 < 1.5
+    assert "kill -STOP 4242" in fake_device.commands  # the fake shell's $$
+    assert device.latency.snapshot()["macro"]["timeouts"] == 1
+
+
+def test_run_macro_default_deadline(device, fake_device, monkeypatch):
+    monkeypatch.setitem(adb_helper.TIMEOUTS, "shell", 0.3)
+    fake_device.latency["input"] = 2.0
+    t0 = time.time()
+    assert not device.run_macro(Macro("hung").tap(1, 1))  # duration() 0 + shell timeout
+    assert time.time() - t0 < 1.5
+
+
+def test_run_macro_cancel(device, fake_device):
+    fake_device.latency["input"] = 2.0
+    cancel = threading.Event()
+    threading.Timer(0.2, cancel.set).start()
+    t0 = time.time()
+    assert not device.run_macro(Macro("cancelled").tap(1, 1), cancel=cancel, timeout=10)
+    assert time.time() - t0 < 1.5
+    assert "kill -STOP 4242" in fake_device.commands
@@ -0,0 +1,76 @@
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from utils.adb_helper import decimate, parse_raw_frame, to_bgr
+
+
+def _rgba(w, h):
+    return np.arange(w * h * 4, dtype=np.uint32).astype(np.uint8).reshape(h, w, 4)
+
+
+@pytest.mark.parametrize("header", [struct.pack("<III", 3, 2, 1),
+                                    struct.pack("<IIII", 3, 2, 1, 1)])
+def test_parse_12_and_16_byte_headers(header):
+    pixels = _rgba(3, 2)
+    frame = parse_raw_frame(header + pixels.tobytes())
+    assert frame.shape == (2, 3, 4)
+    assert np.array_equal(frame, pixels)
+    assert np.array_equal(to_bgr(frame), pixels[..., 2::-1])
+
+
+def test_parse_is_zero_copy():
+    buf = bytearray(struct.pack("<IIII", 2, 2, 1, 0) + bytes(16))
+    frame = parse_raw_frame(buf)
+    buf[16] = 7
+    assert frame[0, 0, 0] == 7
+
+
+def test_parse_rgb565():
+    buf = struct.pack("<III", 4, 1, 4) + struct.pack("<4H", 0xF800, 0x07E0, 0x001F, 0)
+    frame = parse_raw_frame(buf)
+    assert frame.shape == (1, 4, 2)
+    bgr = to_bgr(frame)
+    assert bgr[0, 0].argmax() == 2 and bgr[0, 1].argmax() == 1 and bgr[0, 2].argmax() == 0
+
+
+@pytest.mark.parametrize("buf, message", [
+    (b"\0" * 8, "too short"),
+    (struct.pack("<III", 1, 1, 99) + bytes(4), "unsupported"),
+    (struct.pack("<III", 2, 2, 1) + bytes(15), "size mismatch"),
+    (struct.pack("<III", 2, 2, 1) + bytes(24), "size mismatch"),
+])
+def test_parse_rejects_bad_input(buf, message):
+    with pytest.raises(ValueError, match=message):
+        parse_raw_frame(buf)
+
+
+def test_fake_device_screencap_roundtrip(client):
+    frame = parse_raw_frame(client.exec_out("emu-1", "screencap"))
+    assert frame.shape == (90, 160, 4)
+    assert (to_bgr(frame) == 90).all()
+    assert decimate(frame, 0.5).shape == (45, 80, 4)
+
+
+def test_capture_frame_in_memory(device, fake_device):
+    img = device.capture_frame()
+    assert img.shape == (90, 160, 3) and (img == 90).all()
+    assert device.capture_frame(fmt="raw", scale=0.5).shape == (45, 80, 4)
+    assert fake_device.commands == ["screencap", "screencap"]
+
+
+def test_take_screenshot_writes_frame(device, tmp_path):
+    path = tmp_path / "screen.png"
+    img = device.take_screenshot(str(path))
+    assert path.exists()
+    assert np.array_equal(cv2.imread(str(path)), img)
+
+
+def test_failed_screenshot_removes_old_file(device, fake_server, tmp_path):
+    path = tmp_path / "screen.png"
+    device.take_screenshot(str(path))
+    fake_server.set_state("emu-1", "offline")
+    assert device.take_screenshot(str(path), retries=2, delay=0) is None
+    assert not path.exists()
@@ -0,0 +1,60 @@
+import subprocess
+
+import pytest
+
+from utils.adb_helper import ShellSession
+
+
+@pytest.fixture
+def session(client):
+    sess = ShellSession("emu-1", client=client)
+    yield sess
+    sess.close()
+
+
+def test_output_and_marker(session, fake_device):
+    assert session.run("echo one; echo two") == "one\ntwo\n"
+    assert session.run("input tap 10 20") == ""
+    assert fake_device.inputs[-1][1] == "tap 10 20"
+    # every command line is followed by the marker echo on the same stream
+    marker = ShellSession._MARKER_CMD
+    assert fake_device.commands == ["echo one", "echo two", marker, "input tap 10 20", marker]
+
+
+def test_exit_status_raises(session):
+    with pytest.raises(subprocess.CalledProcessError) as err:
+        session.run("false")
+    assert err.value.returncode == 1
+    with pytest.raises(subprocess.CalledProcessError) as err:
+        session.run("no-such-tool")
+    assert err.value.returncode == 127
+    assert "not found" in err.value.output
+    assert session.run("true") == ""  # the session survives a failed command
+
+
+def test_one_socket_for_many_commands(session):
+    session.run("true")
+    sock = session._sock
+    for _ in range(5):
+        session.run("true")
+    assert session._sock is sock
+
+
+def test_respawn_after_eof(session, fake_device):
+    session.run("true")
+    old = session._sock
+    # the remote shell exits: the server closes the stream
+    session._stdin.write("exit\n")
+    session._stdin.flush()
+    assert session.run("echo again") == "again\n"
+    assert session._sock is not None and session._sock is not old
+
+
+def test_timeout_kills_session(session, fake_device):
+    session.run("true")
+    fake_device.latency["input"] = 1.0
+    with pytest.raises(subprocess.TimeoutExpired):
+        session.run("input tap 1 1", timeout=0.2)
+    assert session._sock is None
+    fake_device.latency.clear()
+    assert session.run("echo back") == "back\n"
@@ -0,0 +1,302 @@
+# utils/adb_async.py
+"""asyncio flavour of the adb_helper API.
+
+tap(), tap_and_hold(), capture_frame() and ensure_connection() as
+coroutines, so one event loop can drive several devices and overlap their
+waits (screencap transfer, device-side holds, human delays) instead of one
+blocking thread per device. Device commands go over the adb server socket
+(utils/adb_client.py), or through `asyncio.create_subprocess_exec` of the
+adb binary when ADB_BACKEND=binary or the server is unreachable.
+
+The synchronous functions in adb_helper are unchanged; both share the same
+Device objects (selection, tracker state, touch injector, frame stream).
+
+    from utils import adb_async
+    dev1, dev2 = adb_helper.POOL.discover()
+    await asyncio.gather(adb_async.tap(100, 200, device=dev1),
+                         adb_async.capture_frame(device=dev2))
+"""
+import asyncio
+import random
+import subprocess
+
+from utils import adb_helper
+from utils.adb_client import AdbError
+
+
+class AsyncShell:
+    """Long-lived `shell:sh` stream for one device, driven from the event loop.
+
+    Same marker protocol as adb_helper.ShellSession (whose marked() and
+    split_marker() it uses): every command is followed by an echo of the
+    marker plus its exit status.
+    """
+
+    def __init__(self, serial):
+        self.serial = serial
+        self._reader = self._writer = None
+        self._proc = None
+        self._lock = asyncio.Lock()
+
+    async def _spawn(self):
+        client = adb_helper._client()
+        if client is not None:
+            try:
+                self._reader, self._writer = await client.open_service_async(self.serial, "shell:sh")
+                return
+            except (OSError, AdbError, asyncio.TimeoutError):
+                pass  # fall back to the binary
+        self._proc = await asyncio.create_subprocess_exec(
+            adb_helper.ADB_PATH, "-s", self.serial, "shell", "sh",
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self._reader, self._writer = self._proc.stdout, self._proc.stdin
+
+    async def _exchange(self, cmd):
+        self._writer.write(adb_helper.ShellSession.marked(cmd).encode())
+        await self._writer.drain()
+        output = []
+        while True:
+            line = (await self._reader.readline()).decode(errors="ignore")
+            if not line:
+                raise BrokenPipeError("adb shell closed")
+            end = adb_helper.ShellSession.split_marker(line)
+            if end is not None:
+                output.append(end[0])
+                return end[1], "".join(output)
+            output.append(line)
+
+    async def run(self, cmd, timeout=None):
+        """Run a shell command line on the device; returns its output.
+
+        Past timeout seconds the stream is closed (a fresh one is opened on
+        the next call) and subprocess.TimeoutExpired is raised.
+        """
+        async with self._lock:
+            for attempt in range(2):
+                if self._writer is None:
+                    await self._spawn()
+                try:
+                    rc, out = await asyncio.wait_for(self._exchange(cmd), timeout)
+                except asyncio.TimeoutError:
+                    await self.close()
+                    print(f"[-] async adb shell to {self.serial} timed out after {timeout}s: {cmd[:60]}")
+                    raise subprocess.TimeoutExpired(cmd, timeout)
+                except (OSError, ValueError):
+                    print(f"[-] async adb shell to {self.serial} died; respawning (try {attempt+1})")
+                    await self.close()
+                    continue
+                if rc != 0:
+                    raise subprocess.CalledProcessError(rc, cmd, output=out)
+                return out
+        # Stream keeps dying: fall back to a one-shot adb call
+        proc = await asyncio.create_subprocess_exec(
+            adb_helper.ADB_PATH, "-s", self.serial, "shell", cmd,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        try:
+            out, _ = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            raise subprocess.TimeoutExpired(cmd, timeout)
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, cmd, output=out.decode(errors="ignore"))
+        return out.decode(errors="ignore")
+
+    async def close(self):
+        writer, self._writer = self._writer, None
+        proc, self._proc = self._proc, None
+        self._reader = None
+        if writer is not None:
+            try:
+                writer.close()
+            except (OSError, RuntimeError):
+                pass  # loop already closed
+        if proc is not None and proc.returncode is None:
+            try:
+                await asyncio.wait_for(proc.wait(), 1)
+            except asyncio.TimeoutError:
+                proc.kill()
+
+
+class AsyncDevice:
+    """Coroutine view of an adb_helper.Device."""
+
+    def __init__(self, device):
+        self.device = device
+        self.serial = device.serial
+        self._shell = AsyncShell(device.serial)
+
+    def __repr__(self):
+        return f"AsyncDevice({self.serial})"
+
+    async def ensure_connection(self):
+        """True if the device is usable; only leaves the loop when it dropped."""
+        if self.device.state() == "device":
+            return True
+        return await asyncio.to_thread(self.device.ensure_connection)
+
+    async def require_connection(self):
+        """ensure_connection() that raises DeviceNotFound if the device stays unusable."""
+        if not await self.ensure_connection():
+            raise adb_helper.DeviceNotFound(f"device {self.serial} is not connected")
+
+    async def shell(self, cmd, timeout=None):
+        timeout = timeout or adb_helper.TIMEOUTS["shell"]
+        if not adb_helper.PERSISTENT_SHELL:
+            return await asyncio.to_thread(self.device.shell, cmd, timeout=timeout)
+        return await self._shell.run(cmd, timeout)
+
+    async def exec_out(self, cmd, timeout=None):
+        """Binary stdout of `adb exec-out <cmd>`.
+
+        Raises CalledProcessError on failure, TimeoutExpired after timeout.
+        """
+        timeout = timeout or adb_helper.TIMEOUTS["shell"]
+        client = adb_helper._client()
+        if client is not None:
+            try:
+                reader, writer = await client.open_service_async(self.serial, f"exec:{cmd}")
+            except AdbError as e:
+                raise subprocess.CalledProcessError(1, ["exec-out", cmd], stderr=str(e).encode())
+            except (OSError, asyncio.TimeoutError):
+                pass
+            else:
+                try:
+                    return await asyncio.wait_for(reader.read(), timeout)
+                except asyncio.TimeoutError:
+                    raise subprocess.TimeoutExpired(["exec-out", cmd], timeout)
+                finally:
+                    writer.close()
+        proc = await asyncio.create_subprocess_exec(
+            adb_helper.ADB_PATH, "-s", self.serial, "exec-out", *cmd.split(),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        try:
+            out, err = await asyncio.wait_for(proc.communicate(), timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            raise subprocess.TimeoutExpired(["exec-out", cmd], timeout)
+        if proc.returncode:
+            raise subprocess.CalledProcessError(proc.returncode, ["exec-out", cmd], stderr=err)
+        return out
+
+    async def capture_frame(self, fmt="bgr", retries=3, delay=0.2, scale=1.0):
+        """Async adb_helper.capture_frame(): BGR (or raw RGBA) frame, None on failure.
+
+        Retries, validation and accounting are the Device's own steps; only
+        the screencap transfer runs on the event loop.
+        """
+        dev = self.device
+        for attempt in range(retries):
+            if not dev._may_retry(attempt):
+                return None
+            raw = None
+            if await self.ensure_connection():
+                if dev.stream is not None:
+                    frame = await asyncio.to_thread(dev._stream_capture, fmt, scale)
+                    if frame is not None:
+                        return frame
+                try:
+                    with dev.timed("capture"):
+                        raw = await self.exec_out("screencap", timeout=adb_helper.TIMEOUTS["capture"])
+                except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+                    dev._capture_error(e, attempt)
+            frame = dev._finish_capture(raw, attempt, retries, fmt, scale)
+            if frame is not None:
+                return frame
+            await asyncio.sleep(delay)
+        print("[-] Final screenshot attempt failed or was blank.")
+        return None
+
+    async def _injector(self):
+        # Discovery runs a few shell commands once; keep it off the loop
+        if self.device._injector is adb_helper._UNSET:
+            return await asyncio.to_thread(self.device.injector)
+        return self.device.injector()
+
+    async def _inject(self, build_cmd, timeout):
+        inj = await self._injector()
+        if inj is None:
+            return False
+        try:
+            await self.shell(build_cmd(inj), timeout)
+            return True
+        except subprocess.CalledProcessError as e:
+            print(f"[-] Raw touch injection failed on {self.serial}: {(e.output or '').strip()}")
+            self.device._injector = None
+            return False
+
+    async def tap(self, x, y):
+        await self.require_connection()
+        x, y = int(x), int(y)
+        timeout = adb_helper.TIMEOUTS["tap"]
+        with self.device.timed("tap"):
+            if not await self._inject(lambda inj: inj.tap_cmd(x, y), timeout):
+                await self.shell(f"input tap {x} {y}", timeout)
+
+    async def tap_and_hold(self, x, y, duration_ms=2500):
+        await self.require_connection()
+        x, y, ms = int(x), int(y), int(duration_ms)
+        timeout = adb_helper.TIMEOUTS["tap"] + ms / 1000
+        with self.device.timed("tap_and_hold"):
+            if not await self._inject(lambda inj: inj.hold_cmd(x, y, ms), timeout):
+                await self.shell(f"input swipe {x} {y} {x} {y} {ms}", timeout)
+
+    async def close(self):
+        await self._shell.close()
+
+
+_ASYNC_DEVICES = {}
+
+
+def get_device(device=None):
+    """AsyncDevice for a Device handle, or for the selected device.
+
+    Selecting the device may block (first use, or it dropped); call
+    ensure_connection() first to do that off the loop.
+    """
+    device = device or adb_helper.get_device()
+    adev = _ASYNC_DEVICES.get(device.serial)
+    if adev is None or adev.device is not device:
+        adev = _ASYNC_DEVICES[device.serial] = AsyncDevice(device)
+    return adev
+
+
+async def ensure_connection(device=None):
+    """Async adb_helper.ensure_connection(); selects/reconnects in a worker thread."""
+    if device is not None:
+        await get_device(device).require_connection()
+        return True
+    serial = adb_helper.ADB_DEVICE
+    if serial is None or adb_helper.TRACKER.state(serial) != "device":
+        await asyncio.to_thread(adb_helper.ensure_connection)
+    return True
+
+
+async def _target(device):
+    if device is None:
+        await ensure_connection()
+    return get_device(device)
+
+
+async def tap(x, y, device=None):
+    await (await _target(device)).tap(x, y)
+
+
+async def tap_and_hold(x, y, duration_ms=2500, device=None):
+    await (await _target(device)).tap_and_hold(x, y, duration_ms)
+
+
+async def capture_frame(fmt="bgr", retries=3, delay=0.2, scale=1.0, device=None):
+    return await (await _target(device)).capture_frame(fmt=fmt, retries=retries, delay=delay,
+                                                       scale=scale)
+
+
+async def human_delay(min_s=0.15, max_s=0.4):
+    """Non-blocking counterpart of main.py's human_delay()."""
+    await asyncio.sleep(random.uniform(min_s, max_s))
+
+
+async def close():
+    """Close the async shell streams (call before the event loop ends)."""
+    for adev in list(_ASYNC_DEVICES.values()):
+        await adev.close()
+    _ASYNC_DEVICES.clear()
@@ -0,0 +1,185 @@
+# utils/adb_client.py
+"""Minimal client for the adb server's smart-socket protocol.
+
+Talks to the adb server on localhost:5037 directly instead of forking the
+`adb` binary for every command. Requests are a 4-hex-digit length plus the
+request text; the server answers OKAY or FAIL + length-prefixed message.
+After `host:transport:<serial>` the same socket is switched to the device
+and the next request (`shell:...`, `exec:...`) becomes a raw byte stream.
+"""
+import asyncio
+import os
+import socket
+import threading
+
+ADB_SERVER_HOST = os.getenv("ADB_SERVER_HOST", "127.0.0.1")
+ADB_SERVER_PORT = int(os.getenv("ANDROID_ADB_SERVER_PORT", "5037"))
+
+
+class AdbError(Exception):
+    """The adb server answered FAIL (e.g. device not found)."""
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError(f"adb server closed connection ({len(buf)}/{n} bytes)")
+        buf += chunk
+    return bytes(buf)
+
+
+def _recv_all(sock, limit=None):
+    """Read until EOF, or until limit bytes (the rest is left unread)."""
+    chunks = []
+    got = 0
+    while limit is None or got < limit:
+        chunk = sock.recv(256 * 1024 if limit is None else min(256 * 1024, limit - got))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        got += len(chunk)
+    return b"".join(chunks)
+
+
+def _read_length_prefixed(sock):
+    return _recv_exact(sock, int(_recv_exact(sock, 4), 16))
+
+
+def _send_request(sock, request):
+    data = request.encode()
+    sock.sendall(b"%04x" % len(data) + data)
+    status = _recv_exact(sock, 4)
+    if status == b"OKAY":
+        return
+    if status == b"FAIL":
+        raise AdbError(_read_length_prefixed(sock).decode(errors="ignore"))
+    raise AdbError(f"unexpected adb server reply {status!r} to {request}")
+
+
+async def _send_request_async(reader, writer, request):
+    data = request.encode()
+    writer.write(b"%04x" % len(data) + data)
+    await writer.drain()
+    status = await reader.readexactly(4)
+    if status == b"OKAY":
+        return
+    if status == b"FAIL":
+        n = int(await reader.readexactly(4), 16)
+        raise AdbError((await reader.readexactly(n)).decode(errors="ignore"))
+    raise AdbError(f"unexpected adb server reply {status!r} to {request}")
+
+
+def parse_device_list(text):
+    """Parse `serial<TAB>state` lines into {serial: state}."""
+    states = {}
+    for line in text.splitlines():
+        parts = line.split("\t")
+        if len(parts) >= 2 and parts[0]:
+            states[parts[0]] = parts[1].strip()
+    return states
+
+
+class AdbClient:
+    """Smart-socket client for one adb server.
+
+    Each host request or device service uses its own short-lived TCP
+    connection (that is how the server works). The long-lived `shell:sh`
+    streams used for input commands are kept per device by
+    adb_helper.Device (one ShellSession each).
+    """
+
+    def __init__(self, host=ADB_SERVER_HOST, port=ADB_SERVER_PORT, timeout=10):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock
+
+    # ---- host services ----
+    def host_request(self, request):
+        """Run a host:* request that answers with one length-prefixed payload."""
+        with self._connect() as sock:
+            _send_request(sock, request)
+            return _read_length_prefixed(sock).decode(errors="ignore")
+
+    def version(self):
+        return int(self.host_request("host:version"), 16)
+
+    def devices(self):
+        return parse_device_list(self.host_request("host:devices"))
+
+    def connect_device(self, hostport):
+        """Equivalent of `adb connect host:port`; returns the server message."""
+        msg = self.host_request(f"host:connect:{hostport}")
+        if "connected" not in msg:
+            raise AdbError(msg)
+        return msg
+
+    def track_devices(self):
+        """Yield the full {serial: state} map each time the server reports a change."""
+        sock = self._connect()
+        sock.settimeout(None)
+        try:
+            _send_request(sock, "host:track-devices")
+            while True:
+                yield parse_device_list(_read_length_prefixed(sock).decode(errors="ignore"))
+        finally:
+            sock.close()
+
+    # ---- device services ----
+    def open_service(self, serial, service, timeout=None):
+        """Switch a fresh connection to serial and start service on it."""
+        sock = self._connect()
+        try:
+            _send_request(sock, f"host:transport:{serial}")
+            _send_request(sock, service)
+        except BaseException:
+            sock.close()
+            raise
+        sock.settimeout(timeout)
+        return sock
+
+    async def open_service_async(self, serial, service):
+        """asyncio version of open_service(); returns (StreamReader, StreamWriter)."""
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout)
+        try:
+            await _send_request_async(reader, writer, f"host:transport:{serial}")
+            await _send_request_async(reader, writer, service)
+        except BaseException:
+            writer.close()
+            raise
+        return reader, writer
+
+    def exec_out(self, serial, cmd, timeout=None, limit=None):
+        """Raw, binary-safe stdout of `cmd` (like `adb exec-out`).
+
+        timeout bounds each socket read; socket.timeout is raised when the
+        device goes silent for that long. With limit, only the first limit
+        bytes are read and the stream is closed (the command gets SIGPIPE).
+        """
+        with self.open_service(serial, f"exec:{cmd}", timeout=timeout or self.timeout) as sock:
+            return _recv_all(sock, limit)
+
+    def shell(self, serial, cmd, timeout=None):
+        """Text output of `cmd` (like `adb shell`, stdout and stderr mixed)."""
+        with self.open_service(serial, f"shell:{cmd}", timeout=timeout or self.timeout) as sock:
+            return _recv_all(sock).decode(errors="ignore")
+
+
+_CLIENTS = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def get_client(host=ADB_SERVER_HOST, port=ADB_SERVER_PORT):
+    """Shared AdbClient per server address."""
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get((host, port))
+        if client is None:
+            client = _CLIENTS[(host, port)] = AdbClient(host, port)
+        return client
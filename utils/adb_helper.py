@@ -2,36 +2,245 @@
 import os
 import re
 import time
+import struct
 import cv2
+import numpy as np
 import subprocess
 import shutil
 import sys
+import atexit
+import queue
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from utils.adb_client import AdbError, get_client, parse_device_list
+from utils.input_events import EventInjector, discover as discover_touchscreen, input_gesture_cmd
+from utils.metrics import Counters, LatencyStats, MetricsDumper, RetryBudget
+from utils.dispatcher import Dispatcher, DEPLOY, CAPTURE, IDLE
 
 ADB_PATH = shutil.which("adb") or "adb"
 ENV_SERIAL = os.getenv("ANDROID_SERIAL") or os.getenv("ADB_SERIAL")
-ADB_DEVICE = None  # set in _select_device()
+ADB_DEVICE = None  # set lazily by _select_device() on first use
+# Keep one `adb shell` open per device and write input commands into it
+# instead of forking adb for every tap. Set ADB_PERSISTENT_SHELL=0 to disable.
+PERSISTENT_SHELL = os.getenv("ADB_PERSISTENT_SHELL", "1") != "0"
+# How taps reach the device: "input" runs the `input` command (starts a JVM
+# per call), "evdev" writes raw touch events to /dev/input/eventN
+# (utils/input_events.py), "auto" uses evdev when a writable touchscreen
+# is found and `input` otherwise.
+INPUT_BACKEND = os.getenv("ADB_INPUT_BACKEND", "input")
+
+# Device presence comes from a background `adb track-devices` feed; if that
+# is unavailable, an `adb devices` result is trusted for this many seconds.
+TRACK_DEVICES = os.getenv("ADB_TRACK_DEVICES", "1") != "0"
+DEVICE_STATE_TTL = float(os.getenv("ADB_DEVICE_STATE_TTL", "5"))
+# "socket" speaks the adb server protocol directly (utils/adb_client.py) and
+# falls back to the binary whenever the server can't be reached; "binary"
+# forks `adb` for every command as before.
+ADB_BACKEND = os.getenv("ADB_BACKEND", "socket")
+# Per-operation deadlines in seconds, overridable as ADB_TIMEOUT_TAP etc.
+# A call past its deadline has its adb child killed (or its shell stream
+# torn down) and raises subprocess.TimeoutExpired instead of hanging.
+TIMEOUTS = {op: float(os.getenv(f"ADB_TIMEOUT_{op.upper()}", default)) for op, default in
+            (("tap", 5), ("capture", 10), ("connect", 15), ("devices", 10), ("shell", 15))}
+# Latency of every adb operation across devices, see get_latency_stats();
+# each Device keeps its own copy plus counters, see get_metrics()
+LATENCY = LatencyStats()
+# Set ADB_METRICS_JSONL=path to append a get_metrics() snapshot every
+# ADB_METRICS_INTERVAL seconds (started by warm_up/start_metrics_dump)
+METRICS_JSONL = os.getenv("ADB_METRICS_JSONL")
+METRICS_INTERVAL = float(os.getenv("ADB_METRICS_INTERVAL", "60"))
+# A screenrecord stream sends nothing while the screen is static; while its
+# pipe is connected the newest frame is reused however old it is, otherwise
+# (recorded source, pipe respawning) only if it is at most this old
+STREAM_MAX_AGE_MS = float(os.getenv("ADB_STREAM_MAX_AGE_MS", "500"))
+
+def _run(cmd, timeout=None, **kw):
+    """subprocess.run that kills the child and raises TimeoutExpired after timeout."""
+    return subprocess.run(cmd, check=True, text=True, capture_output=True, timeout=timeout, **kw)
+
+def _client():
+    """AdbClient for the local adb server, or None when using the binary."""
+    return get_client() if ADB_BACKEND == "socket" else None
+
+def _device_states():
+    client = _client()
+    if client is not None:
+        try:
+            return client.devices()
+        except (OSError, AdbError):
+            pass  # server not up yet; the binary starts it
+    return parse_device_list(_run([ADB_PATH, "devices"], timeout=TIMEOUTS["devices"]).stdout)
+
+def _connect_hostport(serial):
+    with LATENCY.time("connect"):
+        client = _client()
+        if client is not None:
+            try:
+                client.connect_device(serial)
+                return
+            except OSError:
+                pass
+            except AdbError as e:
+                raise subprocess.CalledProcessError(1, ["adb", "connect", serial], stderr=str(e))
+        _run([ADB_PATH, "connect", serial], timeout=TIMEOUTS["connect"])
+
+class DeviceTracker:
+    """Last-known state of every adb device, kept fresh by `adb track-devices`.
 
-def _run(cmd, **kw):
-    return subprocess.run(cmd, check=True, text=True, capture_output=True, **kw)
+    The adb server pushes the full device list whenever anything changes, so
+    ensure_connection() can answer from memory and only blocks when the
+    device really dropped. Counters are kept for monitoring.
+    """
+    def __init__(self):
+        self._states = {}
+        self._updated = 0.0
+        self._lock = threading.Lock()
+        self._proc = None
+        self._thread = None
+        self._live = threading.Event()  # set while the track-devices feed is up
+        self.counters = {"updates": 0, "drops": 0, "reconnects": 0,
+                         "reconnect_failures": 0, "feed_restarts": 0}
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="DeviceTracker", daemon=True)
+        self._thread.start()
+
+    def observe(self, states):
+        """Record a complete device listing (from the feed or `adb devices`)."""
+        with self._lock:
+            for serial, old in self._states.items():
+                if old == "device" and states.get(serial) != "device":
+                    self.counters["drops"] += 1
+                    print(f"[-] ADB device {serial} went {states.get(serial, 'missing')}")
+            self._states = dict(states)
+            self._updated = time.time()
+            self.counters["updates"] += 1
+
+    def state(self, serial):
+        """Known state of serial ('device', 'offline', 'missing'), None if stale."""
+        with self._lock:
+            fresh = self._live.is_set() or time.time() - self._updated < DEVICE_STATE_TTL
+            if not fresh or not self._updated:
+                return None
+            return self._states.get(serial, "missing")
+
+    def count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {"live": self._live.is_set(), "age_s": round(time.time() - self._updated, 3)
+                    if self._updated else None, "states": dict(self._states),
+                    "counters": dict(self.counters)}
+
+    def _feed_socket(self, client):
+        for states in client.track_devices():
+            self.observe(states)
+            self._live.set()
+
+    def _feed_binary(self):
+        self._proc = subprocess.Popen([ADB_PATH, "track-devices"],
+                                      stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        read = self._proc.stdout.read
+        while True:
+            head = read(4)
+            if len(head) < 4:
+                break
+            payload = read(int(head, 16)) if head != b"0000" else b""
+            self.observe(parse_device_list(payload.decode(errors="ignore")))
+            self._live.set()
+
+    def _run(self):
+        while True:
+            try:
+                client = _client()
+                if client is not None:
+                    try:
+                        self._feed_socket(client)
+                    except (ConnectionRefusedError, AdbError):
+                        self._feed_binary()
+                else:
+                    self._feed_binary()
+            except (OSError, ValueError) as e:
+                print(f"[-] adb track-devices failed: {e}")
+            self._live.clear()
+            if self._proc and self._proc.poll() is None:
+                self._proc.kill()
+            self.count("feed_restarts")
+            time.sleep(2)
+
+TRACKER = DeviceTracker()
 
 def _list_devices():
-    out = _run([ADB_PATH, "devices"]).stdout.splitlines()[1:]  # skip header
-    return [l.split()[0] for l in out if "\tdevice" in l]
+    with LATENCY.time("devices"):
+        states = _device_states()
+    TRACKER.observe(states)
+    return [serial for serial, state in states.items() if state == "device"]
+
+def get_device_health():
+    """Tracker state and reconnect counters, for monitoring."""
+    snap = TRACKER.snapshot()
+    snap["selected"] = ADB_DEVICE
+    snap["devices"] = POOL.health()
+    return snap
+
+def get_latency_stats():
+    """p50/p99/max latency, error and timeout counts per adb operation."""
+    return LATENCY.snapshot()
+
+# Extra sections for get_metrics() (name -> callable returning a dict), e.g. the OCR cascade
+METRICS_SOURCES = {}
+
+def get_metrics():
+    """Snapshot of all adb instrumentation: global and per-device latency
+    histograms, capture bytes, blank-frame retries, tracker counters."""
+    snap = {"latency": LATENCY.snapshot(), "tracker": TRACKER.snapshot()["counters"],
+            "devices": {dev.serial: dev.metrics() for dev in POOL.devices()}}
+    for name, source in list(METRICS_SOURCES.items()):
+        snap[name] = source()
+    return snap
+
+_DUMPER = None
+
+def start_metrics_dump(path=None, interval=None):
+    """Append get_metrics() to a JSONL file periodically (and once at exit)."""
+    global _DUMPER
+    path = path or METRICS_JSONL
+    if _DUMPER is None and path:
+        _DUMPER = MetricsDumper(path, get_metrics, interval or METRICS_INTERVAL).start()
+        atexit.register(_DUMPER.stop)
+        print(f"[+] Writing adb metrics to {path} every {_DUMPER.interval:g}s")
+    return _DUMPER
+
+def timed(op, device=None):
+    """Context manager timing a non-adb stage (e.g. "ocr") alongside the adb calls."""
+    return _target(device).timed(op)
 
 def _is_hostport(s):
     return bool(s and re.match(r"^\d{1,3}(?:\.\d{1,3}){3}:\d{2,5}$", s))
 
+class DeviceNotFound(RuntimeError):
+    """No usable adb device: nothing attached, or the requested serial is missing."""
+
+_SELECT_LOCK = threading.Lock()
+
 def _select_device():
     global ADB_DEVICE
     sel = ENV_SERIAL
     if sel and _is_hostport(sel):
         # ensure host:port is connected
-        if f"{sel}\tdevice" not in _run([ADB_PATH, "devices"]).stdout:
+        if sel not in _list_devices():
             try:
-                _run([ADB_PATH, "connect", sel])
-            except subprocess.CalledProcessError as e:
+                _connect_hostport(sel)
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
                 print(f"[-] adb connect {sel} failed:\n{e.stderr}", file=sys.stderr)
-                sys.exit(1)
+                raise DeviceNotFound(f"adb connect {sel} failed") from e
 
     devices = _list_devices()
     if sel:
@@ -39,76 +248,878 @@ def _select_device():
             print(f"[-] Selected device {sel} not found in adb devices.", file=sys.stderr)
             if not _is_hostport(sel):
                 print("    Tip: is the emulator/instance running? Correct serial?", file=sys.stderr)
-            sys.exit(1)
+            raise DeviceNotFound(f"device {sel} not found")
         ADB_DEVICE = sel
     else:
         if not devices:
             print("[-] No ADB device found. Connect one or set ANDROID_SERIAL/ADB_SERIAL.", file=sys.stderr)
-            sys.exit(1)
+            raise DeviceNotFound("no adb device attached")
         ADB_DEVICE = devices[0]
     print(f"[+] Using ADB device: {ADB_DEVICE}")
 
-def ensure_connection():
-    # Re-validate the chosen device is still present
-    global ADB_DEVICE
-    if ADB_DEVICE is None:
-        _select_device()
-        return
-    if ADB_DEVICE not in _list_devices():
-        # Try to reconnect host:port, otherwise reselect
-        if _is_hostport(ADB_DEVICE):
+# ---- raw framebuffer capture ----
+# screencap pixel formats (android.graphics.PixelFormat) we know how to read
+_PIXEL_FORMATS = {1: 4, 2: 4, 3: 3, 4: 2, 5: 4}  # format -> bytes per pixel
+
+def parse_raw_frame(buf):
+    """Parse raw `screencap` output into a (H, W, C) uint8 view of `buf`.
+
+    The header is width, height, format (12 bytes) plus a colour-space word
+    on Android 9+ (16 bytes). No pixels are copied; 4-byte formats come back
+    as HxWx4 RGBA, RGB_565 as HxWx2 raw words.
+    """
+    if len(buf) < 12:
+        raise ValueError(f"screencap output too short ({len(buf)} bytes)")
+    w, h, fmt = struct.unpack_from("<III", buf)
+    bpp = _PIXEL_FORMATS.get(fmt)
+    if bpp is None:
+        raise ValueError(f"unsupported screencap pixel format {fmt}")
+    size = w * h * bpp
+    header = len(buf) - size
+    if header not in (12, 16):
+        raise ValueError(f"screencap size mismatch: {len(buf)} bytes for {w}x{h}x{bpp}")
+    return np.frombuffer(buf, dtype=np.uint8, count=size, offset=header).reshape(h, w, bpp)
+
+def to_bgr(frame):
+    """Convert a parsed raw frame to a BGR image (copies)."""
+    channels = frame.shape[2]
+    if channels == 4:
+        return cv2.cvtColor(frame, cv2.COLOR_RGBA2BGR)
+    if channels == 3:
+        return cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+    return cv2.cvtColor(frame, cv2.COLOR_BGR5652BGR)
+
+def decimate(frame, scale):
+    """Strided view keeping every n-th pixel (n = round(1/scale)); no copy."""
+    step = max(1, int(round(1 / scale)))
+    return frame if step == 1 else frame[::step, ::step]
+
+def _frame_is_blank(frame):
+    return frame is None or not frame.size or frame[..., :3].mean() in (0, 255)
+
+# ---- persistent shell session ----
+class ShellSession:
+    """Long-lived `adb shell` for one device; commands are written to its stdin.
+
+    Each command is followed by an echo of a marker plus the exit status, so
+    run() still blocks until the command finished on the device, it just no
+    longer pays for an adb process spawn. A dead pipe is respawned once.
+    With an AdbClient the session is a `shell:sh` socket to the adb server,
+    otherwise an `adb shell sh` child process.
+    """
+    MARKER = "__ADB_HELPER_DONE__"
+    # Split with quotes so an echoed command line never matches MARKER
+    _MARKER_CMD = 'echo __ADB_HELPER_""DONE__$?'
+
+    def __init__(self, serial, client=None, budget=None):
+        self.serial = serial
+        self.client = client
+        self.budget = budget  # RetryBudget gating respawns, None = always respawn once
+        self._proc = None
+        self._sock = None
+        self._stdin = self._stdout = None
+        self._lock = threading.Lock()
+        self._aborted = False
+
+    def alive(self):
+        if self._sock is not None:
+            return True
+        return self._proc is not None and self._proc.poll() is None
+
+    def _spawn(self):
+        if self.client is not None:
             try:
-                _run([ADB_PATH, "connect", ADB_DEVICE])
-            except subprocess.CalledProcessError:
+                self._sock = self.client.open_service(self.serial, "shell:sh")
+                self._stdin = self._sock.makefile("w", encoding="utf-8", newline="\n")
+                self._stdout = self._sock.makefile("r", encoding="utf-8", errors="ignore")
+                return
+            except (OSError, AdbError):
+                self._sock = None  # fall back to the binary
+        self._proc = subprocess.Popen([ADB_PATH, "-s", self.serial, "shell", "sh"],
+                                      stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                      stderr=subprocess.STDOUT, text=True, bufsize=1)
+        self._stdin, self._stdout = self._proc.stdin, self._proc.stdout
+
+    @classmethod
+    def marked(cls, cmd):
+        """Command line that runs cmd and then echoes MARKER plus its exit status."""
+        return f"{cmd}; {cls._MARKER_CMD}\n"
+
+    @classmethod
+    def split_marker(cls, line):
+        """(output before MARKER, exit status) if line ends a command, else None."""
+        idx = line.find(cls.MARKER)
+        if idx < 0:
+            return None
+        status = line[idx + len(cls.MARKER):].strip()
+        return line[:idx], int(status) if status.isdigit() else 0
+
+    def _exchange(self, cmd):
+        self._stdin.write(self.marked(cmd))
+        self._stdin.flush()
+        output = []
+        while True:
+            line = self._stdout.readline()
+            if not line:
+                raise BrokenPipeError("adb shell closed")
+            end = self.split_marker(line)
+            if end is not None:
+                output.append(end[0])
+                return end[1], "".join(output)
+            output.append(line)
+
+    def _abort(self):
+        """Watchdog: tear the stream down so a blocked readline() returns."""
+        self._aborted = True
+        sock, proc = self._sock, self._proc
+        try:
+            if sock is not None:
+                sock.shutdown(socket.SHUT_RDWR)
+            elif proc is not None:
+                proc.kill()
+        except OSError:
+            pass
+
+    def run(self, cmd, timeout=None):
+        """Run a shell command line on the device; returns its output.
+
+        If it has not finished after timeout seconds the session is killed
+        (a fresh one is spawned on the next call) and TimeoutExpired raised.
+        """
+        with self._lock:
+            for attempt in range(2):
+                if attempt and self.budget is not None and not self.budget.try_spend():
+                    raise subprocess.CalledProcessError(255, cmd, output="retry budget exhausted")
+                if not self.alive():
+                    self._spawn()
+                self._aborted = False
+                timer = threading.Timer(timeout, self._abort) if timeout else None
+                if timer:
+                    timer.daemon = True
+                    timer.start()
+                try:
+                    rc, out = self._exchange(cmd)
+                except (BrokenPipeError, OSError, ValueError):
+                    if self._aborted:
+                        self.close()
+                        print(f"[-] adb shell to {self.serial} timed out after {timeout}s: {cmd[:60]}")
+                        raise subprocess.TimeoutExpired(cmd, timeout)
+                    print(f"[-] adb shell to {self.serial} died; respawning (try {attempt+1})")
+                    self.close()
+                    continue
+                finally:
+                    if timer:
+                        timer.cancel()
+                if self._aborted:
+                    self.close()  # watchdog fired just as the command finished
+                if self.budget is not None:
+                    self.budget.success()
+                if rc != 0:
+                    raise subprocess.CalledProcessError(rc, cmd, output=out)
+                return out
+        # Pipe keeps dying: fall back to a one-shot adb call
+        return _run([ADB_PATH, "-s", self.serial, "shell", cmd], timeout=timeout).stdout
+
+    def close(self):
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            for f in (self._stdin, self._stdout, sock):
+                try:
+                    f.close()
+                except OSError:
+                    pass
+        proc, self._proc = self._proc, None
+        self._stdin = self._stdout = None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            proc.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+# ---- per-device state ----
+_UNSET = object()
+
+class Device:
+    """One adb device and everything that belongs to it: its persistent
+    shell, touch injector, optional frame stream and reconnect counters.
+
+    The module-level helpers (tap, capture_frame, ...) run on the selected
+    device; pass device=<Device> to drive another one from the same process.
+    """
+    def __init__(self, serial):
+        self.serial = serial
+        self.stream = None  # FrameStream while start_frame_stream() is active
+        self.dispatcher = None  # Dispatcher while start_dispatcher() is active
+        self.reconnects = 0
+        self.reconnect_failures = 0
+        self.retries = RetryBudget()
+        self.latency = LatencyStats()  # per-device copy of the LATENCY histograms
+        self.counters = Counters()  # captures, capture_bytes, blank_frames, ...
+        self._geometry = None  # (width, height, bytes per pixel, header size) of raw screencap
+        self._roi_on_device = True  # False once head/tail cropping failed on this device
+        self._roi_from_stream = True  # False once the stream's frames were not full size
+        self._session = None
+        self._injector = _UNSET
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"Device({self.serial})"
+
+    @contextmanager
+    def timed(self, op):
+        """Time the with-block as op, for this device and in LATENCY."""
+        with LATENCY.time(op), self.latency.time(op):
+            yield
+
+    # ---- health ----
+    def state(self):
+        """Tracked adb state ('device', 'offline', 'missing'), None if unknown."""
+        return TRACKER.state(self.serial)
+
+    def ensure_connection(self):
+        """True if the device is usable; reconnects host:port serials that dropped."""
+        with self.timed("ensure_connection"):
+            if TRACK_DEVICES:
+                TRACKER.start()
+            state = TRACKER.state(self.serial)
+            if state == "device":
+                return True
+            if state is None and self.serial in _list_devices():
+                return True
+        print(f"[-] ADB device {self.serial} is {state or 'missing'}; reconnecting...")
+        TRACKER.count("reconnects")
+        self.reconnects += 1
+        with self.timed("reconnect"):
+            if _is_hostport(self.serial):
+                try:
+                    _connect_hostport(self.serial)
+                except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+                    TRACKER.count("reconnect_failures")
+                    self.reconnect_failures += 1
+            return self.serial in _list_devices()
+
+    def require_connection(self):
+        """ensure_connection() that raises DeviceNotFound if the device stays unusable."""
+        if not self.ensure_connection():
+            raise DeviceNotFound(f"device {self.serial} is not connected")
+
+    def metrics(self):
+        """Latency histograms and I/O counters of this device."""
+        counters = self.counters.snapshot()
+        if counters.get("captures"):
+            counters["bytes_per_capture"] = counters["capture_bytes"] // counters["captures"]
+        return {"latency": self.latency.snapshot(), "counters": counters, "health": self.health()}
+
+    def health(self):
+        return {"state": TRACKER.state(self.serial), "reconnects": self.reconnects,
+                "reconnect_failures": self.reconnect_failures,
+                "retry_tokens": round(self.retries.tokens, 1), "retries_denied": self.retries.denied,
+                "streaming": bool(self.stream and self.stream.running()),
+                "dispatcher": dict(self.dispatcher.counters, queued=self.dispatcher.queued())
+                if self.dispatcher else None}
+
+    # ---- transport ----
+    def adb(self, *args, timeout=None):
+        """Run the adb binary with -s <serial>."""
+        return _run([ADB_PATH, "-s", self.serial, *map(str, args)],
+                    timeout=timeout or TIMEOUTS["shell"])
+
+    def exec_out(self, *args, timeout=None, limit=None):
+        """Binary stdout of `adb exec-out <args>`.
+
+        With limit, reading stops after limit bytes and the command is cut
+        off. Raises CalledProcessError on failure and TimeoutExpired if the
+        device sends nothing for timeout seconds.
+        """
+        timeout = timeout or TIMEOUTS["shell"]
+        client = _client()
+        if client is not None:
+            try:
+                return client.exec_out(self.serial, " ".join(map(str, args)), timeout=timeout,
+                                       limit=limit)
+            except AdbError as e:
+                raise subprocess.CalledProcessError(1, ["exec-out", *args], stderr=str(e).encode())
+            except socket.timeout:
+                raise subprocess.TimeoutExpired(["exec-out", *args], timeout)
+            except OSError:
                 pass
-        if ADB_DEVICE not in _list_devices():
+        cmd = [ADB_PATH, "-s", self.serial, "exec-out", *map(str, args)]
+        if limit is None:
+            return subprocess.run(cmd, check=True, capture_output=True, timeout=timeout).stdout
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        timer = threading.Timer(timeout, proc.kill)
+        timer.start()
+        try:
+            data = proc.stdout.read(limit)
+        finally:
+            timer.cancel()
+            proc.kill()
+            proc.wait()
+        return data
+
+    def session(self):
+        """The device's persistent ShellSession (created on first use)."""
+        with self._lock:
+            if self._session is None:
+                self._session = ShellSession(self.serial, client=_client(), budget=self.retries)
+            return self._session
+
+    def shell(self, *args, timeout=None):
+        """Run `adb shell <args>` via the persistent session; returns output."""
+        timeout = timeout or TIMEOUTS["shell"]
+        if not PERSISTENT_SHELL:
+            return self.adb("shell", *args, timeout=timeout).stdout
+        return self.session().run(" ".join(map(str, args)), timeout=timeout)
+
+    def shell_output(self, cmd):
+        """Output of a shell command, ignoring its exit status."""
+        try:
+            return self.shell(cmd)
+        except subprocess.CalledProcessError as e:
+            return e.output or ""
+        except subprocess.TimeoutExpired:
+            return ""
+
+    # ---- capture ----
+    def capture_frame(self, fmt="bgr", retries=3, delay=0.2, scale=1.0):
+        """Grab the framebuffer in memory via `exec-out screencap` (no PNG).
+
+        fmt="bgr" returns an OpenCV-ready HxWx3 image; fmt="raw" returns the
+        zero-copy HxWx4 RGBA view of the adb output. scale < 1 decimates
+        during the raw parse (0.5 = quarter of the pixels), so only the kept
+        pixels are converted; map coordinates with utils/coords.py. With a
+        frame stream running its current frame is used when there is one
+        (RGBA for fmt="raw" from either backend). Returns None if every
+        attempt failed or was blank (an attempt on a device that could not be
+        reconnected counts as failed), or the device's retry budget ran out.
+        """
+        for attempt in range(retries):
+            if not self._may_retry(attempt):
+                return None
+            raw = None
+            if self.ensure_connection():
+                frame = self._stream_capture(fmt, scale)
+                if frame is not None:
+                    return frame
+                try:
+                    with self.timed("capture"):
+                        raw = self.exec_out("screencap", timeout=TIMEOUTS["capture"])
+                except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+                    self._capture_error(e, attempt)
+            frame = self._finish_capture(raw, attempt, retries, fmt, scale)
+            if frame is not None:
+                return frame
+            time.sleep(delay)
+        print("[-] Final screenshot attempt failed or was blank.")
+        return None
+
+    # Steps of capture_frame() around the screencap transfer, shared with
+    # adb_async.AsyncDevice.capture_frame() so only the transport differs
+    def _may_retry(self, attempt):
+        """False (logged) if a retry is due and the retry budget is spent."""
+        if attempt and not self.retries.try_spend():
+            print(f"[-] Retry budget for {self.serial} exhausted; giving up on screenshot")
+            return False
+        return True
+
+    def _stream_capture(self, fmt, scale):
+        """The frame stream's current frame, decimated; None if there is no usable one."""
+        frame = self._stream_frame(fmt)
+        return None if _frame_is_blank(frame) else decimate(frame, scale)
+
+    def _capture_error(self, e, attempt):
+        """Log a screencap transfer that failed or timed out."""
+        if isinstance(e, subprocess.TimeoutExpired):
+            print(f"[-] screencap on {self.serial} timed out after {e.timeout}s (try {attempt+1})")
+        else:
+            msg = (e.stderr or b"").decode(errors="ignore")
+            print(f"[-] screencap failed on {self.serial} (try {attempt+1}): {msg.strip()}")
+
+    def _finish_capture(self, raw, attempt, retries, fmt, scale):
+        """Count, parse and check one screencap (raw is None if the transfer
+        failed); returns the frame, or None (logged) if it should be retried."""
+        frame = None
+        if raw is not None:
+            self.counters.add("captures")
+            self.counters.add("capture_bytes", len(raw))
+            try:
+                frame = parse_raw_frame(raw)
+            except ValueError as e:
+                print(f"[-] screencap unreadable on {self.serial} (try {attempt+1}): {e}")
+        if not _frame_is_blank(frame):
+            self.retries.success()
+            frame = decimate(frame, scale)
+            return frame if fmt == "raw" else to_bgr(frame)
+        self.counters.add("blank_frames" if frame is not None else "capture_failures")
+        print(f"[-] Screenshot retry {attempt+1}/{retries} (blank or unreadable)")
+        return None
+
+    def _stream_frame(self, fmt):
+        """A current frame from the running frame stream, None if there is none.
+
+        A screencap loop delivers continuously, so wait for its next frame;
+        screenrecord goes quiet on a static screen, so reuse its newest frame
+        while the pipe is connected, or one at most STREAM_MAX_AGE_MS old if not.
+        """
+        stream = self.stream
+        if stream is None or not stream.running():
+            return None
+        if stream.IDLE_WHEN_STATIC:
+            frame = stream.current_frame(fmt=fmt)
+            if frame is None:
+                frame = stream.latest_frame(max_age_ms=STREAM_MAX_AGE_MS, fmt=fmt)
+            return frame
+        return stream.wait_for_new_frame(timeout=2, fmt=fmt)
+
+    def _fb_geometry(self):
+        """(width, height, bytes per pixel, header size) of raw screencap, probed once."""
+        if self._geometry is None:
+            buf = self.exec_out("screencap", timeout=TIMEOUTS["capture"])
+            h, w, bpp = parse_raw_frame(buf).shape
+            self._geometry = (w, h, bpp, len(buf) - w * h * bpp)
+        return self._geometry
+
+    def capture_roi(self, box, fmt="bgr"):
+        """Capture only box=(x1, y1, x2, y2) of the screen.
+
+        Only rows y1..y2 leave the device: screencap is piped through
+        `head -c | tail -c` there, and head exiting after the last needed row
+        stops screencap early. Without head/tail the raw stream is read up to
+        the last needed row and then closed. Columns are sliced on the host.
+        With a frame stream running the box is cut from its current frame
+        (see _stream_frame) if that frame has the full screen resolution; a
+        downscaled screenrecord stream falls back to the device crop.
+        Returns an (y2-y1)x(x2-x1) BGR image (or RGBA view for fmt="raw"),
+        None on failure or if the device could not be reconnected.
+        """
+        x1, y1, x2, y2 = box
+        if not self.ensure_connection():
+            return None
+        try:
+            w, h, bpp, header = self._fb_geometry()
+            frame = self._stream_frame(fmt) if self._roi_from_stream else None
+            if frame is not None:
+                if frame.shape[:2] == (h, w):
+                    return frame[y1:y2, x1:x2]
+                print(f"[-] Stream frames are {frame.shape[1]}x{frame.shape[0]}, not the {w}x{h} "
+                      f"screen; ROI captures on {self.serial} crop on the device instead")
+                self._roi_from_stream = False
+            stride = w * bpp
+            end, size = header + y2 * stride, (y2 - y1) * stride
+            with self.timed("capture_roi"):
+                buf = b""
+                if self._roi_on_device:
+                    buf = self.exec_out(f"screencap | head -c {end} | tail -c {size}",
+                                        timeout=TIMEOUTS["capture"])
+                    if len(buf) != size:
+                        print(f"[-] On-device crop unavailable on {self.serial}; reading rows from the stream")
+                        self._roi_on_device = False
+                if not self._roi_on_device:
+                    buf = self.exec_out("screencap", timeout=TIMEOUTS["capture"], limit=end)
+                    buf = buf[header + y1 * stride:]
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, ValueError) as e:
+            print(f"[-] ROI capture failed on {self.serial}: {e}")
+            return None
+        self.counters.add("roi_captures")
+        self.counters.add("roi_bytes", len(buf))
+        if len(buf) != size:
+            self._geometry = None  # resolution/rotation changed; re-probe next time
+            print(f"[-] ROI capture on {self.serial} got {len(buf)} of {size} bytes")
+            return None
+        rows = np.frombuffer(buf, dtype=np.uint8).reshape(y2 - y1, w, bpp)
+        roi = rows[:, x1:x2]
+        return roi if fmt == "raw" else to_bgr(roi)
+
+    def take_screenshot(self, output_path="screen.png", retries=3, delay=0.2, scale=1.0):
+        """Capture a BGR frame; also write it to output_path unless that is None.
+
+        If the capture fails output_path is removed, so nothing reads the
+        previous screenshot back as the current one.
+        """
+        with self.timed("take_screenshot"):
+            img = self.capture_frame(retries=retries, delay=delay, scale=scale)
+            if output_path:
+                if img is not None:
+                    cv2.imwrite(output_path, img)
+                elif os.path.exists(output_path):
+                    os.remove(output_path)
+        return img
+
+    def start_frame_stream(self, capacity=3, backend="screencap", **kw):
+        """Start a background capture thread; capture_frame() then reads from it.
+
+        backend="screencap" loops raw screencap; backend="screenrecord" decodes
+        the H.264 screenrecord stream (extra kw: size, bit_rate).
+        """
+        from utils.frame_stream import FrameStream, ScreenrecordStream
+        self._roi_from_stream = True
+        if self.stream is None:
+            if backend == "screenrecord":
+                self.stream = ScreenrecordStream(self.serial, capacity=capacity, **kw)
+            else:
+                self.stream = FrameStream(self.serial, capacity=capacity)
+        self.stream.start()
+        return self.stream
+
+    def stop_frame_stream(self):
+        stream, self.stream = self.stream, None
+        if stream is not None:
+            stream.stop()
+
+    # ---- touch input ----
+    def injector(self):
+        """Raw event injector, discovered once per session (None = use `input`)."""
+        if INPUT_BACKEND not in ("evdev", "auto"):
+            return None
+        if self._injector is _UNSET:
+            touch = discover_touchscreen(self.shell_output)
+            self._injector = EventInjector(touch) if touch else None
+            if touch:
+                print(f"[+] Raw touch injection on {self.serial}: {touch}")
+            else:
+                print(f"[-] No writable touchscreen on {self.serial}; using `input` for taps")
+        return self._injector
+
+    def _inject(self, build_cmd, timeout):
+        """Run an injector command; on failure drop back to `input` for this device."""
+        inj = self.injector()
+        if inj is None:
+            return False
+        try:
+            self.shell(build_cmd(inj), timeout=timeout)
+            return True
+        except subprocess.CalledProcessError as e:
+            print(f"[-] Raw touch injection failed on {self.serial}: {(e.output or '').strip()}")
+            self._injector = None
+            return False
+
+    def tap(self, x, y):
+        self.require_connection()
+        timeout = TIMEOUTS["tap"]
+        with self.timed("tap"):
+            if not self._inject(lambda inj: inj.tap_cmd(int(x), int(y)), timeout):
+                self.shell("input", "tap", int(x), int(y), timeout=timeout)
+
+    def tap_and_hold(self, x, y, duration_ms=2500):
+        self.require_connection()
+        timeout = TIMEOUTS["tap"] + duration_ms / 1000
+        with self.timed("tap_and_hold"):
+            if not self._inject(lambda inj: inj.hold_cmd(int(x), int(y), int(duration_ms)), timeout):
+                self.shell("input", "swipe", int(x), int(y), int(x), int(y), int(duration_ms),
+                           timeout=timeout)
+
+    def gesture(self, paths, duration_ms=300):
+        """Multi-finger touch: one list of (x, y) waypoints per finger.
+
+        All fingers go down together, move along their paths over duration_ms
+        and lift together, e.g. [[(100, 500), (100, 200)]] drags one finger and
+        [[p1], [p2], [p3]] presses three points at once. Needs the evdev input
+        backend on a multi-touch panel; otherwise the fingers are played one
+        after another through `input`.
+        """
+        self.require_connection()
+        paths = [[(int(x), int(y)) for x, y in path] for path in paths]
+        # `input` plays fingers one after another
+        timeout = TIMEOUTS["tap"] + len(paths) * duration_ms / 1000
+        with self.timed("gesture"):
+            inj = self.injector()
+            if inj is not None and len(paths) <= inj.touch.max_pointers:
+                if self._inject(lambda inj: inj.gesture_cmd(paths, duration_ms), timeout):
+                    return
+            self.shell(input_gesture_cmd(paths, duration_ms), timeout=timeout)
+
+    def multi_tap(self, points, hold_ms=60):
+        """Tap several points simultaneously (one finger each)."""
+        self.gesture([[p] for p in points], duration_ms=hold_ms)
+
+    def run_macro(self, macro, cancel=None, timeout=None):
+        """Run a Macro on the device as one script; device-side sleeps, one round trip.
+
+        Blocks until the script finished (returns True) or until `cancel`
+        (a threading.Event) is set or `timeout` expires, in which case the
+        session is closed, the script is killed on the device and False is
+        returned. The default timeout is the macro's own duration plus the
+        shell timeout, so a hung device cannot block the caller forever.
+        """
+        self.require_connection()
+        script = macro.compile(self.injector())
+        sess = ShellSession(self.serial, client=_client())
+        sess._spawn()
+        lines = queue.Queue()
+
+        def pump(stdout):
+            for line in stdout:
+                lines.put(line)
+            lines.put(None)
+
+        threading.Thread(target=pump, args=(sess._stdout,), name="MacroOutput", daemon=True).start()
+        sess._stdin.write(f"echo __MACRO_PID__$$\n{script}\necho __MACRO_""DONE__\nexit\n")
+        sess._stdin.flush()
+        print(f"[macro] Running {macro} on {self.serial}")
+
+        pid, done = None, False
+        t0 = time.time()
+        if timeout is None:
+            timeout = macro.duration() + TIMEOUTS["shell"]
+        deadline = t0 + timeout
+        try:
+            while True:
+                if cancel is not None and cancel.is_set():
+                    break
+                if time.time() > deadline:
+                    print(f"[-] Macro {macro.name} timed out after {timeout:.1f}s")
+                    break
+                try:
+                    line = lines.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if line is None:
+                    break
+                if line.startswith("__MACRO_PID__"):
+                    pid = line[len("__MACRO_PID__"):].strip()
+                elif line.startswith("__MACRO_DONE__"):
+                    done = True
+                    break
+            for stats in (LATENCY, self.latency):
+                stats.record("macro", (time.time() - t0) * 1000, "ok" if done else "timeout")
+            if not done:
+                sess._abort()  # shut the session down; the output pump returns even on a hung device
+            if not done and pid and pid.isdigit():
+                # Freeze the script, kill whatever it is running, then the script itself
+                self.shell_output(f"kill -STOP {pid}; pkill -P {pid}; kill -9 {pid}")
+                print(f"[macro] {macro.name} cancelled")
+            return done
+        finally:
+            sess.close()
+
+    def start_dispatcher(self):
+        """Route the module-level calls for this device through a priority queue."""
+        if self.dispatcher is None:
+            self.dispatcher = Dispatcher(f"Dispatcher-{self.serial}").start()
+        return self.dispatcher
+
+    def stop_dispatcher(self):
+        disp, self.dispatcher = self.dispatcher, None
+        if disp is not None:
+            disp.stop()
+
+    def close(self):
+        self.stop_dispatcher()
+        self.stop_frame_stream()
+        with self._lock:
+            sess, self._session = self._session, None
+        if sess is not None:
+            sess.close()
+
+class DevicePool:
+    """All Device objects of this process, one per serial.
+
+    Lets a single process drive several emulators (sharing e.g. the OCR
+    model) instead of one process per device.
+    """
+    def __init__(self):
+        self._devices = {}
+        self._lock = threading.Lock()
+
+    def get(self, serial):
+        """The Device for serial, created on first use."""
+        with self._lock:
+            dev = self._devices.get(serial)
+            if dev is None:
+                dev = self._devices[serial] = Device(serial)
+            return dev
+
+    def discover(self):
+        """Devices for every serial adb currently lists as online."""
+        return [self.get(serial) for serial in _list_devices()]
+
+    def devices(self):
+        with self._lock:
+            return list(self._devices.values())
+
+    def run_all(self, fn, devices=None):
+        """Call fn(device) for each device in parallel; returns {serial: result}."""
+        devices = list(devices) if devices is not None else self.devices()
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, len(devices))) as ex:
+            futures = {ex.submit(fn, dev): dev.serial for dev in devices}
+            for fut, serial in futures.items():
+                results[serial] = fut.result()
+        return results
+
+    def health(self):
+        return {dev.serial: dev.health() for dev in self.devices()}
+
+    def close(self):
+        with self._lock:
+            devices = list(self._devices.values())
+            self._devices.clear()
+        for dev in devices:
+            dev.close()
+
+POOL = DevicePool()
+atexit.register(POOL.close)
+
+# ---- selected device (module-level API) ----
+def ensure_connection(device=None):
+    """Make sure the device (default: the selected one) is usable; blocks only if it dropped.
+
+    The first call selects the device (nothing happens at import time); if
+    the selected device dropped and cannot be reconnected, another one is
+    selected. Raises DeviceNotFound if there is none, or if the given
+    device cannot be reconnected.
+    """
+    if device is not None:
+        device.require_connection()
+        return
+    if ADB_DEVICE is None:
+        with _SELECT_LOCK:
+            if ADB_DEVICE is None:
+                _select_device()
+        return
+    if not POOL.get(ADB_DEVICE).ensure_connection():
+        with _SELECT_LOCK:
             _select_device()
 
-# Select device immediately on import so main.py prints it once
-_select_device()
+def warm_up(load=None):
+    """Select the device while load() (e.g. the OCR model) runs; returns load().
+
+    Device selection, the track-devices feed, the persistent shell and
+    touchscreen discovery happen on a background thread, so startup takes
+    as long as the slower of the two instead of their sum. Meant for
+    scripts: exits with status 1 when no device is found.
+    """
+    failed = []
+
+    def discover():
+        try:
+            dev = get_device()
+        except DeviceNotFound as e:
+            failed.append(e)
+            return
+        if PERSISTENT_SHELL:
+            dev.session().run("true")
+        dev.injector()
+
+    if METRICS_JSONL:
+        start_metrics_dump()
+    t = threading.Thread(target=discover, name="DeviceWarmUp", daemon=True)
+    t.start()
+    result = load() if load is not None else None
+    t.join()
+    if failed:
+        sys.exit(1)
+    return result
+
+def get_device(serial=None):
+    """Device handle for serial, or for the selected device."""
+    if serial is None:
+        ensure_connection()
+        serial = ADB_DEVICE
+    return POOL.get(serial)
+
+def _target(device):
+    return device if device is not None else get_device()
+
+def _dispatch(dev, priority, fn, *args, key=None, **kwargs):
+    """Run fn on dev's dispatcher at priority, or inline if it has none."""
+    disp = dev.dispatcher
+    if disp is None:
+        return fn(*args, **kwargs)
+    return disp.call(priority, fn, *args, key=key, **kwargs)
 
 def _adb(*args):
     """Always call adb with -s <ADB_DEVICE>."""
-    if ADB_DEVICE is None:
-        _select_device()
-    return subprocess.run([ADB_PATH, "-s", ADB_DEVICE, *map(str, args)],
-                          check=True, text=True, capture_output=True)
+    return _target(None).adb(*args)
 
-def take_screenshot(output_path="screen.png", retries=3, delay=0.4):
-    """Grab a PNG via exec-out; validate it isn't blank."""
-    for attempt in range(retries):
-        ensure_connection()
-        with open(output_path, "wb") as f:
-            p = subprocess.Popen([ADB_PATH, "-s", ADB_DEVICE, "exec-out", "screencap", "-p"],
-                                 stdout=f, stderr=subprocess.PIPE)
-            _, err = p.communicate()
-            if p.returncode != 0:
-                msg = err.decode(errors="ignore")
-                print(f"[-] screencap failed (try {attempt+1}): {msg.strip()}")
-        time.sleep(delay)
-        img = cv2.imread(output_path)
-        if img is not None and img.size and img.mean() not in (0, 255):
-            return
-        print(f"[-] Screenshot retry {attempt+1}/{retries} (blank or unreadable)")
-        time.sleep(0.2)
-    print("[-] Final screenshot attempt failed or was blank.")
+def capture_frame(fmt="bgr", retries=3, delay=0.2, scale=1.0, device=None):
+    dev = _target(device)
+    # Identical captures waiting in the dispatcher share one screencap
+    return _dispatch(dev, CAPTURE, dev.capture_frame, fmt=fmt, retries=retries, delay=delay,
+                     scale=scale, key=("frame", fmt, scale))
+capture_frame.__doc__ = Device.capture_frame.__doc__
+
+def capture_roi(box, fmt="bgr", device=None):
+    dev = _target(device)
+    return _dispatch(dev, CAPTURE, dev.capture_roi, box, fmt=fmt, key=("roi", tuple(box), fmt))
+capture_roi.__doc__ = Device.capture_roi.__doc__
+
+def take_screenshot(output_path="screen.png", retries=3, delay=0.2, scale=1.0, device=None):
+    """Capture a BGR frame; also write it to output_path unless that is None."""
+    dev = _target(device)
+    return _dispatch(dev, CAPTURE, dev.take_screenshot, output_path, retries=retries, delay=delay,
+                     scale=scale, key=("screenshot", output_path, scale))
+
+def start_frame_stream(serial=None, capacity=3, backend="screencap", device=None, **kw):
+    """Start a background capture thread; capture_frame() then reads from it."""
+    dev = device or get_device(serial)
+    return dev.start_frame_stream(capacity=capacity, backend=backend, **kw)
+
+def stop_frame_stream(serial=None, device=None):
+    (device or get_device(serial)).stop_frame_stream()
+
+def get_frame_stream(serial=None, device=None):
+    """Return the running FrameStream for a device, if any."""
+    return (device or get_device(serial)).stream
+
+def tap(x, y, device=None):
+    dev = _target(device)
+    _dispatch(dev, DEPLOY, dev.tap, x, y)
+
+def tap_and_hold(x, y, duration_ms=2500, device=None):
+    dev = _target(device)
+    _dispatch(dev, DEPLOY, dev.tap_and_hold, x, y, duration_ms)
+
+def gesture(paths, duration_ms=300, device=None):
+    dev = _target(device)
+    _dispatch(dev, DEPLOY, dev.gesture, paths, duration_ms)
+gesture.__doc__ = Device.gesture.__doc__
+
+def multi_tap(points, hold_ms=60, device=None):
+    """Tap several points simultaneously (one finger each)."""
+    dev = _target(device)
+    _dispatch(dev, DEPLOY, dev.multi_tap, points, hold_ms)
+
+def run_macro(macro, cancel=None, timeout=None, device=None):
+    dev = _target(device)
+    return _dispatch(dev, DEPLOY, dev.run_macro, macro, cancel=cancel, timeout=timeout)
+run_macro.__doc__ = Device.run_macro.__doc__
+
+def idle_tap(x, y, max_age=5.0, device=None):
+    """Background tap (keep-awake etc.) at the lowest priority.
+
+    With a dispatcher running this returns at once: the tap is played when
+    nothing more urgent is queued, replaces an older idle tap still waiting,
+    and is dropped if it could not run within max_age seconds. Without a
+    dispatcher it is an ordinary tap().
+    """
+    dev = _target(device)
+    if dev.dispatcher is None:
+        dev.tap(x, y)
+        return
+    fut = dev.dispatcher.submit(IDLE, dev.tap, x, y, key="idle_tap", max_age=max_age, replace=True)
+    fut.add_done_callback(lambda f: f.exception() and print(f"[-] Idle tap failed: {f.exception()}"))
 
-def tap(x, y):
-    ensure_connection()
-    _adb("shell", "input", "tap", int(x), int(y))
+def start_dispatcher(device=None):
+    """Start the per-device priority dispatcher (deploy > capture > idle)."""
+    return _target(device).start_dispatcher()
 
-def tap_and_hold(x, y, duration_ms=2500):
-    ensure_connection()
-    _adb("shell", "input", "swipe", int(x), int(y), int(x), int(y), int(duration_ms))
+def stop_dispatcher(device=None):
+    _target(device).stop_dispatcher()
 
 # ---- helpers exposed to main.py ----
 def get_selected_device():
-    """Return the serial of the currently selected device."""
-    return ADB_DEVICE
+    """Return the serial of the selected device (selecting one if needed)."""
+    return get_device().serial
 
 def set_device(serial):
-    """Optional: switch device programmatically before first use."""
+    """Optional: switch device programmatically; selected on next use."""
     global ADB_DEVICE, ENV_SERIAL
-    ENV_SERIAL = serial
-    ADB_DEVICE = None
-    _select_device()
+    with _SELECT_LOCK:
+        ENV_SERIAL = serial
+        ADB_DEVICE = None
@@ -0,0 +1,50 @@
+# utils/coords.py
+"""Map the bot's screen coordinates onto reduced-scale frames.
+
+Every tap target, OCR box and overlay in the scripts is written for the
+1600x900 screen (REFERENCE_SIZE). Detection that doesn't need full
+resolution works on smaller frames (capture_frame(scale=0.5) has a quarter
+of the pixels); these helpers convert between the two so the hard-coded
+coordinates keep working. The scale of a frame is derived from its width,
+so callers never have to carry it around.
+"""
+import math
+
+import cv2
+
+REFERENCE_SIZE = (1600, 900)  # (w, h) the hard-coded coordinates are written for
+
+
+def frame_scale(frame):
+    """Scale of frame relative to REFERENCE_SIZE (1.0 for a full screenshot)."""
+    return frame.shape[1] / REFERENCE_SIZE[0]
+
+
+def to_frame(point, scale):
+    """Screen (x, y) -> pixel (x, y) in a frame of the given scale."""
+    return int(point[0] * scale), int(point[1] * scale)
+
+
+def to_screen(point, scale):
+    """Pixel (x, y) in a frame of the given scale -> screen (x, y) for tap()."""
+    return int(round(point[0] / scale)), int(round(point[1] / scale))
+
+
+def box_to_frame(box, scale):
+    """Screen box (x1, y1, x2, y2) -> frame box, rounded outwards."""
+    x1, y1, x2, y2 = box
+    return (math.floor(x1 * scale), math.floor(y1 * scale),
+            math.ceil(x2 * scale), math.ceil(y2 * scale))
+
+
+def crop(frame, box, upscale=False):
+    """Crop screen box out of frame, whatever its scale.
+
+    upscale=True resizes the crop back to the box's screen size, for
+    consumers such as OCR that expect full-resolution glyphs.
+    """
+    x1, y1, x2, y2 = box_to_frame(box, frame_scale(frame))
+    part = frame[y1:y2, x1:x2]
+    if upscale and part.size and part.shape[1] != box[2] - box[0]:
+        part = cv2.resize(part, (box[2] - box[0], box[3] - box[1]), interpolation=cv2.INTER_LINEAR)
+    return part
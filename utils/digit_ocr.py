@@ -0,0 +1,256 @@
+# utils/digit_ocr.py
+"""Template-matching digit recognizer for the loot panel.
+
+The loot numbers are always drawn in the same game font, so instead of a
+neural OCR each field is binarized, split into glyphs by column projection
+and every glyph is classified by normalized correlation against a bank of
+digit templates, all glyphs of a panel in one NumPy matrix product (well
+under a millisecond per field).
+
+The template bank is harvested from labelled panels: screenshots saved in
+loot_dataset/<RUN_TAG>/ labelled by easyocr (or a labels CSV), or
+synthetic screens with known values:
+
+    python -m utils.digit_ocr harvest loot_dataset/emu-1 --out digit_templates.npz
+    python -m utils.digit_ocr harvest --synthetic 300 --out digit_templates.npz
+
+TemplateReader has the same read()/read_fields() interface as
+utils.loot_ocr.LootReader, so it can stand in for it (LOOT_OCR_ENGINE=template).
+digit_counts() only counts the glyphs, which bounds a value (n digits is
+below 10**n) well enough to reject low-loot bases before any OCR.
+"""
+import argparse
+import csv
+import os
+
+import cv2
+import numpy as np
+
+from utils.loot_ocr import FIELDS, crop_fields
+
+GLYPH_SIZE = (12, 16)  # (w, h) every glyph is resized to before matching
+MIN_THRESHOLD = 110  # binarization never goes below this gray level
+
+
+def binarize(crop, min_threshold=MIN_THRESHOLD):
+    """Boolean mask of the bright digit pixels of a BGR (or gray) crop."""
+    gray = crop if crop.ndim == 2 else cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    otsu, _ = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return gray > max(otsu, min_threshold)
+
+
+def _split_wide(part, width):
+    """Cut a run of touching glyphs into round(w / width) pieces at the
+    emptiest columns near the nominal cuts."""
+    n = max(1, int(round(part.shape[1] / width)))
+    if n == 1:
+        return [part]
+    col_sum = part.sum(axis=0)
+    cuts, slack = [0], max(1, int(width) // 3)
+    for k in range(1, n):
+        nominal = int(round(k * part.shape[1] / n))
+        lo, hi = max(cuts[-1] + 1, nominal - slack), min(part.shape[1] - 1, nominal + slack)
+        cuts.append(lo + int(col_sum[lo:hi + 1].argmin()) if hi >= lo else nominal)
+    cuts.append(part.shape[1])
+    return [part[:, a:b] for a, b in zip(cuts, cuts[1:]) if b > a]
+
+
+def segment(mask, min_height=0.5, max_aspect=1.2):
+    """Glyph masks of a binarized field, left to right.
+
+    Columns with any foreground form runs; each run is one glyph, trimmed
+    to its rows. Runs shorter than min_height of the tallest one (commas,
+    specks of background) are dropped, and runs wider than max_aspect of
+    the glyph height (digits touching each other) are split by the median
+    width of the single glyphs.
+    """
+    cols = mask.any(axis=0)
+    if not cols.any():
+        return []
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], cols.view(np.int8), [0]))))
+    runs = [mask[:, start:stop] for start, stop in zip(edges[::2], edges[1::2])]
+    heights = [np.flatnonzero(r.any(axis=1)) for r in runs]
+    tallest = max(h[-1] - h[0] + 1 for h in heights)
+    singles = [r.shape[1] for r in runs if r.shape[1] <= max_aspect * tallest]
+    width = np.median(singles) if singles else 0.8 * tallest
+    glyphs = []
+    for run, rows in zip(runs, heights):
+        if rows[-1] - rows[0] + 1 < min_height * tallest:
+            continue
+        pieces = [run] if run.shape[1] <= max_aspect * tallest else _split_wide(run, width)
+        for piece in pieces:
+            r = np.flatnonzero(piece.any(axis=1))
+            if len(r):
+                glyphs.append(piece[r[0]:r[-1] + 1])
+    return glyphs
+
+
+def glyph_vectors(glyphs):
+    """(n, w*h) zero-mean unit-norm vectors, so a dot product is a correlation."""
+    if not glyphs:
+        return np.zeros((0, GLYPH_SIZE[0] * GLYPH_SIZE[1]), np.float32)
+    vecs = np.stack([cv2.resize(g.astype(np.float32), GLYPH_SIZE, interpolation=cv2.INTER_AREA).ravel()
+                     for g in glyphs])
+    vecs -= vecs.mean(axis=1, keepdims=True)
+    norms = np.linalg.norm(vecs, axis=1, keepdims=True)
+    return vecs / np.maximum(norms, 1e-6)
+
+
+def digit_counts(image, origin=(0, 0), fields=FIELDS):
+    """{field: number of glyphs}, segmented like TemplateReader but not classified."""
+    crops = crop_fields(image, origin, fields)
+    return {f: len(segment(binarize(crops[f]))) for f in fields}
+
+
+class TemplateBank:
+    """Digit templates (n, w*h) with their labels."""
+
+    def __init__(self, templates, labels):
+        self.templates = np.asarray(templates, np.float32)
+        self.labels = np.asarray(labels, np.int8)
+
+    def classify(self, vecs):
+        """(digits, scores) of each glyph vector; scores are correlations in [-1, 1]."""
+        if len(vecs) == 0:
+            return np.zeros(0, np.int8), np.zeros(0, np.float32)
+        scores = vecs @ self.templates.T
+        best = scores.argmax(axis=1)
+        return self.labels[best], scores[np.arange(len(vecs)), best]
+
+    def save(self, path):
+        np.savez_compressed(path, templates=self.templates, labels=self.labels,
+                            glyph_size=np.array(GLYPH_SIZE))
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        if tuple(data["glyph_size"]) != GLYPH_SIZE:
+            raise ValueError(f"{path} was harvested for glyph size {tuple(data['glyph_size'])}")
+        return cls(data["templates"], data["labels"])
+
+    def __len__(self):
+        return len(self.labels)
+
+
+def harvest(samples, per_digit=12):
+    """TemplateBank from labelled panels.
+
+    samples yields (BGR frame, (gold, elixir, dark)); fields whose glyph
+    count differs from the label's digit count are skipped. Up to per_digit
+    exemplars per digit are kept, spread over the whole run.
+    """
+    found = {d: [] for d in range(10)}
+    used = skipped = 0
+    for image, values in samples:
+        crops = crop_fields(image)
+        for field, value in zip(FIELDS, values):
+            glyphs = segment(binarize(crops[field]))
+            digits = str(int(value))
+            if not value or len(glyphs) != len(digits):
+                skipped += 1
+                continue
+            used += 1
+            for vec, d in zip(glyph_vectors(glyphs), digits):
+                found[int(d)].append(vec)
+    templates, labels = [], []
+    for d, vecs in found.items():
+        if not vecs:
+            continue
+        pick = np.linspace(0, len(vecs) - 1, min(per_digit, len(vecs))).round().astype(int)
+        templates += [vecs[i] for i in pick]
+        labels += [d] * len(pick)
+    missing = [d for d, vecs in found.items() if not vecs]
+    print(f"[+] Harvested {len(labels)} templates from {used} fields ({skipped} skipped)"
+          + (f"; no samples of digits {missing}" if missing else ""))
+    return TemplateBank(templates, labels)
+
+
+class TemplateReader:
+    """Loot reader backed by a TemplateBank (same interface as LootReader)."""
+
+    def __init__(self, bank):
+        self.bank = TemplateBank.load(bank) if isinstance(bank, str) else bank
+
+    def read_fields(self, image, origin=(0, 0), fields=FIELDS):
+        """{field: (value, confidence)}; confidence is the weakest glyph correlation."""
+        crops = crop_fields(image, origin, fields)
+        per_field = [segment(binarize(crops[f])) for f in fields]
+        digits, scores = self.bank.classify(glyph_vectors([g for gs in per_field for g in gs]))
+        out, i = {}, 0
+        for field, glyphs in zip(fields, per_field):
+            n = len(glyphs)
+            if n == 0:
+                out[field] = (0, 0.0)
+                continue
+            value = int("".join(str(d) for d in digits[i:i + n]))
+            out[field] = (value, float(scores[i:i + n].min()))
+            i += n
+        return out
+
+    def read(self, image, origin=(0, 0)):
+        values = self.read_fields(image, origin)
+        return tuple(values[f][0] for f in FIELDS)
+
+
+def read_labels(path):
+    """labels CSV (file,gold,elixir,dark) -> {file name: (gold, elixir, dark)}"""
+    with open(path, newline="") as f:
+        return {os.path.basename(row["file"]): (int(row["gold"]), int(row["elixir"]), int(row["dark"]))
+                for row in csv.DictReader(f)}
+
+
+def labelled_frames(directory, labels=None, reader=None):
+    """Yield (frame, values) for the screenshots in directory.
+
+    Values come from the labels dict, else from reader (a LootReader) - in
+    practice easyocr labelling the dataset once.
+    """
+    from utils.fake_adb_server import load_frames
+    for path in load_frames(directory):
+        image = cv2.imread(path)
+        if image is None:
+            continue
+        if labels is not None:
+            values = labels.get(os.path.basename(path))
+            if values is not None:
+                yield image, values
+        else:
+            yield image, reader.read(image)
+
+
+def synthetic_frames(count, seed=0):
+    """Yield (frame, values) rendered by utils.synthetic_screens."""
+    from utils.synthetic_screens import GameScreen
+    screen = GameScreen(seed=seed)
+    for _ in range(count):
+        yield screen.render(), tuple(screen.loot[f] for f in FIELDS)
+        screen.on_input(["tap", "1470", "760"])  # Next base
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Harvest loot digit templates")
+    ap.add_argument("command", choices=["harvest"])
+    ap.add_argument("directory", nargs="?", help="screenshots, e.g. loot_dataset/<RUN_TAG>")
+    ap.add_argument("--labels", help="CSV with file,gold,elixir,dark (default: label with easyocr)")
+    ap.add_argument("--synthetic", type=int, help="harvest from this many synthetic screens instead")
+    ap.add_argument("--per-digit", type=int, default=12)
+    ap.add_argument("--out", default="digit_templates.npz")
+    args = ap.parse_args()
+
+    if args.synthetic:
+        samples = synthetic_frames(args.synthetic)
+    elif args.directory is None:
+        ap.error("give a screenshot directory or --synthetic N")
+    elif args.labels:
+        samples = labelled_frames(args.directory, labels=read_labels(args.labels))
+    else:
+        import easyocr
+        from utils.loot_ocr import LootReader
+        samples = labelled_frames(args.directory, reader=LootReader(easyocr.Reader(["en"], gpu=False)))
+    bank = harvest(samples, per_digit=args.per_digit)
+    bank.save(args.out)
+    print(f"[+] Saved {len(bank)} templates to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# utils/dispatcher.py
+"""Per-device command dispatcher with priorities.
+
+One worker thread per device runs everything sent to that device in
+priority order: deploy taps and macros first, then captures, then idle
+/ keep-alive taps, so time-critical input never queues behind background
+work. Identical pending captures are coalesced into one, and idle taps
+that waited longer than their max_age are dropped instead of being
+played late.
+
+adb_helper.start_dispatcher() attaches one to a device; from then on the
+module-level tap()/capture_frame()/run_macro()/... calls go through it.
+"""
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+
+DEPLOY, CAPTURE, IDLE = 0, 1, 2
+PRIORITY_NAMES = {DEPLOY: "deploy", CAPTURE: "capture", IDLE: "idle"}
+
+
+class _Job:
+    __slots__ = ("priority", "fn", "args", "kwargs", "key", "max_age", "created", "future")
+
+    def __init__(self, priority, fn, args, kwargs, key, max_age):
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.key = key
+        self.max_age = max_age
+        self.created = time.time()
+        self.future = Future()
+
+
+class Dispatcher:
+    """Priority queue plus one worker thread for a single device."""
+
+    def __init__(self, name="Dispatcher"):
+        self.name = name
+        self._heap = []  # (priority, seq, job)
+        self._seq = itertools.count()
+        self._pending = {}  # key -> queued job, for coalescing / replacing
+        self._cond = threading.Condition()
+        self._thread = None
+        self._running = False
+        self.counters = {"run": 0, "coalesced": 0, "dropped": 0, "replaced": 0}
+
+    def start(self):
+        with self._cond:
+            if self._running:
+                return self
+            self._running = True
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop the worker; queued jobs resolve to None."""
+        with self._cond:
+            self._running = False
+            jobs = [job for _, _, job in self._heap]
+            self._heap.clear()
+            self._pending.clear()
+            self._cond.notify_all()
+        for job in jobs:
+            job.future.set_result(None)
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=5)
+
+    def running(self):
+        return self._running
+
+    def on_worker_thread(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, priority, fn, *args, key=None, max_age=None, replace=False, **kwargs):
+        """Queue fn(*args, **kwargs); returns a concurrent.futures.Future.
+
+        A job with the same key that has not started yet is reused
+        (coalesced), or with replace=True dropped in favour of this one.
+        Jobs still queued max_age seconds after submission are dropped
+        (their future resolves to None).
+        """
+        dropped = None
+        with self._cond:
+            old = self._pending.get(key) if key is not None else None
+            if old is not None and not replace:
+                self.counters["coalesced"] += 1
+                return old.future
+            if old is not None:
+                old.key = None  # skipped when popped
+                self.counters["replaced"] += 1
+                dropped = old
+            job = _Job(priority, fn, args, kwargs, key, max_age)
+            if key is not None:
+                self._pending[key] = job
+            heapq.heappush(self._heap, (priority, next(self._seq), job))
+            self._cond.notify()
+        if dropped is not None:
+            dropped.future.set_result(None)
+        return job.future
+
+    def call(self, priority, fn, *args, key=None, **kwargs):
+        """submit() and wait for the result (re-raises the job's exception).
+
+        Called from the worker itself (a job calling back in) it runs inline.
+        """
+        if self.on_worker_thread():
+            return fn(*args, **kwargs)
+        return self.submit(priority, fn, *args, key=key, **kwargs).result()
+
+    def queued(self):
+        """{priority name: number of queued jobs}"""
+        with self._cond:
+            counts = {}
+            for priority, _, _ in self._heap:
+                name = PRIORITY_NAMES.get(priority, str(priority))
+                counts[name] = counts.get(name, 0) + 1
+            return counts
+
+    def _next_job(self):
+        with self._cond:
+            while True:
+                if not self._running:
+                    return None
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                _, _, job = heapq.heappop(self._heap)
+                if job.future.done():
+                    continue  # replaced while queued
+                if job.key is not None:
+                    self._pending.pop(job.key, None)
+                if job.max_age is not None and time.time() - job.created > job.max_age:
+                    self.counters["dropped"] += 1
+                    job.future.set_result(None)
+                    continue
+                self.counters["run"] += 1
+                return job
+
+    def _run(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                job.future.set_result(job.fn(*job.args, **job.kwargs))
+            except BaseException as e:
+                job.future.set_exception(e)
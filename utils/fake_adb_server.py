@@ -0,0 +1,429 @@
+# utils/fake_adb_server.py
+"""In-process stand-in for the adb server, for exercising adb_client/adb_helper
+without an emulator.
+
+Speaks the same smart-socket protocol as the real server (host:version,
+host:devices, host:track-devices, host:connect, host:transport + shell:/exec:)
+and routes device services to FakeDevice objects that record input commands
+and serve a fixed frame, or replay a recorded screenshot directory, for
+screencap. Raw touch events written to the fake touchscreen (the evdev input
+backend) are decoded back into taps and swipes. Per-command latency can be
+injected to mimic a slow emulator.
+
+    python -m utils.fake_adb_server --port 5037 --devices emu-1,emu-2
+    python -m utils.fake_adb_server --frames loot_dataset/emu-1 --advance tap \
+        --latency screencap=0.25,input=0.03 --tap-log taps.log
+"""
+import argparse
+import glob
+import os
+import re
+import socketserver
+import struct
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+# `getevent -pl` of a typical emulator multi-touch panel
+_GETEVENT = """add device 1: /dev/input/event1
+  name:     "virtio_input_multi_touch_1"
+  events:
+    KEY (0001): BTN_TOUCH
+    ABS (0003): ABS_MT_SLOT           : value 0, min 0, max 9, fuzz 0, flat 0, resolution 0
+                ABS_MT_POSITION_X     : value 0, min 0, max 32767, fuzz 0, flat 0, resolution 0
+                ABS_MT_POSITION_Y     : value 0, min 0, max 32767, fuzz 0, flat 0, resolution 0
+                ABS_MT_TRACKING_ID    : value 0, min 0, max 65535, fuzz 0, flat 0, resolution 0
+  input props:
+    INPUT_PROP_DIRECT
+"""
+
+
+def load_frames(directory):
+    """Sorted image paths of a recorded screenshot directory (e.g. loot_dataset/<RUN_TAG>)."""
+    paths = sorted(p for ext in ("png", "jpg", "jpeg", "webp")
+                   for p in glob.glob(os.path.join(directory, f"*.{ext}")))
+    if not paths:
+        raise FileNotFoundError(f"no screenshots in {directory}")
+    return paths
+
+
+def parse_latency(spec):
+    """"screencap=0.25,input=0.03" -> {"screencap": 0.25, "input": 0.03} (seconds)."""
+    latency = {}
+    for item in filter(None, (spec or "").split(",")):
+        name, _, seconds = item.partition("=")
+        latency[name.strip()] = float(seconds)
+    return latency
+
+
+class FakeDevice:
+    """One fake device: logs input commands / raw touch writes and serves `screencap`.
+
+    frames: list of BGR images or image paths to replay instead of a fixed
+    frame; advance_on picks when the next one is shown: "tap" (any tap),
+    "capture" (after every screencap) or an (x1, y1, x2, y2) box that a tap
+    must land in, e.g. the Next button. latency maps command names ("input",
+    "screencap", "*" for any) to seconds slept before answering. Taps and
+    swipes are appended to tap_log as "<unix time>\t<command>" lines.
+    screen: an object with frame() and on_input(argv), such as
+    utils.synthetic_screens.GameScreen, rendering every capture instead.
+    """
+    EVENT = struct.Struct("<qqHHi")  # 64-bit input_event, as for the x86_64 ABI reported
+    RAW_MAX = 32767  # ABS_MT_POSITION_X/Y max in _GETEVENT
+
+    def __init__(self, serial, frame=None, width=1600, height=900, state="device",
+                 frames=None, advance_on=None, latency=None, tap_log=None, screen=None):
+        self.serial = serial
+        self.state = state
+        self.inputs = []  # (timestamp, "tap 1 2" / "swipe ...")
+        self.commands = []  # every shell/exec command line, in order
+        self.captures = 0
+        self.advances = 0
+        self.latency = dict(latency or {})
+        self.advance_on = advance_on
+        self.tap_log = tap_log
+        self.screen = screen
+        self._frames = list(frames or [])
+        self._frame_index = 0
+        self._slot = 0
+        self._contacts = {}  # evdev slot -> [start (x, y) or None, last (x, y)]
+        self._lock = threading.Lock()
+        if self._frames:
+            self.show_frame(0)
+        else:
+            self.set_frame(frame if frame is not None else
+                           np.full((height, width, 3), 90, np.uint8))
+
+    def set_frame(self, bgr):
+        """Replace the image served by screencap (BGR, HxWx3)."""
+        h, w = bgr.shape[:2]
+        rgba = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGBA)
+        with self._lock:
+            self._frame = bgr
+            self._raw = struct.pack("<IIII", w, h, 1, 0) + rgba.tobytes()
+            self._png = None
+
+    def show_frame(self, index):
+        """Serve frames[index] (wrapping around) from now on."""
+        self._frame_index = index % len(self._frames)
+        frame = self._frames[self._frame_index]
+        if isinstance(frame, str):
+            img = cv2.imread(frame)
+            if img is None:
+                raise ValueError(f"unreadable screenshot {frame}")
+            frame = img
+        self.set_frame(frame)
+
+    def next_frame(self):
+        if self._frames:
+            self.advances += 1
+            self.show_frame(self._frame_index + 1)
+
+    def screencap(self, png=False):
+        if self.screen is not None:
+            self.set_frame(self.screen.frame())
+        with self._lock:
+            self.captures += 1
+            if not png:
+                return self._raw
+            if self._png is None:
+                self._png = cv2.imencode(".png", self._frame)[1].tobytes()
+            return self._png
+
+    def _on_input(self, argv):
+        now = time.time()
+        line = " ".join(argv[1:])
+        with self._lock:
+            self.inputs.append((now, line))
+            if self.tap_log:
+                with open(self.tap_log, "a") as f:
+                    f.write(f"{now:.3f}\t{line}\n")
+        if self.screen is not None:
+            self.screen.on_input(argv[1:])
+        if len(argv) < 4 or argv[1] != "tap" or self.advance_on in (None, "capture"):
+            return
+        if self.advance_on == "tap":
+            self.next_frame()
+            return
+        x1, y1, x2, y2 = self.advance_on
+        if x1 <= int(argv[2]) <= x2 and y1 <= int(argv[3]) <= y2:
+            self.next_frame()
+
+    def _on_evdev(self, blob):
+        """Decode touch events written to the touchscreen node; every finger
+        lifted becomes an `input tap` (or swipe if it moved)."""
+        h, w = self._frame.shape[:2]
+        for off in range(0, len(blob) - self.EVENT.size + 1, self.EVENT.size):
+            _, _, etype, code, value = self.EVENT.unpack_from(blob, off)
+            if etype != 3:  # only EV_ABS carries contacts; BTN_TOUCH / SYN follow them
+                continue
+            if code == 0x2F:  # ABS_MT_SLOT
+                self._slot = value
+            elif code == 0x39:  # ABS_MT_TRACKING_ID
+                if value >= 0:
+                    self._contacts[self._slot] = [None, None]
+                    continue
+                start, last = self._contacts.pop(self._slot, (None, None))
+                if start is None:
+                    continue
+                argv = ["input", "tap", *map(str, start)] if start == last else \
+                       ["input", "swipe", *map(str, start + last), "0"]
+                self._on_input(argv)
+            elif code in (0x35, 0x36) and self._slot in self._contacts:  # ABS_MT_POSITION_X/Y
+                contact = self._contacts[self._slot]
+                x, y = contact[1] or (0, 0)
+                size = w if code == 0x35 else h
+                pos = int(round(value * (size - 1) / self.RAW_MAX))
+                contact[1] = (pos, y) if code == 0x35 else (x, pos)
+                if contact[0] is None and code == 0x36:
+                    contact[0] = contact[1]  # X then Y make the touch-down point
+
+    def stats(self):
+        """Counts for benchmarks: captures, taps, swipes and frames advanced."""
+        with self._lock:
+            kinds = [line.split()[0] for _, line in self.inputs if line]
+        return {"captures": self.captures, "taps": kinds.count("tap"),
+                "swipes": kinds.count("swipe"), "advances": self.advances}
+
+    def run(self, cmd, status=0):
+        """Run one simple command; returns (exit status, output bytes)."""
+        with self._lock:
+            self.commands.append(cmd)
+        argv = cmd.split()
+        if not argv:
+            return status, b""
+        delay = self.latency.get(argv[0], self.latency.get("*"))
+        if delay:
+            time.sleep(delay)
+        if argv[0] == "input":
+            self._on_input(argv)
+            return 0, b""
+        if argv[0] == "printf" and ">" in argv:
+            blob = re.sub(r"\\([0-7]{3})", lambda m: chr(int(m.group(1), 8)),
+                          argv[1].strip("'"))
+            self._on_evdev(blob.encode("latin-1"))
+            return 0, b""
+        if argv[0] == "getevent":
+            return 0, _GETEVENT.encode()
+        if argv[0] == "wm":
+            h, w = self._frame.shape[:2]
+            return 0, f"Physical size: {w}x{h}\n".encode()
+        if argv[0] == "dumpsys":
+            return 0, b"    SurfaceOrientation: 0\n"
+        if argv[0] == "getprop":
+            return 0, b"x86_64\n"
+        if argv[0] == "test":
+            return 0, b""
+        if argv[0] == "screencap":
+            data = self.screencap(png="-p" in argv)
+            if self.advance_on == "capture":
+                self.next_frame()
+            return 0, data
+        if argv[0] == "echo":
+            text = " ".join(argv[1:]).replace('"', "").replace("'", "")
+            return 0, text.replace("$?", str(status)).encode() + b"\n"
+        if argv[0] in ("true", ":", "sleep"):
+            return 0, b""
+        if argv[0] == "false":
+            return 1, b""
+        return 127, f"sh: {argv[0]}: not found\n".encode()
+
+    def run_pipeline(self, cmd, status=0):
+        """Run `cmd | head -c N | tail -c N` (the only filters supported)."""
+        first, *filters = re.split(r"\s*\|\s*", cmd)
+        status, data = self.run(first, status)
+        for f in filters:
+            m = re.fullmatch(r"(head|tail) -c (\d+)", f.strip())
+            if m is None:
+                return 127, f"sh: {f.split()[0]}: not found\n".encode()
+            n = int(m.group(2))
+            data = data[:n] if m.group(1) == "head" else data[-n:]
+        return status, data
+
+    def run_line(self, line, status=0):
+        """Run a `;`-separated command line like sh would."""
+        out = []
+        for cmd in re.split(r"\s*;\s*", line.strip()):
+            status, data = self.run_pipeline(cmd, status)
+            out.append(data)
+        return status, b"".join(out)
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def _recv_exact(self, n):
+        buf = b""
+        while len(buf) < n:
+            chunk = self.request.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("client closed")
+            buf += chunk
+        return buf
+
+    def _read_request(self):
+        return self._recv_exact(int(self._recv_exact(4), 16)).decode()
+
+    def _okay(self, payload=None):
+        msg = b"OKAY"
+        if payload is not None:
+            data = payload.encode() if isinstance(payload, str) else payload
+            msg += b"%04x" % len(data) + data
+        self.request.sendall(msg)
+
+    def _fail(self, reason):
+        data = reason.encode()
+        self.request.sendall(b"FAIL" + b"%04x" % len(data) + data)
+
+    def handle(self):
+        srv = self.server.fake
+        try:
+            req = self._read_request()
+            if req == "host:version":
+                self._okay("0029")
+            elif req == "host:devices":
+                self._okay(srv.device_list())
+            elif req == "host:track-devices":
+                self._track(srv)
+            elif req.startswith("host:connect:"):
+                serial = req.split(":", 2)[2]
+                srv.add_device(FakeDevice(serial))
+                self._okay(f"connected to {serial}")
+            elif req.startswith("host:transport:"):
+                dev = srv.devices.get(req.split(":", 2)[2])
+                if dev is None or dev.state != "device":
+                    self._fail("device not found")
+                    return
+                self._okay()
+                self._device_service(dev, self._read_request())
+            else:
+                self._fail(f"unknown request {req}")
+        except (ConnectionError, OSError):
+            pass
+
+    def _track(self, srv):
+        self._okay()
+        seen = None
+        while not srv.stopped.is_set():
+            with srv.changed:
+                if seen == srv.version:
+                    srv.changed.wait(0.5)
+                    continue
+                seen = srv.version
+                listing = srv.device_list().encode()
+            self.request.sendall(b"%04x" % len(listing) + listing)
+
+    def _device_service(self, dev, service):
+        kind, _, cmd = service.partition(":")
+        kind = kind.split(",")[0]
+        if kind not in ("shell", "exec"):
+            self._fail(f"unknown service {service}")
+            return
+        self._okay()
+        if kind == "shell" and cmd.strip() in ("", "sh"):
+            self._interactive(dev)
+            return
+        _, out = dev.run_line(cmd)
+        self.request.sendall(out)
+
+    def _interactive(self, dev):
+        rfile = self.request.makefile("rb")
+        status = 0
+        for raw in rfile:
+            line = raw.decode(errors="ignore").replace("$$", "4242")
+            if line.strip() == "exit":
+                return
+            status, out = dev.run_line(line, status)
+            if out:
+                self.request.sendall(out)
+
+
+class FakeAdbServer:
+    """Threaded fake adb server; use .port to point ADB clients at it."""
+
+    def __init__(self, devices=(), host="127.0.0.1", port=0):
+        self.devices = {}
+        self.version = 0
+        self.changed = threading.Condition()
+        self.stopped = threading.Event()
+        for dev in devices:
+            self.add_device(dev)
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self._server = socketserver.ThreadingTCPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        self.host, self.port = self._server.server_address
+        self._thread = None
+
+    def device_list(self):
+        return "".join(f"{d.serial}\t{d.state}\n" for d in self.devices.values())
+
+    def add_device(self, dev):
+        with self.changed:
+            self.devices[dev.serial] = dev
+            self.version += 1
+            self.changed.notify_all()
+        return dev
+
+    def set_state(self, serial, state):
+        """Change a device state (e.g. "offline") and notify trackers."""
+        with self.changed:
+            self.devices[serial].state = state
+            self.version += 1
+            self.changed.notify_all()
+
+    def remove_device(self, serial):
+        with self.changed:
+            self.devices.pop(serial, None)
+            self.version += 1
+            self.changed.notify_all()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="FakeAdbServer", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Run a fake adb server")
+    ap.add_argument("--port", type=int, default=5037)
+    ap.add_argument("--devices", default="emulator-5554")
+    ap.add_argument("--frames", help="directory of recorded screenshots to replay")
+    ap.add_argument("--advance", default="tap",
+                    help="show the next frame on: tap, capture or a tap inside x1,y1,x2,y2")
+    ap.add_argument("--latency", help="per-command delay, e.g. screencap=0.25,input=0.03")
+    ap.add_argument("--tap-log", help="append every tap/swipe with its timestamp here")
+    ap.add_argument("--synthetic", choices=("search", "village"),
+                    help="render synthetic game screens starting in this state instead")
+    args = ap.parse_args()
+    advance = args.advance
+    if advance not in ("tap", "capture"):
+        advance = tuple(int(v) for v in advance.split(","))
+    frames = load_frames(args.frames) if args.frames else None
+    def screen():
+        if args.synthetic:
+            from utils.synthetic_screens import GameScreen
+            return GameScreen(args.synthetic)
+        return None
+    server = FakeAdbServer([FakeDevice(s, frames=frames, advance_on=advance,
+                                       latency=parse_latency(args.latency), tap_log=args.tap_log,
+                                       screen=screen())
+                            for s in args.devices.split(",")], port=args.port)
+    server.start()
+    print(f"[+] Fake adb server on {server.host}:{server.port} with {list(server.devices)}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+# utils/frame_bus.py
+"""Shared-memory frame hand-off between a capture process and its consumers.
+
+A FrameBus is one `multiprocessing.shared_memory` segment holding a small
+header and two frame slots (double buffering). The capture process
+(start_capture_process) grabs frames with adb_helper.capture_frame() and
+publishes each into the slot nobody is reading, then flips the active slot
+and bumps the sequence number. The consumer (OCR, debug overlay, dataset
+writer) pins the active slot and works on a numpy view of it, zero-copy and
+without the screen_<RUN_TAG>.png round trip through the disk:
+
+    bus, proc = start_capture_process(serial)
+    with bus.frame(newer_than=time.time()) as (seq, img):
+        loot = extract_loot_values(img)
+
+While a slot is pinned the writer never touches it, so the reader always
+sees a complete frame: the writer fills the other slot once and flips,
+after which the only free slot is the pinned one and further frames are
+dropped (counted in dropped()) until the reader lets go. One consumer per
+bus.
+
+The capture process takes a frame every FRAME_BUS_INTERVAL seconds (0.5 by
+default) and none at all while the consumer has paused the bus, e.g. during
+a battle, when captures would compete with the deploy macro for adb.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+# int64 header fields
+_SEQ, _ACTIVE, _PINNED, _DROPPED, _STOP, _PAUSED = 0, 1, 2, 3, 4, 5
+_SLOT_META = 8  # per slot: seq, capture time (us), height, width, channels
+_META_LEN = 5
+_HEADER_BYTES = 8 * (_SLOT_META + 2 * _META_LEN)
+
+# Minimum seconds between captures of the capture process
+FRAME_BUS_INTERVAL = float(os.getenv("FRAME_BUS_INTERVAL", "0.5"))
+
+
+def _attach(name):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        # Only the creator unlinks; keep the resource tracker of attaching
+        # processes from removing the segment when they exit (Python < 3.13)
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except (ImportError, AttributeError, KeyError):
+        pass
+    return shm
+
+
+class FrameBus:
+    """Double-buffered shared-memory frame slots plus a sequence number.
+
+    create=True allocates a segment for frames of up to max_shape (h, w, c);
+    otherwise the bus attaches to an existing segment by name.
+    """
+
+    def __init__(self, name, max_shape=(900, 1600, 3), create=False):
+        self.name = name
+        self.owner = create
+        if create:
+            slot_bytes = int(np.prod(max_shape))
+            size = _HEADER_BYTES + 2 * slot_bytes
+            try:
+                self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            except FileExistsError:  # left behind by a crashed run
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                self._shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self._shm = _attach(name)
+            slot_bytes = (self._shm.size - _HEADER_BYTES) // 2
+        self.slot_bytes = slot_bytes
+        self._header = np.ndarray((_HEADER_BYTES // 8,), np.int64, buffer=self._shm.buf)
+        if create:
+            self._header[:] = 0
+            self._header[_PINNED] = -1
+        self._slots = [np.ndarray((slot_bytes,), np.uint8, buffer=self._shm.buf,
+                                  offset=_HEADER_BYTES + i * slot_bytes) for i in range(2)]
+
+    def _meta(self, slot):
+        start = _SLOT_META + slot * _META_LEN
+        return self._header[start:start + _META_LEN]
+
+    # ---- writer side ----
+    def publish(self, frame, ts=None):
+        """Copy frame into the free slot and make it current.
+
+        Returns the new sequence number, or None if the only free slot was
+        pinned by the reader (the frame is dropped).
+        """
+        frame = np.ascontiguousarray(frame)
+        if frame.nbytes > self.slot_bytes:
+            raise ValueError(f"frame {frame.shape} does not fit the bus ({self.slot_bytes} bytes)")
+        target = 1 - int(self._header[_ACTIVE])
+        if self._header[_PINNED] == target:
+            self._header[_DROPPED] += 1
+            return None
+        self._slots[target][:frame.nbytes] = frame.reshape(-1)
+        seq = int(self._header[_SEQ]) + 1
+        h, w = frame.shape[:2]
+        c = frame.shape[2] if frame.ndim == 3 else 1
+        self._meta(target)[:] = (seq, int((ts or time.time()) * 1e6), h, w, c)
+        self._header[_ACTIVE] = target
+        self._header[_SEQ] = seq
+        return seq
+
+    def stop_requested(self):
+        return bool(self._header[_STOP])
+
+    def paused(self):
+        return bool(self._header[_PAUSED])
+
+    # ---- reader side ----
+    def latest_seq(self):
+        return int(self._header[_SEQ])
+
+    def dropped(self):
+        return int(self._header[_DROPPED])
+
+    def _view(self, slot):
+        seq, ts_us, h, w, c = (int(v) for v in self._meta(slot))
+        shape = (h, w, c) if c > 1 else (h, w)
+        return seq, ts_us / 1e6, self._slots[slot][:h * w * c].reshape(shape)
+
+    @contextmanager
+    def frame(self, newer_than=None, after_seq=0, timeout=10.0, poll=0.01):
+        """Pin the current frame and yield (seq, view); (None, None) on timeout.
+
+        Waits for a frame captured after the newer_than timestamp and with a
+        sequence number above after_seq. The view is only valid inside the
+        with-block; copy it to keep it.
+        """
+        deadline = time.time() + timeout
+        pinned = None
+        try:
+            while True:
+                slot = int(self._header[_ACTIVE])
+                self._header[_PINNED] = slot
+                # The writer may have flipped between reading ACTIVE and pinning
+                if int(self._header[_ACTIVE]) == slot and self._header[_SEQ] > 0:
+                    seq, ts, img = self._view(slot)
+                    if seq > after_seq and (newer_than is None or ts >= newer_than):
+                        pinned = slot
+                        break
+                self._header[_PINNED] = -1
+                if time.time() >= deadline:
+                    break
+                time.sleep(poll)
+            if pinned is None:
+                yield None, None
+            else:
+                yield seq, img
+        finally:
+            self._header[_PINNED] = -1
+
+    def pause(self):
+        """Stop the capture process from capturing until resume()."""
+        self._header[_PAUSED] = 1
+
+    def resume(self):
+        self._header[_PAUSED] = 0
+
+    # ---- lifecycle ----
+    def request_stop(self):
+        self._header[_STOP] = 1
+
+    def close(self):
+        self._header = None
+        self._slots = []
+        self._shm.close()
+        if self.owner:
+            try:
+                self._shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def capture_loop(name, serial, interval=FRAME_BUS_INTERVAL, scale=1.0, parent=None):
+    """Body of the capture process: capture_frame() -> bus every interval
+    seconds while not paused, until asked to stop (or the parent process is gone).
+
+    A failing capture (device gone, adb error, frame too big for the bus)
+    is logged and retried after at least a second; it never ends the loop.
+    """
+    from utils import adb_helper
+    bus = FrameBus(name)
+    device = None
+    try:
+        while not bus.stop_requested() and (parent is None or os.getppid() == parent):
+            if bus.paused():
+                time.sleep(0.1)
+                continue
+            t0 = time.time()
+            wait = interval
+            try:
+                if device is None:
+                    device = adb_helper.get_device(serial)
+                img = adb_helper.capture_frame(scale=scale, device=device)
+                if img is not None:
+                    bus.publish(img, ts=t0)  # stamped with the capture start
+            except Exception as e:
+                print(f"[-] Frame bus capture from {serial} failed: {type(e).__name__}: {e}")
+                wait = max(interval, 1.0)
+            time.sleep(max(0.0, wait - (time.time() - t0)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        bus.close()
+
+
+def frame_shape(serial, scale=1.0):
+    """(h, w, 3) of the BGR frames capture_frame(scale=scale) returns for serial."""
+    from utils import adb_helper
+    w, h, _, _ = adb_helper.get_device(serial)._fb_geometry()
+    step = max(1, int(round(1 / scale)))  # as adb_helper.decimate()
+    return -(-h // step), -(-w // step), 3
+
+
+def start_capture_process(serial, interval=None, scale=1.0, max_shape=None, name=None):
+    """Create a bus and a capture process (`python -m utils.frame_bus`) filling it from serial.
+
+    A separate interpreter rather than multiprocessing, so the calling
+    script is not re-imported in the child. The slots are sized from the
+    device's screen (probed once) unless max_shape is given; a rotated
+    screen needs the same bytes. Returns (bus, process); call
+    stop_capture_process() when done.
+    """
+    interval = FRAME_BUS_INTERVAL if interval is None else interval
+    max_shape = max_shape or frame_shape(serial, scale)
+    name = name or f"frame_bus_{serial}".replace(":", "_").replace(".", "_")
+    bus = FrameBus(name, max_shape=max_shape, create=True)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, ANDROID_SERIAL=serial,
+               PYTHONPATH=os.pathsep.join(filter(None, (root, os.getenv("PYTHONPATH")))))
+    proc = subprocess.Popen([sys.executable, "-m", "utils.frame_bus", "--name", name,
+                             "--serial", serial, "--interval", str(interval), "--scale", str(scale),
+                             "--parent", str(os.getpid())], env=env)
+    print(f"[bus] Capture process {proc.pid} feeding shared memory '{name}'")
+    return bus, proc
+
+
+def stop_capture_process(bus, proc, timeout=5):
+    bus.request_stop()
+    try:
+        proc.wait(timeout)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+    bus.close()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Capture frames from a device into a FrameBus")
+    ap.add_argument("--name", required=True, help="shared memory segment created by the consumer")
+    ap.add_argument("--serial", required=True)
+    ap.add_argument("--interval", type=float, default=FRAME_BUS_INTERVAL, help="minimum seconds between captures")
+    ap.add_argument("--scale", type=float, default=1.0)
+    ap.add_argument("--parent", type=int, help="exit when this process is gone")
+    args = ap.parse_args()
+    capture_loop(args.name, args.serial, args.interval, args.scale, args.parent)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+# utils/frame_stream.py
+import collections
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+import cv2
+
+from utils import adb_helper
+
+
+class FrameStream:
+    """Background capture thread for one device.
+
+    Keeps a single `adb exec-out` pipe open that runs `screencap` in a loop
+    and pushes every raw frame into a small timestamped ring buffer. Readers
+    pick frames out at their own pace with latest_frame() or
+    wait_for_new_frame(); the pipe is respawned if it dies, or killed and
+    respawned if no frame arrives for STALL_TIMEOUT seconds (wedged device).
+    """
+    STALL_TIMEOUT = 15
+    IDLE_WHEN_STATIC = False  # True if no frames arrive while the screen does not change
+
+    def __init__(self, serial, capacity=3):
+        self.serial = serial
+        self._frames = collections.deque(maxlen=capacity)  # (seq, ts, raw frame)
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._frame_size = None  # header + pixel bytes of one screencap
+        self._proc = None
+        self._thread = None
+        self._running = threading.Event()
+        self._progress = 0.0  # time of the last frame or pipe spawn
+        self.stalls = 0
+
+    # ---- lifecycle ----
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._running.set()
+        self._thread = threading.Thread(target=self._run, name=f"FrameStream-{self.serial}",
+                                        daemon=True)
+        self._thread.start()
+        if self.STALL_TIMEOUT:
+            threading.Thread(target=self._watchdog, name=f"FrameStreamWatchdog-{self.serial}",
+                             daemon=True).start()
+        print(f"[stream] Frame stream started for {self.serial}")
+
+    def stop(self):
+        self._running.clear()
+        self._kill()
+        if self._thread:
+            self._thread.join(timeout=2)
+        with self._cond:
+            self._cond.notify_all()
+
+    def running(self):
+        return self._running.is_set()
+
+    # ---- consumers ----
+    def _convert(self, frame, fmt):
+        return frame if fmt == "raw" else adb_helper.to_bgr(frame)
+
+    def latest_frame(self, max_age_ms=None, fmt="bgr"):
+        """Newest buffered frame, or None if empty or older than max_age_ms."""
+        with self._cond:
+            if not self._frames:
+                return None
+            _, ts, frame = self._frames[-1]
+        if max_age_ms is not None and (time.time() - ts) * 1000 > max_age_ms:
+            return None
+        return self._convert(frame, fmt)
+
+    def wait_for_new_frame(self, timeout=None, fmt="bgr"):
+        """Block until a frame newer than the current newest arrives."""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            seen = self._seq
+            while self._seq == seen and self._running.is_set():
+                remain = None if deadline is None else deadline - time.time()
+                if remain is not None and remain <= 0:
+                    return None
+                self._cond.wait(remain)
+            if self._seq == seen:
+                return None
+            frame = self._frames[-1][2]
+        return self._convert(frame, fmt)
+
+    def frame_count(self):
+        """Number of frames produced since start."""
+        return self._seq
+
+    # ---- producer ----
+    def _publish(self, frame):
+        self._progress = time.time()
+        with self._cond:
+            self._seq += 1
+            self._frames.append((self._seq, time.time(), frame))
+            self._cond.notify_all()
+
+    def _kill(self):
+        proc, self._proc = self._proc, None
+        if proc and proc.poll() is None:
+            proc.kill()
+            proc.wait()
+
+    def _watchdog(self):
+        while self._running.is_set():
+            time.sleep(1)
+            proc = self._proc
+            if proc and proc.poll() is None and time.time() - self._progress > self.STALL_TIMEOUT:
+                print(f"[-] Frame stream {self.serial} stalled for {self.STALL_TIMEOUT}s; killing pipe")
+                self.stalls += 1
+                self._kill()
+
+    def _run(self):
+        while self._running.is_set():
+            self._progress = time.time()
+            try:
+                self._produce()
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired, ValueError, OSError) as e:
+                print(f"[-] Frame stream {self.serial} error: {e}")
+                self._reset()
+            self._kill()
+            if self._running.is_set():
+                print(f"[-] Frame stream {self.serial} pipe closed; respawning...")
+                time.sleep(0.5)
+
+    def _reset(self):
+        self._frame_size = None  # re-probe (e.g. resolution changed)
+
+    def _probe_frame_size(self):
+        p = subprocess.run([adb_helper.ADB_PATH, "-s", self.serial, "exec-out", "screencap"],
+                           capture_output=True, check=True, timeout=adb_helper.TIMEOUTS["capture"])
+        adb_helper.parse_raw_frame(p.stdout)  # validates header / size
+        return len(p.stdout)
+
+    def _produce(self):
+        if self._frame_size is None:
+            self._frame_size = self._probe_frame_size()
+        self._proc = subprocess.Popen(
+            [adb_helper.ADB_PATH, "-s", self.serial, "exec-out",
+             "while true; do screencap; done"],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        read = self._proc.stdout.read
+        while self._running.is_set():
+            buf = read(self._frame_size)
+            if len(buf) < self._frame_size:
+                return
+            self._publish(adb_helper.parse_raw_frame(buf))
+
+
+class ScreenrecordStream(FrameStream):
+    """Frame stream decoded from `screenrecord --output-format=h264`.
+
+    The H.264 elementary stream from `adb exec-out screenrecord` is copied
+    into a FIFO that OpenCV's FFmpeg backend decodes, giving 20-30 fps
+    instead of one screencap round trip per frame. Pass `source` (a recorded
+    .h264 file) to decode that instead of a device, e.g. for benchmarks.
+    Frames are decoded BGR; fmt="raw" converts them to RGBA like a screencap.
+    """
+    TIME_LIMIT = 180  # screenrecord's own maximum; the pipe is respawned after
+    STALL_TIMEOUT = None  # screenrecord sends nothing while the screen is static
+    IDLE_WHEN_STATIC = True
+
+    def __init__(self, serial=None, capacity=3, source=None, size=None, bit_rate=None,
+                 loop=False):
+        super().__init__(serial or source, capacity=capacity)
+        self.source = source
+        self.size = size  # (w, h) passed to --size to downscale on the device
+        self.bit_rate = bit_rate
+        self.loop = loop
+        self._fifo_dir = None
+        self._pipe_seq = 0  # last frame number before the current pipe was spawned
+
+    def _convert(self, frame, fmt):
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGBA) if fmt == "raw" else frame
+
+    def _reset(self):
+        pass
+
+    def current_frame(self, fmt="bgr"):
+        """Newest frame decoded from the live screenrecord pipe, or None.
+
+        screenrecord only sends a frame when the screen changes, so while the
+        pipe is still connected its newest frame is the current screen however
+        old it is. None if the pipe is down or has not delivered a frame yet.
+        """
+        proc = self._proc
+        if proc is None or proc.poll() is not None:
+            return None
+        with self._cond:
+            if not self._frames or self._frames[-1][0] <= self._pipe_seq:
+                return None
+            frame = self._frames[-1][2]
+        return self._convert(frame, fmt)
+
+    def _screenrecord_cmd(self):
+        cmd = [adb_helper.ADB_PATH, "-s", self.serial, "exec-out", "screenrecord",
+               "--output-format=h264", "--time-limit", str(self.TIME_LIMIT)]
+        if self.size:
+            cmd += ["--size", f"{self.size[0]}x{self.size[1]}"]
+        if self.bit_rate:
+            cmd += ["--bit-rate", str(int(self.bit_rate))]
+        return cmd + ["-"]
+
+    def _open_device_fifo(self):
+        if self._fifo_dir is None:
+            self._fifo_dir = tempfile.mkdtemp(prefix="screenrecord_")
+        fifo = os.path.join(self._fifo_dir, "stream.h264")
+        if not os.path.exists(fifo):
+            os.mkfifo(fifo)
+        self._pipe_seq = self._seq
+        self._proc = subprocess.Popen(self._screenrecord_cmd(), stdout=subprocess.PIPE,
+                                      stderr=subprocess.DEVNULL)
+        src = self._proc.stdout
+
+        def feed():
+            # Opening the FIFO blocks until the decoder opens the other end
+            try:
+                with open(fifo, "wb") as out:
+                    shutil.copyfileobj(src, out, 64 * 1024)
+            except OSError:
+                pass
+
+        threading.Thread(target=feed, name=f"ScreenrecordFeed-{self.serial}",
+                         daemon=True).start()
+        return fifo
+
+    def _produce(self):
+        path = self.source or self._open_device_fifo()
+        cap = cv2.VideoCapture(path, cv2.CAP_FFMPEG)
+        if not cap.isOpened():
+            raise OSError(f"could not open H.264 stream {path}")
+        try:
+            while self._running.is_set():
+                ok, frame = cap.read()
+                if not ok:
+                    break
+                self._publish(frame)
+        finally:
+            cap.release()
+        if self.source and not self.loop:
+            self._running.clear()  # recorded file finished
+
+    def stop(self):
+        super().stop()
+        if self._fifo_dir:
+            shutil.rmtree(self._fifo_dir, ignore_errors=True)
+            self._fifo_dir = None
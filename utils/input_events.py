@@ -0,0 +1,271 @@
+# utils/input_events.py
+"""Raw touchscreen injection through /dev/input/eventN.
+
+`input tap` starts an app_process JVM on the device for every call (200-500
+ms). Writing struct input_event records straight to the touchscreen's evdev
+node skips that entirely. discover() finds the touch node, its axis ranges,
+the display size/rotation and the event record size once per session;
+EventInjector then builds shell command lines that write prebuilt event
+blobs with printf.
+"""
+import re
+import struct
+
+# linux/input-event-codes.h
+EV_SYN, EV_KEY, EV_ABS = 0x00, 0x01, 0x03
+SYN_REPORT = 0x00
+BTN_TOUCH = 0x14A
+ABS_X, ABS_Y, ABS_PRESSURE = 0x00, 0x01, 0x18
+ABS_MT_SLOT = 0x2F
+ABS_MT_TOUCH_MAJOR = 0x30
+ABS_MT_POSITION_X = 0x35
+ABS_MT_POSITION_Y = 0x36
+ABS_MT_TRACKING_ID = 0x39
+ABS_MT_PRESSURE = 0x3A
+
+# kernel evdev silently drops a trailing partial record, so every printf
+# has to stay within one stdio buffer
+_MAX_WRITE = 4096
+
+
+class TouchDevice:
+    """What discover() learned about the device's touchscreen."""
+
+    def __init__(self, path, name, axes, keys, display_size, rotation=0, event_size=24):
+        self.path = path
+        self.name = name
+        self.axes = axes  # {"ABS_MT_POSITION_X": (min, max), ...}
+        self.keys = keys  # set of key names, e.g. {"BTN_TOUCH"}
+        self.display_size = display_size  # natural (portrait/landscape) size from `wm size`
+        self.rotation = rotation  # 0-3, from `dumpsys input` SurfaceOrientation
+        self.event_size = event_size  # 24 on 64-bit kernels, 16 on 32-bit
+
+    @property
+    def multitouch(self):
+        return "ABS_MT_POSITION_X" in self.axes
+
+    @property
+    def slots(self):
+        lo, hi = self.axes.get("ABS_MT_SLOT", (0, 0))
+        return hi - lo + 1
+
+    @property
+    def max_pointers(self):
+        """How many fingers can be down at once."""
+        return self.slots if self.multitouch and "ABS_MT_SLOT" in self.axes else 1
+
+    def __repr__(self):
+        return (f"TouchDevice({self.path}, {self.name!r}, mt={self.multitouch}, "
+                f"slots={self.slots}, display={self.display_size}, rot={self.rotation})")
+
+
+def _parse_getevent(text):
+    """Split `getevent -pl` output into per-device dicts."""
+    devices = []
+    cur = None
+    for line in text.splitlines():
+        m = re.match(r"add device \d+: (\S+)", line)
+        if m:
+            cur = {"path": m.group(1), "name": "", "axes": {}, "keys": set(), "direct": False}
+            devices.append(cur)
+            continue
+        if cur is None:
+            continue
+        m = re.search(r'name:\s+"(.*)"', line)
+        if m:
+            cur["name"] = m.group(1)
+        m = re.search(r"\b(ABS_[A-Z_]+)\s*:.*?min (-?\d+), max (-?\d+)", line)
+        if m:
+            cur["axes"][m.group(1)] = (int(m.group(2)), int(m.group(3)))
+        cur["keys"].update(re.findall(r"\bBTN_TOUCH\b", line))
+        if "INPUT_PROP_DIRECT" in line:
+            cur["direct"] = True
+    return devices
+
+
+def discover(run_shell):
+    """Find the touchscreen; run_shell(cmd) -> output runs a device shell command.
+
+    Returns a TouchDevice, or None if there is no usable (writable) one.
+    """
+    candidates = []
+    for dev in _parse_getevent(run_shell("getevent -pl")):
+        axes = dev["axes"]
+        if "ABS_MT_POSITION_X" in axes and "ABS_MT_POSITION_Y" in axes:
+            score = 2
+        elif "ABS_X" in axes and "ABS_Y" in axes and dev["keys"]:
+            score = 1
+        else:
+            continue
+        candidates.append((score + dev["direct"], dev))
+    if not candidates:
+        return None
+    dev = max(candidates, key=lambda c: c[0])[1]
+
+    if run_shell(f"test -w {dev['path']}; echo $?").strip() != "0":
+        print(f"[-] {dev['path']} is not writable from adb shell; raw input unavailable")
+        return None
+
+    size = re.findall(r"(\d+)x(\d+)", run_shell("wm size"))
+    if not size:
+        return None
+    display = tuple(int(v) for v in size[0])  # Physical size comes first
+    rot = re.search(r"SurfaceOrientation:\s*(\d)", run_shell("dumpsys input | grep SurfaceOrientation"))
+    abi = run_shell("getprop ro.product.cpu.abi")
+    return TouchDevice(dev["path"], dev["name"], dev["axes"], dev["keys"], display,
+                       rotation=int(rot.group(1)) if rot else 0,
+                       event_size=24 if "64" in abi else 16)
+
+
+class EventInjector:
+    """Builds shell command lines that inject touches into one TouchDevice."""
+
+    def __init__(self, touch):
+        self.touch = touch
+        self._tracking_id = 0
+        mt = touch.multitouch
+        self._ax = touch.axes["ABS_MT_POSITION_X" if mt else "ABS_X"]
+        self._ay = touch.axes["ABS_MT_POSITION_Y" if mt else "ABS_Y"]
+
+    # ---- coordinates ----
+    def to_raw(self, x, y):
+        """Map display coordinates (as used by `input tap`) to axis values."""
+        w, h = self.touch.display_size
+        rot = self.touch.rotation
+        if rot == 1:
+            x, y = w - y, x
+        elif rot == 2:
+            x, y = w - x, h - y
+        elif rot == 3:
+            x, y = y, h - x
+        (x0, x1), (y0, y1) = self._ax, self._ay
+        rx = x0 + int(round(min(max(x, 0), w - 1) * (x1 - x0) / max(w - 1, 1)))
+        ry = y0 + int(round(min(max(y, 0), h - 1) * (y1 - y0) / max(h - 1, 1)))
+        return rx, ry
+
+    # ---- event records ----
+    def contact_events(self, slot, x, y):
+        """Events that put finger `slot` down at / move it to (x, y)."""
+        rx, ry = self.to_raw(x, y)
+        if not self.touch.multitouch:
+            return [(EV_ABS, ABS_X, rx), (EV_ABS, ABS_Y, ry), (EV_ABS, ABS_PRESSURE, 1)]
+        ev = []
+        if "ABS_MT_SLOT" in self.touch.axes:
+            ev.append((EV_ABS, ABS_MT_SLOT, slot))
+        return ev + [(EV_ABS, ABS_MT_POSITION_X, rx), (EV_ABS, ABS_MT_POSITION_Y, ry)]
+
+    def down_events(self, slot, x, y):
+        ev = []
+        if self.touch.multitouch:
+            self._tracking_id = (self._tracking_id + 1) % 0xFFFF
+            if "ABS_MT_SLOT" in self.touch.axes:
+                ev.append((EV_ABS, ABS_MT_SLOT, slot))
+            ev.append((EV_ABS, ABS_MT_TRACKING_ID, self._tracking_id))
+        ev += self.contact_events(slot, x, y)
+        if "ABS_MT_PRESSURE" in self.touch.axes:
+            ev.append((EV_ABS, ABS_MT_PRESSURE, max(1, self.touch.axes["ABS_MT_PRESSURE"][1] // 2)))
+        if "ABS_MT_TOUCH_MAJOR" in self.touch.axes:
+            ev.append((EV_ABS, ABS_MT_TOUCH_MAJOR, max(1, self.touch.axes["ABS_MT_TOUCH_MAJOR"][1] // 8)))
+        return ev
+
+    def up_events(self, slot):
+        if not self.touch.multitouch:
+            return [(EV_ABS, ABS_PRESSURE, 0)]
+        ev = []
+        if "ABS_MT_SLOT" in self.touch.axes:
+            ev.append((EV_ABS, ABS_MT_SLOT, slot))
+        return ev + [(EV_ABS, ABS_MT_TRACKING_ID, -1)]
+
+    def report(self, events, touching):
+        """Close a frame: BTN_TOUCH state (if the device has it) and SYN_REPORT."""
+        if "BTN_TOUCH" in self.touch.keys:
+            events = events + [(EV_KEY, BTN_TOUCH, 1 if touching else 0)]
+        return events + [(EV_SYN, SYN_REPORT, 0)]
+
+    def encode(self, events):
+        """Pack events as struct input_event records (timestamps zeroed)."""
+        fmt = "<qqHHi" if self.touch.event_size == 24 else "<iiHHi"
+        return b"".join(struct.pack(fmt, 0, 0, t, c, v) for t, c, v in events)
+
+    def write_cmd(self, events):
+        """Shell command line that writes events to the touch node."""
+        blob = self.encode(events)
+        step = (_MAX_WRITE // self.touch.event_size) * self.touch.event_size
+        parts = []
+        for i in range(0, len(blob), step):
+            octal = "".join(f"\\{b:03o}" for b in blob[i:i + step])
+            parts.append(f"printf '{octal}' > {self.touch.path}")
+        return "; ".join(parts)
+
+    # ---- gestures used by adb_helper ----
+    def tap_cmd(self, x, y):
+        return self.write_cmd(self.report(self.down_events(0, x, y), True)
+                              + self.report(self.up_events(0), False))
+
+    def hold_cmd(self, x, y, duration_ms):
+        down = self.write_cmd(self.report(self.down_events(0, x, y), True))
+        up = self.write_cmd(self.report(self.up_events(0), False))
+        return f"{down}; sleep {duration_ms / 1000:.3f}; {up}"
+
+    def gesture_cmd(self, paths, duration_ms=300, frame_ms=16):
+        """All fingers down together, move along their paths, lift together.
+
+        paths is one list of (x, y) waypoints per finger; a single-point path
+        is a stationary finger, so [[p1], [p2], ...] is a multi-finger tap.
+        """
+        if len(paths) > self.touch.max_pointers:
+            raise ValueError(f"{len(paths)} pointers but {self.touch.path} supports "
+                             f"{self.touch.max_pointers}")
+        moving = any(len(p) > 1 for p in paths)
+        frames = max(1, int(duration_ms // frame_ms)) if moving else 0
+        pause = f"sleep {(duration_ms / max(frames, 1)) / 1000:.3f}"
+
+        down = []
+        for slot, path in enumerate(paths):
+            down += self.down_events(slot, *path[0])
+        parts = [self.write_cmd(self.report(down, True))]
+        for f in range(1, frames + 1):
+            moves = []
+            for slot, path in enumerate(paths):
+                if len(path) > 1:
+                    moves += self.contact_events(slot, *_along(path, f / frames))
+            parts += [pause, self.write_cmd(self.report(moves, True))]
+        if not frames:
+            parts.append(f"sleep {duration_ms / 1000:.3f}")
+        up = []
+        for slot in range(len(paths)):
+            up += self.up_events(slot)
+        parts.append(self.write_cmd(self.report(up, False)))
+        return "; ".join(parts)
+
+
+def _along(path, t):
+    """Point at fraction t (0..1) of a polyline, segments equally timed."""
+    segs = len(path) - 1
+    pos = min(max(t, 0.0), 1.0) * segs
+    i = min(int(pos), segs - 1)
+    (x0, y0), (x1, y1) = path[i], path[i + 1]
+    f = pos - i
+    return int(round(x0 + (x1 - x0) * f)), int(round(y0 + (y1 - y0) * f))
+
+
+def input_gesture_cmd(paths, duration_ms=300):
+    """Fallback for gestures through the `input` command, one finger after another.
+
+    `input` only drives a single pointer: stationary fingers become taps (or
+    a hold), two-point paths a swipe and longer paths `input motionevent`
+    DOWN/MOVE/UP (Android 11+).
+    """
+    cmds = []
+    for path in paths:
+        (x, y), last = path[0], path[-1]
+        if len(path) == 1:
+            cmds.append(f"input tap {x} {y}" if duration_ms <= 100
+                        else f"input swipe {x} {y} {x} {y} {int(duration_ms)}")
+        elif len(path) == 2:
+            cmds.append(f"input swipe {x} {y} {last[0]} {last[1]} {int(duration_ms)}")
+        else:
+            cmds.append(f"input motionevent DOWN {x} {y}")
+            cmds += [f"input motionevent MOVE {px} {py}" for px, py in path[1:]]
+            cmds.append(f"input motionevent UP {last[0]} {last[1]}")
+    return "; ".join(cmds)
@@ -0,0 +1,246 @@
+# utils/loot_ocr.py
+"""Loot panel OCR shared by main.py, main2.py and main_cont.py.
+
+The Gold/Elixir/Dark numbers always sit in the same boxes, so there is no
+need for easyocr's text detector: LootReader hands the three boxes straight
+to the recognizer in one Reader.recognize() call (one batch on GPU) with a
+digit allowlist, instead of three full readtext() passes.
+
+    loot_reader = LootReader(reader)
+    gold, elixir, dark = loot_reader.read(image)
+
+make_loot_reader() picks the engine from LOOT_OCR_ENGINE: "cascade" (the
+default: template matching first, easyocr only for the fields it is unsure
+of), "template" (utils.digit_ocr.TemplateReader alone) or "easyocr"
+(LootReader alone). The template engines need the bank at LOOT_TEMPLATES;
+without it every engine falls back to easyocr.
+
+read_loot() reads only the fields the bots' attack rule (loot_sufficient)
+still depends on, all of them in one read_fields() call: with a dark
+minimum of 0, gold and elixir decide every base and dark is never read.
+Fields it skipped are None ("?" in logs); LOOT_LAZY=0 reads all three.
+"""
+import os
+import re
+
+from utils.metrics import Counters, LatencyStats
+
+# Screen boxes of the loot rows (x1, y1, x2, y2), 1600x900 coordinates
+LOOT_BOXES = {
+    "gold": (65, 113, 205, 142),
+    "elixir": (65, 158, 205, 185),
+    "dark": (65, 198, 180, 228),
+}
+FIELDS = ("gold", "elixir", "dark")
+DIGITS = "0123456789"
+
+LOOT_OCR_ENGINE = os.getenv("LOOT_OCR_ENGINE", "cascade")
+LOOT_TEMPLATES = os.getenv("LOOT_TEMPLATES", "digit_templates.npz")  # python -m utils.digit_ocr harvest
+# Template fields whose weakest glyph correlates less than this go to easyocr
+LOOT_MIN_CONFIDENCE = float(os.getenv("LOOT_MIN_CONFIDENCE", "0.8"))
+LOOT_LAZY = os.getenv("LOOT_LAZY", "1") != "0"
+# Fields read / skipped by read_loot(), reported as "loot_fields" in adb_helper.get_metrics()
+FIELD_COUNTS = Counters()
+_PLENTY = 10 ** 12  # more loot than any base holds, for probing the rule
+
+
+def parse_digits(text):
+    """Loot value from OCR text ("1 234 567" -> 1234567); 0 if it has no digits."""
+    digits = re.sub(r"[^\d]", "", text)
+    return int(digits) if digits else 0
+
+
+def crop_fields(image, origin=(0, 0), fields=FIELDS):
+    """{field: crop} of image, whose top-left corner sits at origin on screen."""
+    ox, oy = origin
+    return {f: image[y1 - oy:y2 - oy, x1 - ox:x2 - ox]
+            for f in fields for x1, y1, x2, y2 in [LOOT_BOXES[f]]}
+
+
+def at_least(value, threshold):
+    """value >= threshold; None if value is unknown (None) and the threshold matters."""
+    if threshold <= 0:
+        return True  # loot is never negative
+    return None if value is None else value >= threshold
+
+
+def all_of(*checks):
+    """Three-valued and: False if any check is False, None if any is unknown."""
+    return False if False in checks else None if None in checks else True
+
+
+def any_of(*checks):
+    """Three-valued or: True if any check is True, None if any is unknown."""
+    return True if True in checks else None if None in checks else False
+
+
+def loot_sufficient(gold, elixir, dark, minimums, single_min=1_200_000):
+    """The bots' attack rule: gold, elixir and dark all at their minimums
+    (gold, elixir, dark), or gold or elixir alone at single_min.
+
+    True/False, or None while the answer depends on a field that is still
+    unknown (None).
+    """
+    gold_min, elixir_min, dark_min = minimums
+    return any_of(all_of(at_least(gold, gold_min), at_least(elixir, elixir_min),
+                         at_least(dark, dark_min)),
+                  at_least(gold, single_min), at_least(elixir, single_min))
+
+
+def read_lazily(reader, image, decide, origin=(0, 0)):
+    """Read only the fields decide(values) needs; returns (values, decision).
+
+    values is {field: value, None until read}; decide returns True/False
+    once the outcome is known and must never get worse with more loot. An
+    unread field is needed if the decision differs between it being 0 and
+    being huge; each round reads all needed fields in one read_fields()
+    call, so the recognizer still batches them.
+    """
+    values = dict.fromkeys(FIELDS)
+    decision = decide(values)
+    while decision is None:
+        unread = [f for f in FIELDS if values[f] is None]
+        if not unread:
+            break
+        needed = [f for f in unread
+                  if decide(dict(values, **{f: 0})) != decide(dict(values, **{f: _PLENTY}))]
+        got = reader.read_fields(image, origin, needed or unread)
+        values.update({f: got[f][0] for f in needed or unread})
+        decision = decide(values)
+    return values, decision
+
+
+def read_loot(reader, image, minimums, origin=(0, 0)):
+    """(gold, elixir, dark) for the attack rule with these minimums; with
+    LOOT_LAZY fields the rule did not need are None."""
+    if LOOT_LAZY:
+        values, _ = read_lazily(reader, image, lambda v: loot_sufficient(**v, minimums=minimums), origin)
+        loot = tuple(values[f] for f in FIELDS)
+    else:
+        loot = reader.read(image, origin)
+    skipped = loot.count(None)
+    FIELD_COUNTS.add("read", len(FIELDS) - skipped)
+    FIELD_COUNTS.add("skipped", skipped)
+    return loot
+
+
+def zero_loot(loot):
+    """True for a (gold, elixir, dark) result whose fields that were read are
+    all 0, i.e. no loot panel on screen."""
+    return isinstance(loot, tuple) and not any(loot)
+
+
+def show_loot(value):
+    """Loot value for logs; "?" for a field that was not read."""
+    return "?" if value is None else value
+
+
+class LootReader:
+    """Reads the loot rows with the recognizer of an easyocr.Reader only."""
+
+    def __init__(self, reader, batch_size=3):
+        self.reader = reader
+        self.batch_size = batch_size
+
+    def read_fields(self, image, origin=(0, 0), fields=FIELDS):
+        """{field: (value, confidence)} for the requested fields.
+
+        image is a BGR frame (or the part of one starting at origin).
+        A field the recognizer returns nothing for reads as (0, 0.0).
+        """
+        if not hasattr(self.reader, "recognize"):  # not an easyocr.Reader; read crop by crop
+            return {f: (parse_digits("".join(self.reader.readtext(crop, detail=0))), 0.0)
+                    for f, crop in crop_fields(image, origin, fields).items()}
+        ox, oy = origin
+        boxes = [[x1 - ox, x2 - ox, y1 - oy, y2 - oy]
+                 for f in fields for x1, y1, x2, y2 in [LOOT_BOXES[f]]]
+        results = self.reader.recognize(image, horizontal_list=boxes, free_list=[],
+                                        allowlist=DIGITS, batch_size=self.batch_size, detail=1)
+        out = {f: (0, 0.0) for f in fields}
+        for corners, text, conf in results:
+            # Results come back sorted by position; match them to boxes by their top edge
+            top = corners[0][1]
+            field = min(fields, key=lambda f: abs(LOOT_BOXES[f][1] - oy - top))
+            out[field] = (parse_digits(text), float(conf))
+        return out
+
+    def read(self, image, origin=(0, 0)):
+        """(gold, elixir, dark), like the per-field readtext() loop it replaces."""
+        values = self.read_fields(image, origin)
+        return tuple(values[f][0] for f in FIELDS)
+
+
+class CascadeReader:
+    """Fast reader first; only fields it is unsure of are re-read by the slow one.
+
+    A field escalates when its confidence is below min_confidence; a fast
+    reader reports 0.0 for a field with no digits (TemplateReader does), so
+    those escalate while a confidently read 0 (an empty dark field) stays
+    decided. Per stage it counts the fields answered and
+    times the calls (stats(), also part of adb_helper.get_metrics()). Calls
+    on the same image (read_lazily() rounds) count as one panel.
+    """
+
+    def __init__(self, fast, slow, min_confidence=LOOT_MIN_CONFIDENCE):
+        self.fast = fast
+        self.slow = slow
+        self.min_confidence = min_confidence
+        self.latency = LatencyStats()
+        self.counters = Counters()
+        self._image = None  # panel of the last call
+        self._escalated = False  # whether any field of that panel went to the slow reader
+
+    def read_fields(self, image, origin=(0, 0), fields=FIELDS):
+        with self.latency.time("fast"):
+            out = self.fast.read_fields(image, origin, fields)
+        unsure = [f for f in fields if out[f][1] < self.min_confidence]
+        if image is not self._image:
+            self._image, self._escalated = image, False
+            self.counters.add("panels")
+        self.counters.add("fast_fields", len(fields) - len(unsure))
+        if not unsure:
+            return out
+        with self.latency.time("slow"):
+            out.update(self.slow.read_fields(image, origin, unsure))
+        self.counters.add("slow_fields", len(unsure))
+        if not self._escalated:
+            self._escalated = True
+            self.counters.add("escalated_panels")
+        return out
+
+    def read(self, image, origin=(0, 0)):
+        values = self.read_fields(image, origin)
+        return tuple(values[f][0] for f in FIELDS)
+
+    def stats(self):
+        """Fields answered per stage, share of panels decided by the fast path, latency."""
+        counts = self.counters.snapshot()
+        panels = counts.get("panels", 0)
+        if panels:
+            counts["fast_panels"] = panels - counts.get("escalated_panels", 0)
+            counts["fast_panel_rate"] = round(counts["fast_panels"] / panels, 3)
+        return {"counters": counts, "latency": self.latency.snapshot()}
+
+
+def make_loot_reader(reader, engine=None, templates=None):
+    """Loot reader for the configured engine; falls back to easyocr without templates."""
+    engine = engine or LOOT_OCR_ENGINE
+    templates = templates or LOOT_TEMPLATES
+    from utils import adb_helper
+    adb_helper.METRICS_SOURCES["loot_fields"] = FIELD_COUNTS.snapshot
+    if engine in ("cascade", "template"):
+        if os.path.exists(templates):
+            from utils.digit_ocr import TemplateReader
+            fast = TemplateReader(templates)
+            if engine == "template":
+                print(f"[+] Loot OCR: template matching ({templates})")
+                return fast
+            print(f"[+] Loot OCR: template matching ({templates}), easyocr below "
+                  f"{LOOT_MIN_CONFIDENCE} confidence")
+            cascade = CascadeReader(fast, LootReader(reader))
+            adb_helper.METRICS_SOURCES["loot_ocr"] = cascade.stats
+            return cascade
+        print(f"[-] No digit templates at {templates}; using easyocr for loot")
+    elif engine != "easyocr":
+        print(f"[-] Unknown LOOT_OCR_ENGINE={engine!r}; using easyocr for loot")
+    return LootReader(reader)
@@ -0,0 +1,96 @@
+# utils/macro.py
+"""Device-side macros: a whole tap sequence shipped and run as one script.
+
+Build a Macro from (action, coords, delay) steps, then hand it to
+adb_helper.run_macro(), which compiles it into a single shell script and
+runs it on the device with device-side sleeps. Random delays are drawn when
+the step is added, so the device sees fixed timings.
+"""
+import random
+
+from utils.input_events import input_gesture_cmd
+
+
+class Macro:
+    """Ordered list of (action, coords, delay) steps.
+
+    action is "tap" (coords = (x, y)), "hold" (coords = (x, y, duration_ms)) or
+    "gesture" (coords = (paths, duration_ms), see adb_helper.gesture); delay
+    is the pause in seconds after the action.
+    """
+
+    def __init__(self, name="macro"):
+        self.name = name
+        self.steps = []
+        self._lead = 0.0  # sleep requested before the first action
+
+    def tap(self, x, y, delay=0.0):
+        self.steps.append(("tap", (int(x), int(y)), float(delay)))
+        return self
+
+    def hold(self, x, y, duration_ms=2500, delay=0.0):
+        self.steps.append(("hold", (int(x), int(y), int(duration_ms)), float(delay)))
+        return self
+
+    def gesture(self, paths, duration_ms=300, delay=0.0):
+        paths = [[(int(x), int(y)) for x, y in path] for path in paths]
+        self.steps.append(("gesture", (paths, int(duration_ms)), float(delay)))
+        return self
+
+    def multi_tap(self, points, hold_ms=60, delay=0.0):
+        """Several fingers down at once (e.g. spells on all targets together)."""
+        return self.gesture([[p] for p in points], duration_ms=hold_ms, delay=delay)
+
+    def sleep(self, seconds):
+        """Extend the pause after the last step."""
+        if not self.steps:
+            self._lead += seconds
+            return self
+        action, coords, delay = self.steps[-1]
+        self.steps[-1] = (action, coords, delay + seconds)
+        return self
+
+    def human_delay(self, min_s=0.15, max_s=0.4):
+        return self.sleep(random.uniform(min_s, max_s))
+
+    def duration(self):
+        """Expected run time in seconds (sleeps and holds, not command cost)."""
+        total = self._lead
+        for action, coords, delay in self.steps:
+            total += delay
+            if action == "hold":
+                total += coords[2] / 1000
+            elif action == "gesture":
+                total += coords[1] / 1000
+        return total
+
+    def compile(self, injector=None):
+        """Shell script for the steps; uses raw evdev writes if injector is given."""
+        lines = []
+        if self._lead:
+            lines.append(f"sleep {self._lead:.3f}")
+        for action, coords, delay in self.steps:
+            if action == "tap":
+                x, y = coords
+                lines.append(injector.tap_cmd(x, y) if injector else f"input tap {x} {y}")
+            elif action == "hold":
+                x, y, ms = coords
+                lines.append(injector.hold_cmd(x, y, ms) if injector
+                             else f"input swipe {x} {y} {x} {y} {ms}")
+            elif action == "gesture":
+                paths, ms = coords
+                if injector and len(paths) <= injector.touch.max_pointers:
+                    lines.append(injector.gesture_cmd(paths, ms))
+                else:
+                    lines.append(input_gesture_cmd(paths, ms))
+            else:
+                raise ValueError(f"unknown macro action {action!r}")
+            if delay > 0:
+                lines.append(f"sleep {delay:.3f}")
+        return "\n".join(lines)
+
+    def __len__(self):
+        return len(self.steps)
+
+    def __repr__(self):
+        return f"Macro({self.name!r}, {len(self.steps)} steps, ~{self.duration():.1f}s)"
@@ -0,0 +1,190 @@
+# utils/metrics.py
+"""Latency histograms, counters and retry budgets for adb operations.
+
+adb_helper times every tap, capture, connect and shell call into a
+LatencyStats (one histogram per operation, globally and per device) so
+tail latency is visible, counts capture bytes and blank frames, and gives
+each device a RetryBudget so a wedged emulator fails fast instead of
+multiplying every stall by the retry count. MetricsDumper appends
+periodic snapshots to a JSONL file for offline comparison.
+"""
+import collections
+import json
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+
+# Histogram bucket upper bounds in ms; one more open-ended bucket follows
+BUCKETS_MS = (5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+
+class LatencyHistogram:
+    """Bucketed latencies of one operation plus a window of recent samples.
+
+    The buckets cover the whole run; percentiles come from the last
+    `window` samples so they follow the current behaviour of the device.
+    """
+
+    def __init__(self, window=2048):
+        self.buckets = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.max_ms = 0.0
+        self._recent = collections.deque(maxlen=window)
+
+    def add(self, ms, outcome="ok"):
+        i = 0
+        while i < len(BUCKETS_MS) and ms > BUCKETS_MS[i]:
+            i += 1
+        self.buckets[i] += 1
+        self.count += 1
+        self.max_ms = max(self.max_ms, ms)
+        if outcome == "timeout":
+            self.timeouts += 1
+        elif outcome != "ok":
+            self.errors += 1
+        self._recent.append(ms)
+
+    def percentile(self, q):
+        """q-th percentile (0-100) of the recent samples in ms, None if empty."""
+        if not self._recent:
+            return None
+        data = sorted(self._recent)
+        return data[min(len(data) - 1, int(round(q / 100 * (len(data) - 1))))]
+
+    def summary(self):
+        p50, p99 = self.percentile(50), self.percentile(99)
+        return {
+            "count": self.count, "errors": self.errors, "timeouts": self.timeouts,
+            "p50_ms": None if p50 is None else round(p50, 1),
+            "p99_ms": None if p99 is None else round(p99, 1),
+            "max_ms": round(self.max_ms, 1),
+            "buckets": {(f"<={b}ms" if i < len(BUCKETS_MS) else f">{BUCKETS_MS[-1]}ms"): n
+                        for i, (b, n) in enumerate(zip(BUCKETS_MS + (None,), self.buckets)) if n},
+        }
+
+
+class LatencyStats:
+    """One LatencyHistogram per operation name ("tap", "capture", ...)."""
+
+    def __init__(self):
+        self._hists = {}
+        self._lock = threading.Lock()
+
+    def record(self, op, ms, outcome="ok"):
+        with self._lock:
+            hist = self._hists.get(op)
+            if hist is None:
+                hist = self._hists[op] = LatencyHistogram()
+            hist.add(ms, outcome)
+
+    @contextmanager
+    def time(self, op):
+        """Time the with-block as `op`; exceptions count as errors or timeouts."""
+        t0 = time.perf_counter()
+        outcome = "ok"
+        try:
+            yield
+        except (subprocess.TimeoutExpired, TimeoutError):
+            outcome = "timeout"
+            raise
+        except Exception:
+            outcome = "error"
+            raise
+        finally:
+            self.record(op, (time.perf_counter() - t0) * 1000, outcome)
+
+    def snapshot(self):
+        """{op: {count, errors, timeouts, p50_ms, p99_ms, max_ms, buckets}}"""
+        with self._lock:
+            return {op: hist.summary() for op, hist in sorted(self._hists.items())}
+
+    def reset(self):
+        with self._lock:
+            self._hists.clear()
+
+
+class Counters:
+    """Thread-safe named counters (captures, capture_bytes, blank_frames, ...)."""
+
+    def __init__(self):
+        self._counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def add(self, name, n=1):
+        with self._lock:
+            self._counts[name] += n
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counts)
+
+
+class MetricsDumper:
+    """Appends snapshot() as one JSON line to path every interval seconds."""
+
+    def __init__(self, path, snapshot, interval=60):
+        self.path = path
+        self.snapshot = snapshot
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="MetricsDumper", daemon=True)
+            self._thread.start()
+        return self
+
+    def dump(self):
+        line = json.dumps(dict(self.snapshot(), ts=round(time.time(), 3)), default=str)
+        with open(self.path, "a") as f:
+            f.write(line + "\n")
+
+    def stop(self):
+        """Stop the thread and write a final snapshot."""
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=2)
+        self._thread = None
+        self.dump()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.dump()
+            except OSError as e:
+                print(f"[-] Metrics dump to {self.path} failed: {e}")
+
+
+class RetryBudget:
+    """Token bucket limiting retries to a fraction of successful calls.
+
+    Every success deposits `ratio` tokens (up to `max_tokens`), every retry
+    spends one. While a device is healthy retries are always allowed; once
+    it wedges and every call fails, the bucket drains and callers stop
+    retrying until calls succeed again.
+    """
+
+    def __init__(self, ratio=0.2, max_tokens=10):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self.tokens = float(max_tokens)
+        self.denied = 0
+        self._lock = threading.Lock()
+
+    def success(self):
+        with self._lock:
+            self.tokens = min(float(self.max_tokens), self.tokens + self.ratio)
+
+    def try_spend(self):
+        """True if a retry may be attempted now."""
+        with self._lock:
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return True
+            self.denied += 1
+            return False
@@ -0,0 +1,203 @@
+# utils/synthetic_screens.py
+"""Synthetic Clash of Clans screens with known ground truth.
+
+GameScreen renders the screens the bots read, at the coordinates the
+scripts use: the search screen with loot digits in the Gold/Elixir/Dark
+boxes of extract_loot_values(), a village chat with a Donate button in
+donate.py's DONATE_OCR_BOX, and a battle results screen. It reacts to taps
+like a tiny state machine:
+
+    search  --Next (1470,760)-->            search (new base)
+    search  --any other tap/swipe-->        battle (troops deployed)
+    battle  --battle_seconds later-->       results
+    results --Return Home (800,850)-->      village
+    village --Attack! (97,900)-->           attack_menu
+    attack_menu --Find a Match (250,700)--> army
+    army    --Attack (1363,821)-->          search (new base)
+    village --Donate button-->              donate (back after donate_seconds idle)
+
+Plug it into a fake device (FakeDevice(serial, screen=GameScreen())) and
+every screencap renders the current state and records what was shown, so
+OCR output can be checked against the truth. Taps reach it as `input`
+commands or, with ADB_INPUT_BACKEND=evdev, as touch events the fake device
+decodes back into taps.
+"""
+import random
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from utils.loot_ocr import LOOT_BOXES  # the rows extract_loot_values() reads
+
+SIZE = (1600, 900)  # (w, h), the resolution the bot coordinates are written for
+
+LOOT_COLORS = {"gold": (80, 215, 250), "elixir": (230, 120, 230), "dark": (235, 235, 235)}
+DONATE_BOX = (374, 817, 511, 865)  # donate.py DONATE_OCR_BOX
+
+
+def _around(x, y, r=40):
+    return (x - r, y - r, x + r, y + r)
+
+
+NEXT_BOX = _around(1470, 760)
+# state -> [(tap box, next state)]
+BUTTONS = {
+    "results": [(_around(800, 850), "village")],
+    "village": [(_around(97, 900), "attack_menu"), (DONATE_BOX, "donate")],
+    "attack_menu": [(_around(250, 700), "army")],
+    "army": [(_around(1363, 821), "search")],
+}
+LABELS = {
+    "search": "Searching for opponent", "battle": "Battle", "results": "Return Home",
+    "village": "Village", "attack_menu": "Find a Match", "army": "Attack!", "donate": "Donate troops",
+}
+
+
+def _inside(box, x, y):
+    return box[0] <= x <= box[2] and box[1] <= y <= box[3]
+
+
+def format_loot(value):
+    """1234567 -> "1 234 567", the way the game groups digits."""
+    return f"{value:,}".replace(",", " ")
+
+
+def draw_text_in_box(img, text, box, color=(255, 255, 255), thickness=2):
+    """Draw text as large as fits into box (left-aligned, vertically centred)."""
+    x1, y1, x2, y2 = box
+    w, h = x2 - x1 - 4, y2 - y1 - 4
+    font = cv2.FONT_HERSHEY_SIMPLEX
+    scale = 1.2
+    while scale > 0.3:
+        (tw, th), base = cv2.getTextSize(text, font, scale, thickness)
+        if tw <= w and th + base <= h:
+            break
+        scale -= 0.05
+    cv2.putText(img, text, (x1 + 2, y1 + (y2 - y1 + th) // 2), font, scale,
+                color, thickness, cv2.LINE_AA)
+
+
+class GameScreen:
+    """Tap-driven state machine that renders 1600x900 BGR screens.
+
+    seed makes the sequence of bases reproducible; loot_range bounds gold
+    and elixir (dark is a tenth of it). A donate request shows up in the
+    village every donate_interval seconds.
+    """
+
+    def __init__(self, state="search", seed=None, loot_range=(50_000, 1_400_000),
+                 battle_seconds=5.0, donate_interval=20.0, donate_seconds=2.0):
+        self.state = state
+        self.rng = random.Random(seed)
+        self.loot_range = loot_range
+        self.battle_seconds = battle_seconds
+        self.donate_interval = donate_interval
+        self.donate_seconds = donate_seconds
+        self.loot = None
+        self.bases = []  # loot of every base shown, in order
+        self.request_at = time.time()  # when the next donate request appears
+        self.counters = {"bases": 0, "attacks": 0, "donations": 0, "troop_taps": 0}
+        self.shown = []  # one truth record per rendered frame, see frame()
+        self._entered = time.time()
+        self._last_input = time.time()
+        self._lock = threading.Lock()
+        if state == "search":
+            self._new_base()
+
+    def _new_base(self):
+        lo, hi = self.loot_range
+        self.loot = {"gold": self.rng.randint(lo, hi), "elixir": self.rng.randint(lo, hi),
+                     "dark": self.rng.randint(0, hi // 10)}
+        self.bases.append(dict(self.loot))
+        self.counters["bases"] += 1
+
+    def _enter(self, state):
+        if state == "search":
+            self._new_base()
+        elif state == "battle":
+            self.counters["attacks"] += 1
+        elif state == "donate":
+            self.counters["donations"] += 1
+        self.state = state
+        self._entered = time.time()
+
+    def _tick(self, now):
+        """Time-driven transitions."""
+        if self.state == "battle" and now - self._entered >= self.battle_seconds:
+            self._enter("results")
+        elif self.state == "donate" and now - self._last_input >= self.donate_seconds:
+            self.request_at = now + self.donate_interval
+            self._enter("village")
+
+    def donate_visible(self):
+        return self.state == "village" and time.time() >= self.request_at
+
+    def on_input(self, argv):
+        """Feed an `input ...` command (argv without "input")."""
+        if not argv:
+            return
+        if argv[0] in ("tap", "swipe") and len(argv) >= 3:
+            x, y = int(argv[1]), int(argv[2])
+        elif argv[0] == "motionevent" and len(argv) >= 4 and argv[1] == "DOWN":
+            x, y = int(argv[2]), int(argv[3])
+        else:
+            return
+        with self._lock:
+            now = time.time()
+            self._tick(now)
+            self._last_input = now
+            if self.state == "search":
+                self._enter("search" if _inside(NEXT_BOX, x, y) else "battle")
+                return
+            if self.state == "donate":
+                self.counters["troop_taps"] += 1
+                return
+            for box, target in BUTTONS.get(self.state, ()):
+                if _inside(box, x, y) and (target != "donate" or now >= self.request_at):
+                    self._enter(target)
+                    return
+
+    def render(self):
+        """Current screen as a BGR image (no bookkeeping)."""
+        w, h = SIZE
+        img = np.full((h, w, 3), (70, 110, 60), np.uint8)  # grass
+        cv2.putText(img, LABELS[self.state], (560, 90), cv2.FONT_HERSHEY_SIMPLEX, 1.4,
+                    (255, 255, 255), 3, cv2.LINE_AA)
+        if self.state == "search":
+            cv2.rectangle(img, (55, 100), (215, 240), (40, 40, 40), -1)
+            for key, box in LOOT_BOXES.items():
+                draw_text_in_box(img, format_loot(self.loot[key]), box, LOOT_COLORS[key])
+            x1, y1, x2, y2 = NEXT_BOX
+            cv2.rectangle(img, (x1, y1), (x2, y2), (0, 140, 255), -1)
+            draw_text_in_box(img, "Next", (x1 + 8, y1 + 20, x2, y2 - 20))
+        elif self.state == "village":
+            cv2.rectangle(img, (0, 600), (560, h), (50, 50, 50), -1)  # chat
+            if self.donate_visible():
+                x1, y1, x2, y2 = DONATE_BOX
+                cv2.rectangle(img, (x1, y1), (x2, y2), (60, 190, 90), -1)
+                draw_text_in_box(img, "Donate", (x1 + 10, y1 + 6, x2 - 6, y2 - 6))
+        for box, _ in BUTTONS.get(self.state, ()):
+            if box is not DONATE_BOX:
+                cv2.rectangle(img, box[:2], box[2:], (0, 200, 255), 3)
+        return img
+
+    def frame(self):
+        """Render for a capture and record its ground truth in self.shown.
+
+        Records are {"t", "state", "loot" (search screens, else None),
+        "donate" (whether the Donate button was visible)}.
+        """
+        with self._lock:
+            now = time.time()
+            self._tick(now)
+            img = self.render()
+            self.shown.append({"t": now, "state": self.state,
+                               "loot": dict(self.loot) if self.state == "search" else None,
+                               "donate": self.donate_visible()})
+            return img
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters, frames=len(self.shown), state=self.state)